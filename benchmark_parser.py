@@ -0,0 +1,135 @@
+# benchmark_parser.py
+"""列表页解析后端基准测试
+
+对保存下来的列表页 HTML（默认 data/fixtures/*.html）分别用 bs4 与 lxml 后端解析，
+校验两者输出完全一致，并报告每秒解析房源数和峰值内存。
+
+用法：
+    python benchmark_parser.py                     # 使用 data/fixtures 下的页面
+    python benchmark_parser.py --fixtures 目录 --repeat 5
+    python benchmark_parser.py --synthetic 20      # 没有保存页面时生成 20 页模拟数据
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from lianjia_selenium_crawler import parse_page
+
+FIXTURE_DIR = os.path.join('data', 'fixtures')
+CRAWL_TIME = '2025-12-10 05:01:51'
+COMMUNITIES = 40  # 模拟页面中的小区数（实际数据约每个小区 7 套房源）
+
+HOUSE_TEMPLATE = '''
+<div class="content__list--item" data-house_code="SH{code}">
+  <a class="content__list--item--aside" target="_blank" href="/zufang/SH{code}.html" title="整租·{community} {room}室1厅 南">
+    <img alt="整租·{community}" src="https://example.com/{code}.jpg">
+    {vr}
+  </a>
+  <div class="content__list--item--main">
+    <p class="content__list--item--title"><a href="/zufang/SH{code}.html">整租·{community} {room}室1厅 南</a></p>
+    <p class="content__list--item--des">
+      <a target="_blank" href="/zufang/pudong/">浦东</a>-<a href="/zufang/lujiazui/" target="_blank">陆家嘴</a>-<a title="{community}" href="/zufang/c{community_id}/" target="_blank">{community}</a>
+      <i>/</i>
+      {area}㎡
+      <i>/</i>南 北
+      <i>/</i>
+      {room}室1厅1卫
+      <span class="hide"><i>/</i>高楼层                        （{floors}层）</span>
+      <i>/</i>{year}年建
+    </p>
+    <p class="content__list--item--bottom oneline">
+      <i class="content__item__tag--authorization_apartment">自营</i>
+      <i class="content__item__tag--is_new">新上</i>
+      {subway}
+      <i class="content__item__tag--deposit_1_pay_1">押一付一</i>
+    </p>
+    <p class="content__list--item--brand oneline">
+      <span class="brand">贝壳优选</span>
+      <span class="content__list--item--time oneline">{days}天前维护</span>
+    </p>
+    <span class="content__list--item-price"><em>{price}</em> 元/月</span>
+  </div>
+</div>
+'''
+
+
+def make_synthetic_page(page_no, per_page=30, communities=COMMUNITIES, first=None):
+    """生成一页结构与真实列表页一致的模拟 HTML；房源轮流分布在 communities 个小区
+
+    first 为本页第一条房源的序号（决定房源编号），默认 page_no * per_page。
+    """
+    if first is None:
+        first = page_no * per_page
+    items = []
+    for i in range(per_page):
+        n = first + i
+        items.append(HOUSE_TEMPLATE.format(
+            code=2108908120410423296 + n,
+            community='东昌新村' if n % communities == 0 else f'东昌新村{n % communities}期',
+            community_id=5011000015981 + n % communities,
+            room=1 + n % 3,
+            vr='<i class="vr-logo"></i>' if n % 2 else '',
+            area=30 + n % 70,
+            floors=6 + n % 30,
+            year=1990 + n % 30,
+            subway='<i class="content__item__tag--is_subway_house">近地铁</i>' if n % 3 else '',
+            days=n % 7,
+            price=3000 + (n * 37) % 9000,
+        ))
+    return ('<html><head><meta charset="utf-8"></head><body><div class="content__list">'
+            + ''.join(items) + '</div></body></html>')
+
+
+def load_pages(fixture_dir, synthetic):
+    if synthetic:
+        return [make_synthetic_page(i) for i in range(synthetic)]
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def run_backend(pages, parser, repeat):
+    """返回 (解析结果, 每秒房源数, 峰值内存MB)"""
+    results = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [parse_page(page, parser, CRAWL_TIME) for page in pages]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = sum(len(rows) for rows in results) * repeat
+    return results, count / elapsed if elapsed else 0.0, peak / 1024 / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='列表页解析后端基准测试')
+    arg_parser.add_argument('--fixtures', default=FIXTURE_DIR, help='保存的列表页 HTML 目录')
+    arg_parser.add_argument('--synthetic', type=int, default=0, help='改用 N 页模拟数据')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='每个后端重复解析次数')
+    args = arg_parser.parse_args()
+
+    pages = load_pages(args.fixtures, args.synthetic)
+    if not pages:
+        print(f"未找到页面样本: {args.fixtures}/*.html，可使用 --synthetic N 生成模拟数据")
+        return
+
+    print(f"共 {len(pages)} 页，每个后端重复 {args.repeat} 次")
+    reference = None
+    for parser in ['bs4', 'lxml']:
+        results, rate, peak = run_backend(pages, parser, args.repeat)
+        print(f"{parser:>5}: {rate:10.1f} 条/秒, 峰值内存 {peak:.1f}MB")
+        if reference is None:
+            reference = results
+        elif results != reference:
+            print(f"⚠️ {parser} 后端输出与 bs4 参考实现不一致！")
+        else:
+            print(f"✅ {parser} 后端输出与 bs4 参考实现一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmark_pipeline.py
+"""完整流水线基准测试（离线）
+
+启动本地模拟站点（replay.StubSite），让 pipeline.py 的全部阶段（爬取、去重、小区坐标、通勤补充、分析、导出）
+都对它运行，报告 每秒页数、每秒房源数、每条房源的接口调用次数和峰值内存，作为性能改动前后对比的基准。
+录制过样本（config.json 中 "record_fixtures"）时回放录制的列表页和接口响应，否则使用模拟数据。
+运行在临时目录中，不会改动 data 下的任何文件；翻页间隔默认为 0，只测程序本身的耗时。
+
+用法：
+    python benchmark_pipeline.py                                  # 回放 data/fixtures/replay，没有样本时用模拟数据
+    python benchmark_pipeline.py --synthetic 4 --listings 95      # 4 个模拟区域，每区 95 条（最后一页 5 条）
+    python benchmark_pipeline.py --latency 0.2 --captcha-every 25 --workers 2
+    python benchmark_pipeline.py --json data/benchmark_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from replay import REPLAY_DIR, FixtureStore, StubSite
+
+DESTINATION = '纬度 31.2397, 经度 121.4998'  # 通勤补充的目的地（陆家嘴）
+
+
+def build_config(site, districts, args):
+    return {
+        'urls': [site.url + path for path in districts],
+        'max_pages': args.max_pages,
+        'delay': args.delay,
+        'min_delay': args.delay,
+        'workers': args.workers,
+        'fetch_mode': 'replay',
+        'parser': args.parser,
+        'batch_features': args.batch_features,
+        'output_formats': args.formats,
+        'metrics_formats': ['json'],
+        'commute_destination': DESTINATION,
+        'price_history': True,
+        'rent_cube': True,
+    }
+
+
+def run_benchmark(args):
+    store = None
+    fixture_dir = os.path.abspath(args.fixtures)
+    if not args.synthetic and os.path.exists(os.path.join(fixture_dir, 'pages.json')):
+        store = FixtureStore(fixture_dir)
+    districts = store.districts() if store is not None else []
+    if not districts:
+        store = None
+        districts = [f'/zufang/bench{i + 1}/' for i in range(args.synthetic or 2)]
+
+    site = StubSite(store, latency=args.latency, api_latency=args.api_latency, captcha_every=args.captcha_every,
+                    captcha_seconds=args.captcha_seconds, listings=args.listings)
+    site.start()
+    print(f"模拟站点 {site.url}，{len(districts)} 个区域，" + ("回放录制样本" if store is not None else "模拟数据"))
+
+    workdir = tempfile.mkdtemp(prefix='lianjia_bench_')
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.makedirs('data')
+        with open('config.json', 'w', encoding='utf-8') as f:
+            json.dump(build_config(site, districts, args), f, ensure_ascii=False, indent=2)
+
+        # 在临时目录中运行：地图缓存（首次查询时创建）、坐标库等都建在临时目录下，每次都从空缓存开始
+        import lianjia_selenium_crawler as crawler
+        import query_distance_from_map as qd
+        from crawl_metrics import METRICS
+        from pipeline import Pipeline, load_pipeline_config
+
+        crawler.DELAY_JITTER = (0.0, 0.0)
+        qd.BAIDU_API_BASE = site.url
+        qd.QPS = args.qps
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        pipeline = Pipeline(load_pipeline_config(), force=True)
+        pipeline.run()
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.chdir(previous_dir)
+        site.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    counters = METRICS.report()['counters']
+    pages, rows = counters.get('pages', 0), counters.get('rows', 0)
+    crawl_seconds = pipeline.timings.get('crawl', 0.0)
+    return {
+        'source': 'fixtures' if store is not None else 'synthetic',
+        'districts': len(districts),
+        'pages': pages,
+        'rows': rows,
+        'captchas': site.counters['captchas'],
+        'api_calls': site.counters['api_calls'],
+        'wall_seconds': round(wall, 3),
+        'crawl_seconds': round(crawl_seconds, 3),
+        'pages_per_second': round(pages / crawl_seconds, 2) if crawl_seconds else None,
+        'rows_per_second': round(rows / wall, 2) if wall else None,
+        'api_calls_per_row': round(site.counters['api_calls'] / rows, 4) if rows else None,
+        'peak_memory_mb': round(peak / 1024 / 1024, 1),
+        'stages': {name: round(seconds, 3) for name, seconds in pipeline.timings.items()},
+        'workdir': workdir if args.keep else None,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='完整流水线离线基准测试')
+    arg_parser.add_argument('--fixtures', default=REPLAY_DIR, help='录制样本目录')
+    arg_parser.add_argument('--synthetic', type=int, default=0, help='忽略录制样本，改用 N 个模拟区域')
+    arg_parser.add_argument('--listings', type=int, default=95, help='每个模拟区域的房源数')
+    arg_parser.add_argument('--max-pages', type=int, default=100)
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='列表页响应延迟（秒）')
+    arg_parser.add_argument('--api-latency', type=float, default=0.0, help='地图接口响应延迟（秒）')
+    arg_parser.add_argument('--captcha-every', type=int, default=0, help='每 N 次列表页请求注入一次验证重定向')
+    arg_parser.add_argument('--captcha-seconds', type=float, default=0.0, help='模拟完成一次验证所需秒数')
+    arg_parser.add_argument('--delay', type=float, default=0.0, help='翻页间隔（秒）')
+    arg_parser.add_argument('--workers', type=int, default=1)
+    arg_parser.add_argument('--parser', default='bs4', choices=['bs4', 'lxml'])
+    arg_parser.add_argument('--batch-features', action='store_true', help='整页批量提取特征（feature_extract）')
+    arg_parser.add_argument('--formats', nargs='+', default=['xlsx'], help='导出格式')
+    arg_parser.add_argument('--qps', type=float, default=50, help='地图接口限速（模拟站点不限，默认 50 次/秒）')
+    arg_parser.add_argument('--json', help='把结果另存为 JSON，便于与之前的基准对比')
+    arg_parser.add_argument('--keep', action='store_true', help='保留临时目录（输出文件、运行报告）')
+    args = arg_parser.parse_args()
+
+    report = run_benchmark(args)
+    print("\n📊 基准测试结果")
+    print(f"  数据来源 {report['source']}，{report['districts']} 个区域，{report['pages']} 页，{report['rows']} 条房源，"
+          f"验证 {report['captchas']} 次")
+    print(f"  总耗时 {report['wall_seconds']:.2f} 秒（爬取 {report['crawl_seconds']:.2f} 秒）")
+    print(f"  每秒页数 {report['pages_per_second']}，每秒房源数 {report['rows_per_second']}")
+    print(f"  地图接口 {report['api_calls']} 次，每条房源 {report['api_calls_per_row']} 次")
+    print(f"  峰值内存 {report['peak_memory_mb']}MB")
+    print("  各阶段：" + "，".join(f"{name} {seconds:.2f} 秒" for name, seconds in report['stages'].items()))
+    if report['workdir']:
+        print(f"  输出保留在 {report['workdir']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# city_sites.py
+"""城市与链家站点、百度地理编码区域的对应关系
+
+房源链接、小区链接按所在站点拼接（https://bj.lianjia.com/...），地理编码按城市限定范围（city=北京市）。
+config.json 的 "cities" 中可为每个城市覆盖 "site"、"geo_city"，不在下表中的城市必须给出 "site"：
+    "cities": {
+        "北京": {"districts": ["chaoyang/", "haidian/rt200600000001/"], "max_pages": 50},
+        "佛山": {"site": "https://fs.lianjia.com", "geo_city": "佛山市", "districts": ["chancheng/"]}
+    }
+districts 为 /zufang/ 之后的路径（也可写完整 URL），max_pages 不写时用全局的 "max_pages"。
+"""
+from urllib.parse import urlsplit
+
+DEFAULT_SITE = 'https://sh.lianjia.com'
+DEFAULT_GEO_CITY = '上海市'
+
+# 城市名 -> (链家站点, 地理编码城市)
+CITY_SITES = {
+    '上海': ('https://sh.lianjia.com', '上海市'),
+    '北京': ('https://bj.lianjia.com', '北京市'),
+    '广州': ('https://gz.lianjia.com', '广州市'),
+    '深圳': ('https://sz.lianjia.com', '深圳市'),
+    '杭州': ('https://hz.lianjia.com', '杭州市'),
+    '南京': ('https://nj.lianjia.com', '南京市'),
+    '苏州': ('https://su.lianjia.com', '苏州市'),
+    '成都': ('https://cd.lianjia.com', '成都市'),
+    '武汉': ('https://wh.lianjia.com', '武汉市'),
+    '天津': ('https://tj.lianjia.com', '天津市'),
+    '重庆': ('https://cq.lianjia.com', '重庆市'),
+    '西安': ('https://xa.lianjia.com', '西安市'),
+}
+_SITE_CITIES = {site: city for city, (site, _) in CITY_SITES.items()}
+
+
+def site_of(url):
+    """URL 所在站点（协议 + 域名），取不到时返回 DEFAULT_SITE"""
+    parts = urlsplit(url or '')
+    return f"{parts.scheme}://{parts.netloc}" if parts.scheme and parts.netloc else DEFAULT_SITE
+
+
+def city_of(url):
+    """URL 所在站点对应的城市名，未知站点返回空字符串"""
+    return _SITE_CITIES.get(site_of(url), '')
+
+
+def geo_city_of(url):
+    """URL 所在站点对应的地理编码城市，未知站点按上海处理（与原来的默认值一致）"""
+    city = city_of(url)
+    return CITY_SITES[city][1] if city else DEFAULT_GEO_CITY
+
+
+def resolve_city(name, overrides=None):
+    """返回城市的 (站点, 地理编码城市)；overrides 为 config.json 中该城市的配置"""
+    overrides = overrides or {}
+    site, geo_city = CITY_SITES.get(name, (None, None))
+    site = overrides.get('site', site)
+    if not site:
+        raise ValueError(f"未知城市 {name}，请在 config.json 的 cities.{name} 中给出 \"site\"")
+    return site.rstrip('/'), overrides.get('geo_city', geo_city or name + '市')
+
+
+def register_cities(config):
+    """把 config.json "cities" 中覆盖或新增的站点登记到对照表，之后 city_of / geo_city_of 能识别"""
+    for name, overrides in (config.get('cities') or {}).items():
+        site, geo_city = resolve_city(name, overrides)
+        CITY_SITES[name] = (site, geo_city)
+        _SITE_CITIES[site] = name
+
+
+def district_urls(config):
+    """按配置列出所有区域：[(城市, 区域URL, 最大页数)]，先 "cities" 后 "urls"（城市按域名识别）"""
+    max_pages = config.get('max_pages', 5)
+    result = []
+    for name, city in (config.get('cities') or {}).items():
+        site, _ = resolve_city(name, city)
+        for district in city.get('districts', []):
+            url = district if district.startswith('http') else f"{site}/zufang/{district.lstrip('/')}"
+            result.append((name, url, city.get('max_pages', max_pages)))
+    for url in config.get('urls', []):
+        result.append((city_of(url), url, max_pages))
+    return result
@@ -0,0 +1,257 @@
+# community_geo.py
+"""小区坐标库：从爬取结果自动提取小区并地理编码（SQLite）
+
+以小区链接中的小区编号（如 https://sh.lianjia.com/zufang/c5011000017771/ 中的 c5011000017771）为键，
+每个小区只请求一次百度地理编码，结果（含失败）永久保存在 data/community_geo.db；
+之后每次爬取只对新出现的小区请求，地理编码次数与小区数而不是房源数成正比。
+坐标按小区编号索引后一次性合并回所有房源（小区ID、小区纬度、小区经度 三列）。
+
+请求地址为 一级区域（补全为行政区名）+ 规范化后的小区名称：全角转半角、去掉空白，
+括号里只是区域名（如「东南新村(浦东)」）或物业类型（公寓、别墅）的备注去掉，其他（南区、一期）保留；
+地理编码的城市按小区链接所在站点确定（bj.lianjia.com -> 北京市，见 city_sites.py）。
+
+    python community_geo.py data/链家租房数据_Selenium_*.xlsx
+    python community_geo.py 文件.xlsx --destination "纬度 31.23, 经度 121.50"   # 另生成可直接交给 query_distance_from_map 的小区表
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from city_sites import geo_city_of
+
+GEO_FILE = os.path.join('data', 'community_geo.db')
+COMMUNITY_ID_RE = re.compile(r'/(?:zufang|xiaoqu)/(c?\d+)/?')
+BRACKET_RE = re.compile(r'\(([^()]*)\)')
+DISTRICT_NAMES = {'浦东': '浦东新区'}  # 一级区域名与行政区名不一致的，其余直接补「区」
+PROPERTY_NOTES = ('公寓', '别墅', '商住', '酒店式公寓')
+GEO_COLUMNS = {'小区ID': 'string', '小区纬度': 'float', '小区经度': 'float'}
+
+
+def extract_community_id(link):
+    """从小区链接中取出小区编号，取不到返回空字符串"""
+    if not isinstance(link, str):
+        return ''
+    match = COMMUNITY_ID_RE.search(link)
+    return match.group(1) if match else ''
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return re.sub(r'\s+', '', unicodedata.normalize('NFKC', str(value)))
+
+
+def normalize_name(name, region='', district=''):
+    """规范化小区名称：全角转半角、去空白，去掉只写了区域名或物业类型的括号备注"""
+    name = _text(name)
+    region, district = _text(region), _text(district)
+
+    def strip_note(match):
+        note = match.group(1)
+        if not note or note in (region, district) or note.endswith(PROPERTY_NOTES):
+            return ''
+        return match.group(0)
+
+    return BRACKET_RE.sub(strip_note, name)
+
+
+def geocode_address(name, region='', district=''):
+    """拼出请求地理编码的地址：一级区域（补全为行政区名）+ 规范化小区名称"""
+    region = _text(region)
+    name = normalize_name(name, region, district)
+    if region and not region.endswith(('区', '县', '市')):
+        region = DISTRICT_NAMES.get(region, region + '区')
+    return region + name
+
+
+def community_keys(df):
+    """每行的小区键：有小区链接时为小区编号，否则为「一级区域|规范化名称」；没有小区的行（如品牌公寓）为空"""
+    links = df['小区链接'] if '小区链接' in df.columns else pd.Series('', index=df.index)
+    keys = links.map(extract_community_id)
+    missing = keys == ''
+    if missing.any() and '小区名称' in df.columns:
+        names = df.loc[missing, '小区名称'].map(_text)
+        regions = df.loc[missing, '一级区域'].map(_text) if '一级区域' in df.columns else ''
+        keys[missing] = (regions + '|' + names).where(names != '', '')
+    return keys
+
+
+def unique_communities(df):
+    """从房源表中提取不重复的小区：索引为小区键，列为 名称、一级区域、二级区域、城市、地址、房源数"""
+    keys = community_keys(df)
+    links = df['小区链接'] if '小区链接' in df.columns else pd.Series('', index=df.index)
+    frame = pd.DataFrame({
+        'key': keys,
+        'name': df['小区名称'].map(_text) if '小区名称' in df.columns else '',
+        'region': df['一级区域'].map(_text) if '一级区域' in df.columns else '',
+        'district': df['二级区域'].map(_text) if '二级区域' in df.columns else '',
+        'city': links.map(lambda link: geo_city_of(link if isinstance(link, str) else '')),
+    })
+    frame = frame[frame['key'] != '']
+    counts = frame['key'].value_counts()
+    frame = frame.drop_duplicates('key').set_index('key')
+    frame['address'] = [geocode_address(name, region, district) for name, region, district
+                        in zip(frame['name'], frame['region'], frame['district'])]
+    frame['listings'] = counts.reindex(frame.index).astype(int)
+    return frame
+
+
+class CommunityGeo:
+    def __init__(self, path=GEO_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS communities (
+                community_id TEXT PRIMARY KEY,
+                name TEXT,
+                region TEXT,
+                district TEXT,
+                address TEXT,
+                lat REAL,
+                lng REAL,
+                status TEXT,
+                updated TEXT
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def known_ids(self, include_failed=True):
+        sql = 'SELECT community_id FROM communities'
+        if not include_failed:
+            sql += " WHERE status = 'ok'"
+        with self.lock:
+            return {row[0] for row in self.conn.execute(sql)}
+
+    def coordinates(self):
+        """所有已成功编码的小区坐标，索引为小区键"""
+        with self.lock:
+            rows = self.conn.execute("SELECT community_id, lat, lng FROM communities WHERE status = 'ok'").fetchall()
+        frame = pd.DataFrame(rows, columns=['小区ID', '小区纬度', '小区经度'])
+        return frame.set_index('小区ID')
+
+    def _save(self, key, community, lat, lng):
+        status = 'ok' if lat is not None else 'failed'
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO communities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, community['name'], community['region'], community['district'],
+                               community['address'], lat, lng, status,
+                               datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.conn.commit()
+
+    def geocode_missing(self, communities, workers=None, retry_failed=False):
+        """对库里还没有的小区请求地理编码，返回 (成功数, 失败数)；配额用尽时停止，未请求的下次再查
+
+        接口明确查无此地址的小区记为失败，之后不再自动重试（retry_failed=True 时重试）；
+        网络异常、接口临时错误不入库，下次运行再查。
+        限速沿用 query_distance_from_map.RATE_LIMITER，由调用方设置。
+        """
+        import query_distance_from_map as qd
+
+        known = self.known_ids(include_failed=not retry_failed)
+        todo = communities[~communities.index.isin(known)]
+        if todo.empty:
+            return 0, 0
+        print(f"小区坐标：{len(communities)} 个小区，需地理编码 {len(todo)} 个")
+        succeeded = failed = transient = 0
+        with ThreadPoolExecutor(max_workers=workers or qd.WORKERS) as executor:
+            futures = {executor.submit(qd.get_coordinates, community['address'], community['city'], True): key
+                       for key, community in todo.iterrows()}
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"小区 {todo.at[key, 'name']} 地理编码出错: {str(e)}")
+                    continue
+                if result == "QUOTA_EXCEEDED":
+                    if not qd.STOP_EVENT.is_set():
+                        print("\nAPI配额已用尽，剩余小区下次运行再查询")
+                        qd.STOP_EVENT.set()
+                        for other in futures:
+                            other.cancel()
+                    continue
+                if result == "NO_RESULT":
+                    self._save(key, todo.loc[key], None, None)
+                    failed += 1
+                    continue
+                lat, lng = qd.parse_coordinates(result)
+                if lat is None:
+                    transient += 1  # 网络异常、临时错误或被取消的请求，不入库，下次运行再查
+                    continue
+                self._save(key, todo.loc[key], lat, lng)
+                succeeded += 1
+        print(f"小区坐标：新编码成功 {succeeded} 个，查无结果 {failed} 个" + (f"，暂时失败 {transient} 个（下次重试）" if transient else ""))
+        return succeeded, failed
+
+    def enrich(self, df):
+        """给房源表加上 小区ID、小区纬度、小区经度 三列（按小区键在坐标表索引上合并）"""
+        df = df.drop(columns=[col for col in GEO_COLUMNS if col in df.columns])
+        df['小区ID'] = community_keys(df)
+        return df.join(self.coordinates(), on='小区ID')
+
+    def close(self):
+        self.conn.close()
+
+
+def commute_sheet(communities, coordinates, destination=None):
+    """生成 query_distance_from_map 可直接处理的小区表（出发地坐标已填好，不再按名称查坐标）"""
+    sheet = communities.join(coordinates, how='left')
+    has_coords = sheet['小区纬度'].notna()
+    result = pd.DataFrame({
+        '出发地': sheet['name'],
+        '小区ID': sheet.index,
+        '一级区域': sheet['region'],
+        '二级区域': sheet['district'],
+        '房源数': sheet['listings'],
+        '出发地坐标': ('纬度 ' + sheet['小区纬度'].astype(str) + ', 经度 ' + sheet['小区经度'].astype(str)).where(has_coords, ''),
+    })
+    if destination:
+        result['目的地坐标'] = destination
+    return result.sort_values('房源数', ascending=False, kind='stable').reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='从爬取结果提取小区并地理编码')
+    arg_parser.add_argument('files', nargs='+', help='爬取结果 xlsx 或 parquet')
+    arg_parser.add_argument('--destination', help='目的地坐标（"纬度 31.23, 经度 121.50"），给出时生成 <文件名>-小区.xlsx')
+    arg_parser.add_argument('--retry-failed', action='store_true', help='重试之前编码失败的小区')
+    args = arg_parser.parse_args()
+
+    import query_distance_from_map as qd
+    from rate_limit import TokenBucket
+
+    frames = []
+    for path in args.files:
+        try:
+            frames.append(pd.read_parquet(path) if path.endswith('.parquet') else pd.read_excel(path, engine='openpyxl'))
+        except Exception as e:
+            print(f"无法读取文件: {path} {str(e)}")
+    if not frames:
+        raise SystemExit(1)
+    listings = pd.concat(frames, ignore_index=True)
+    communities = unique_communities(listings)
+
+    geo = CommunityGeo()
+    qd.RATE_LIMITER = TokenBucket(qd.QPS, capacity=qd.QPS)
+    try:
+        geo.geocode_missing(communities, retry_failed=args.retry_failed)
+    finally:
+        qd.RATE_LIMITER = None
+    coordinates = geo.coordinates()
+    located = communities.index.isin(coordinates.index).sum()
+    print(f"✅ {len(listings)} 条房源，{len(communities)} 个小区，已有坐标 {located} 个")
+    if args.destination:
+        output_file = os.path.splitext(args.files[0])[0] + '-小区.xlsx'
+        commute_sheet(communities, coordinates, args.destination).to_excel(output_file, index=False, engine='openpyxl')
+        print(f"小区表已保存到 {output_file}，可直接用 query_distance_from_map.py 查询通勤")
+    geo.close()
@@ -0,0 +1,74 @@
+# commute_journal.py
+"""通勤查询结果日志（追加写 JSONL）
+
+每查完一行立即追加一行 {行号, 出发地, 查到的列值} 并落盘，不再每隔几行把整张表重写为 xlsx；
+程序中断或配额用尽后再次运行，先用日志补齐已查过的行，这些行不会再消耗配额。
+xlsx 只在全部处理结束时写一次；全部完成后日志删除，配额用尽而中止时保留供下次继续。
+
+日志文件为 <输出文件名>.jsonl，每行：
+    {"row": 12, "出发地": "东昌新村", "values": {"出发地坐标": "...", "行车距离(公里)": 5.21}}
+指定 key_column（如流水线的 小区ID）时按该列的值而不是行号对应，每次运行的表行数、顺序不同也能恢复到正确的行：
+    {"key": "c5011000012345", "values": {...}}
+"""
+import json
+import os
+import threading
+
+
+class CommuteJournal:
+    def __init__(self, output_file, path=None, key_column=None):
+        self.path = path or os.path.splitext(output_file)[0] + '.jsonl'
+        self.key_column = key_column
+        self.lock = threading.Lock()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下写了一半的最后一行，忽略即可
+                    continue
+
+    def restore(self, df):
+        """把日志中的结果写回 df，返回恢复的行数
+
+        按行号对应时，行号对应的出发地不一致（输入表已改动）的记录跳过；按 key_column 对应时，表中没有该键的记录跳过。
+        """
+        restored = set()
+        positions = {key: index for index, key in df[self.key_column].items()} if self.key_column else None
+        for record in self._records():
+            if positions is not None:
+                index = positions.get(record.get('key'))
+                if index is None:
+                    continue
+            else:
+                index = record.get('row')
+                if index not in df.index or df.at[index, '出发地'] != record.get('出发地'):
+                    continue
+            for col, value in record['values'].items():
+                df.at[index, col] = value
+            restored.add(index)
+        return len(restored)
+
+    def record(self, df, index, values):
+        """记录一行新查到的结果；没有新结果时不写"""
+        if not values:
+            return
+        if self.key_column:
+            entry = {'key': df.at[index, self.key_column], 'values': values}
+        else:
+            entry = {'row': int(index), '出发地': df.at[index, '出发地'], 'values': values}
+        line = json.dumps(entry, ensure_ascii=False, default=float)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self, remove=False):
+        self.file.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
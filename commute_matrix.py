@@ -0,0 +1,222 @@
+# commute_matrix.py
+"""多出发地 × 多目的地通勤矩阵
+
+对多个小区（出发地）和多个办公地点（目的地）一次算出 出发地 × 目的地 × 出行方式 的通勤时间和距离：
+- 驾车/骑行/步行使用百度批量算路接口 routematrix/v2，按接口上限（起终点数之积 ≤ 50）分块请求
+- 公交没有批量接口，去重后并发逐条调用 get_transit_info
+- 坐标相同的出发地/目的地只算一次，已缓存的起终点对不再请求，调用次数随不同起终点对增长
+
+输入表格：第一个工作表为出发地（列：出发地，可选 出发地坐标），
+名为「目的地」的工作表为目的地（列：目的地、目的地坐标）。
+结果写入 <输入文件名>-矩阵.xlsx，每个出发地一行，每个 目的地×方式 一列。
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import query_distance_from_map as qd
+from map_cache import route_key
+from rate_limit import TokenBucket
+from spatial_index import SpatialIndex
+
+MATRIX_MODES = ('driving', 'riding', 'walking')
+MODE_NAMES = {'driving': '驾车', 'riding': '骑行', 'walking': '步行', 'transit': '公交'}
+MAX_ELEMENTS = 50  # 批量算路接口：起点数 × 终点数 不超过 50
+
+
+class CommuteMatrix:
+    """minutes / km 形状为 (出发地数, 目的地数, 方式数)，查不到为 NaN"""
+
+    def __init__(self, origin_names, dest_names, modes):
+        self.origin_names = list(origin_names)
+        self.dest_names = list(dest_names)
+        self.modes = list(modes)
+        shape = (len(self.origin_names), len(self.dest_names), len(self.modes))
+        self.minutes = np.full(shape, np.nan, dtype=np.float32)
+        self.km = np.full(shape, np.nan, dtype=np.float32)
+
+    def to_wide_table(self):
+        """每个出发地一行，列为 目的地-方式时间(分钟) / 距离(公里)"""
+        columns = {'出发地': self.origin_names}
+        for d, dest in enumerate(self.dest_names):
+            for m, mode in enumerate(self.modes):
+                name = MODE_NAMES.get(mode, mode)
+                columns[f'{dest}-{name}时间(分钟)'] = np.round(self.minutes[:, d, m], 1)
+                if mode != 'transit':
+                    columns[f'{dest}-{name}距离(公里)'] = np.round(self.km[:, d, m], 2)
+        return pd.DataFrame(columns)
+
+
+def _coord(point):
+    return f"{point[0]},{point[1]}"
+
+
+def _query_block(mode, origins, destinations):
+    """请求一个分块，返回 [(公里, 分钟), ...]（按 起点优先 顺序）；配额用尽返回 'QUOTA_EXCEEDED'"""
+    url = (f"{qd.BAIDU_API_BASE}/routematrix/v2/{mode}?output=json"
+           f"&origins={'|'.join(_coord(o) for o in origins)}"
+           f"&destinations={'|'.join(_coord(d) for d in destinations)}&ak={qd.BAIDU_MAP_AK}")
+    try:
+        data = qd.api_get(url)
+    except Exception as e:
+        print(f"批量算路异常：{str(e)}")
+        return None
+    if data['status'] == 302:
+        print("\n错误：API配额已用尽")
+        return "QUOTA_EXCEEDED"
+    if data['status'] != 0:
+        print(f"批量算路失败：{data.get('message')}")
+        return None
+    return [(item['distance']['value'] / 1000, item['duration']['value'] / 60) for item in data['result']]
+
+
+def _fill_matrix_mode(mode, pairs, results):
+    """用批量接口填充 results[(起点, 终点, 方式)]，只请求 pairs 中缓存里没有的起终点对
+
+    每个起点只和自己需要的终点一起请求：需要的终点集合相同的起点合成一组，组内再按接口上限分块，
+    不在 pairs 中的起终点对（如超出直线距离半径）不会被顺带查询。
+    """
+    needed = {}
+    for o, d in pairs:
+        cached = qd.get_cache().get(route_key(mode, o, d))
+        if cached is not None:
+            results[(o, d, mode)] = tuple(cached)
+        else:
+            needed.setdefault(o, []).append(d)
+    groups = {}
+    for o, dests in needed.items():
+        groups.setdefault(tuple(dests), []).append(o)
+
+    for destinations, origins in groups.items():
+        dest_block = min(len(destinations), MAX_ELEMENTS)
+        origin_block = max(1, MAX_ELEMENTS // dest_block)
+        for i in range(0, len(origins), origin_block):
+            block_origins = origins[i:i + origin_block]
+            for j in range(0, len(destinations), dest_block):
+                block_dests = destinations[j:j + dest_block]
+                values = _query_block(mode, block_origins, block_dests)
+                if values == "QUOTA_EXCEEDED":
+                    return False
+                if not values:
+                    continue
+                block_pairs = [(o, d) for o in block_origins for d in block_dests]
+                for (o, d), value in zip(block_pairs, values):
+                    results[(o, d, mode)] = value
+                    qd.get_cache().set(route_key(mode, o, d), value, qd.ROUTE_TTL)
+    return True
+
+
+def _fill_transit(pairs, results, workers):
+    """公交：去重后的起终点对并发逐条查询"""
+
+    def lookup(pair):
+        if qd.STOP_EVENT.is_set():
+            return pair, None
+        return pair, qd.get_transit_info(*pair)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (o, d), minutes in executor.map(lookup, pairs):
+            if minutes == "QUOTA_EXCEEDED":
+                qd.STOP_EVENT.set()
+            elif minutes:
+                results[(o, d, 'transit')] = (np.nan, minutes)
+    return not qd.STOP_EVENT.is_set()
+
+
+def compute_matrix(origins, destinations, modes=('driving', 'transit'), qps=qd.QPS, workers=qd.WORKERS,
+                   max_radius_km=None):
+    """origins / destinations 为 [(名称, (纬度, 经度)), ...]，返回 CommuteMatrix
+
+    相同坐标只查询一次；配额用尽时停止，已得到的结果照常填入。
+    给出 max_radius_km 时直线距离超出半径的起终点对不查询（结果为 NaN）。
+    """
+    matrix = CommuteMatrix([name for name, _ in origins], [name for name, _ in destinations], modes)
+    unique_origins = list(dict.fromkeys(point for _, point in origins))
+    unique_dests = list(dict.fromkeys(point for _, point in destinations))
+    print(f"{len(origins)} 个出发地（不同坐标 {len(unique_origins)} 个）× "
+          f"{len(destinations)} 个目的地（不同坐标 {len(unique_dests)} 个）")
+
+    if max_radius_km is not None and unique_origins:
+        # 对出发地建空间索引，逐个目的地取半径内的出发地，只保留这些起终点对
+        index = SpatialIndex(range(len(unique_origins)), [o[0] for o in unique_origins], [o[1] for o in unique_origins])
+        nearby = {d: {i for i, _ in index.within(d[0], d[1], max_radius_km)} for d in unique_dests}
+        pairs = [(o, d) for i, o in enumerate(unique_origins) for d in unique_dests if i in nearby[d]]
+        print(f"直线距离预筛选：半径 {max_radius_km} 公里内的起终点对 {len(pairs)} 个"
+              f"（共 {len(unique_origins) * len(unique_dests)} 个）")
+    else:
+        pairs = [(o, d) for o in unique_origins for d in unique_dests]
+
+    results = {}
+    qd.RATE_LIMITER = TokenBucket(qps, capacity=qps)
+    qd.STOP_EVENT.clear()
+    try:
+        for mode in modes:
+            if mode == 'transit':
+                ok = _fill_transit(pairs, results, workers)
+            elif mode in MATRIX_MODES:
+                ok = _fill_matrix_mode(mode, pairs, results)
+            else:
+                print(f"不支持的出行方式: {mode}")
+                continue
+            if not ok:
+                print("API配额已用尽，停止计算")
+                break
+    finally:
+        qd.RATE_LIMITER = None
+
+    for i, (_, o) in enumerate(origins):
+        for j, (_, d) in enumerate(destinations):
+            for m, mode in enumerate(modes):
+                value = results.get((o, d, mode))
+                if value is not None:
+                    matrix.km[i, j, m], matrix.minutes[i, j, m] = value
+    return matrix
+
+
+def process_matrix_excel(input_file, modes=('driving', 'transit'), max_radius_km=None):
+    """读取出发地/目的地两个工作表，计算通勤矩阵并导出宽表"""
+    try:
+        origins_df = pd.read_excel(input_file, sheet_name=0, engine='openpyxl')
+        dests_df = pd.read_excel(input_file, sheet_name='目的地', engine='openpyxl')
+    except Exception as e:
+        print(f"无法读取Excel文件: {str(e)}")
+        return None
+
+    origins = []
+    for _, row in origins_df.iterrows():
+        coord_str = row.get('出发地坐标')
+        if pd.isna(coord_str) or coord_str == "":
+            coord_str = qd.get_coordinates(row['出发地'])
+            if coord_str == "QUOTA_EXCEEDED":
+                break
+        lat, lng = qd.parse_coordinates(coord_str)
+        if lat is None:
+            print(f"无法解析出发地坐标: {row['出发地']}")
+            continue
+        origins.append((row['出发地'], (lat, lng)))
+
+    destinations = []
+    for _, row in dests_df.iterrows():
+        lat, lng = qd.parse_coordinates(row['目的地坐标'])
+        if lat is None:
+            print(f"无法解析目的地坐标: {row['目的地']}")
+            continue
+        destinations.append((row['目的地'], (lat, lng)))
+
+    if not origins or not destinations:
+        print("没有可计算的出发地或目的地")
+        return None
+
+    matrix = compute_matrix(origins, destinations, modes, max_radius_km=max_radius_km)
+    output_file = input_file.replace('.xlsx', '-矩阵.xlsx') if input_file.endswith('.xlsx') \
+        else input_file + '-矩阵.xlsx'
+    matrix.to_wide_table().to_excel(output_file, index=False, engine='openpyxl')
+    print(f"通勤矩阵已保存到 {output_file}")
+    return matrix
+
+
+if __name__ == "__main__":
+    import sys
+
+    process_matrix_excel(sys.argv[1] if len(sys.argv) > 1 else 'data\\小区信息20250816 - 副本.xlsx')
@@ -0,0 +1,96 @@
+# crawl_checkpoint.py
+"""爬取断点日志（追加写 JSONL）
+
+每爬完一页就追加一行 {区域, 页码, 房源列表} 并落盘，房源不再常驻内存；
+程序崩溃、浏览器退出或验证码放弃后，用 --resume 从每个区域最后完成的页继续。
+
+日志格式（每行一个 JSON）：
+    {"type": "run", "output_file": "...", "started": "..."}
+    {"type": "page", "district": "<区域URL>", "page": 3, "rows": [...]}
+    {"type": "done", "district": "<区域URL>"}
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+JOURNAL_FILE = os.path.join('data', 'crawl_journal.jsonl')
+
+
+class CrawlJournal:
+    def __init__(self, output_file, path=JOURNAL_FILE, resume=False):
+        self.path = path
+        self.output_file = output_file
+        self.last_page = {}      # 区域URL -> 已完成的最后一页
+        self.finished = set()    # 已爬完的区域URL
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self._load_state()
+            self.file = open(path, 'a', encoding='utf-8')
+            print(f"📂 从断点日志恢复: 已完成 {len(self.finished)} 个区域，"
+                  f"另有 {len(set(self.last_page) - self.finished)} 个区域从中断处继续")
+        else:
+            if resume:
+                print(f"未找到断点日志 {path}，从头开始爬取")
+            self.file = open(path, 'w', encoding='utf-8')
+            self._write({'type': 'run', 'output_file': output_file,
+                         'started': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+
+    def _load_state(self):
+        for record in self._records():
+            if record['type'] == 'run':
+                self.output_file = record['output_file']
+            elif record['type'] == 'page':
+                self.last_page[record['district']] = max(self.last_page.get(record['district'], 0),
+                                                         record['page'])
+            elif record['type'] == 'done':
+                self.finished.add(record['district'])
+
+    def _records(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下写了一半的最后一行，忽略即可
+                    continue
+
+    def _write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def start_page(self, district):
+        """该区域应从第几页开始爬"""
+        return self.last_page.get(district, 0) + 1
+
+    def record_page(self, district, page, rows):
+        self._write({'type': 'page', 'district': district, 'page': page, 'rows': rows})
+
+    def finish_district(self, district, exhausted=True):
+        """exhausted 为 False 表示只是到了 max_pages；断点续爬不区分，都视为该区域已完成"""
+        self.finished.add(district)
+        self._write({'type': 'done', 'district': district})
+
+    def iter_rows(self, urls=None):
+        """按区域配置顺序读回所有已记录的房源；urls 为空时按写入顺序
+
+        只读一遍日志：按区域分组后再按 urls 顺序输出，不随区域数重复扫描。
+        """
+        if urls is None:
+            for record in self._records():
+                if record['type'] == 'page':
+                    yield from record['rows']
+            return
+        pages = {district: [] for district in urls}
+        for record in self._records():
+            if record['type'] == 'page' and record['district'] in pages:
+                pages[record['district']].append(record['rows'])
+        for district in urls:
+            for rows in pages.pop(district, []):
+                yield from rows
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,212 @@
+# crawl_metrics.py
+"""爬取过程计时与计数
+
+各阶段（抓取、页面渲染等待、人工验证、限速等待、解析、翻页延迟、写日志、导出）的累计耗时与次数，
+按区域、按页记录，并统计验证码、空页、解析出错等事件。运行结束写出机器可读的报告：
+- JSON：data/crawl_report.json
+- Prometheus textfile：data/crawl_metrics.prom（可交给 node_exporter 的 textfile collector）
+
+阶段有嵌套：fetch 包含 render_wait 和 captcha_wait；多浏览器并行时各阶段耗时为所有线程之和，
+可能超过总耗时。可选用 cProfile 包裹解析过程，结果保存为 data/crawl_profile.prof。
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REPORT_FILE = os.path.join('data', 'crawl_report.json')
+PROMETHEUS_FILE = os.path.join('data', 'crawl_metrics.prom')
+PROFILE_FILE = os.path.join('data', 'crawl_profile.prof')
+
+
+class CrawlMetrics:
+    """线程安全的计时器与计数器，当前区域按线程记录，抓取层的计时自动归到所在区域"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self, profile=False):
+        with self.lock:
+            self.started = time.time()
+            self.finished = None
+            self.phases = {}  # 阶段 -> [秒, 次数]
+            self.counters = {}
+            self.gauges = {}  # 取最新值的指标，如浏览器内存
+            self.districts = {}  # 区域 -> {'phases': {...}, 'counters': {...}, 'pages': [...]}
+            self.profiler = cProfile.Profile() if profile else None
+
+    def _district_stats(self, district):
+        stats = self.districts.get(district)
+        if stats is None:
+            stats = self.districts[district] = {'phases': {}, 'counters': {}, 'pages': []}
+        return stats
+
+    @contextmanager
+    def district(self, name):
+        """在此范围内的计时、计数同时记到区域 name 下"""
+        previous = getattr(self.local, 'district', None)
+        self.local.district = name
+        try:
+            yield
+        finally:
+            self.local.district = previous
+
+    def add_time(self, phase, seconds):
+        district = getattr(self.local, 'district', None)
+        with self.lock:
+            targets = [self.phases]
+            if district is not None:
+                targets.append(self._district_stats(district)['phases'])
+            for phases in targets:
+                entry = phases.setdefault(phase, [0.0, 0])
+                entry[0] += seconds
+                entry[1] += 1
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def incr(self, name, n=1):
+        district = getattr(self.local, 'district', None)
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if district is not None:
+                counters = self._district_stats(district)['counters']
+                counters[name] = counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def record_page(self, district, page, **values):
+        """记录单页明细，如 抓取/解析秒数、房源条数"""
+        with self.lock:
+            self._district_stats(district)['pages'].append(dict(page=page, **values))
+
+    @contextmanager
+    def profile(self):
+        """开启了 cProfile 时在此范围内采样（cProfile 同一时间只能有一个在运行，仅单浏览器模式使用）"""
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def finish(self):
+        self.finished = time.time()
+
+    def report(self):
+        """汇总为可 JSON 序列化的字典"""
+        with self.lock:
+            finished = self.finished or time.time()
+            wall = finished - self.started
+            rows = self.counters.get('rows', 0)
+            return {
+                'started': datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+                'finished': datetime.fromtimestamp(finished).strftime('%Y-%m-%d %H:%M:%S'),
+                'wall_seconds': round(wall, 3),
+                'rows_per_second': round(rows / wall, 3) if wall > 0 else None,
+                'phases': _phase_table(self.phases, wall),
+                'counters': dict(self.counters),
+                'gauges': {name: round(value, 3) for name, value in self.gauges.items()},
+                'districts': {
+                    name: {
+                        'phases': _phase_table(stats['phases']),
+                        'counters': dict(stats['counters']),
+                        'pages': list(stats['pages']),
+                    }
+                    for name, stats in self.districts.items()
+                },
+            }
+
+    def write_json(self, path=REPORT_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def write_prometheus(self, path=PROMETHEUS_FILE):
+        """Prometheus 文本格式；先写临时文件再替换，避免采集到半个文件"""
+        report = self.report()
+        lines = [
+            '# HELP lianjia_crawl_duration_seconds Wall clock duration of the last crawl run.',
+            '# TYPE lianjia_crawl_duration_seconds gauge',
+            f"lianjia_crawl_duration_seconds {report['wall_seconds']}",
+            '# HELP lianjia_crawl_phase_seconds_total Time spent per crawl phase.',
+            '# TYPE lianjia_crawl_phase_seconds_total counter',
+        ]
+        for phase, entry in report['phases'].items():
+            lines.append(f'lianjia_crawl_phase_seconds_total{{phase="{phase}"}} {entry["seconds"]}')
+        lines += ['# HELP lianjia_crawl_phase_calls_total Number of timed calls per crawl phase.',
+                  '# TYPE lianjia_crawl_phase_calls_total counter']
+        for phase, entry in report['phases'].items():
+            lines.append(f'lianjia_crawl_phase_calls_total{{phase="{phase}"}} {entry["count"]}')
+        lines += ['# HELP lianjia_crawl_events_total Crawl events such as pages, rows, captchas and errors.',
+                  '# TYPE lianjia_crawl_events_total counter']
+        for name, value in report['counters'].items():
+            lines.append(f'lianjia_crawl_events_total{{event="{name}"}} {value}')
+        for name, value in report['gauges'].items():
+            lines += [f'# TYPE lianjia_crawl_{name} gauge', f'lianjia_crawl_{name} {value}']
+        lines += ['# HELP lianjia_crawl_district_rows Rows collected per district in the last run.',
+                  '# TYPE lianjia_crawl_district_rows gauge']
+        for name, stats in report['districts'].items():
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'lianjia_crawl_district_rows{{district="{label}"}} {stats["counters"].get("rows", 0)}')
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+        return path
+
+    def write_profile(self, path=PROFILE_FILE, top=15):
+        """保存 cProfile 结果并返回耗时最多的函数列表文本"""
+        if self.profiler is None:
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+    def summary(self):
+        """打印到控制台的简要耗时分布"""
+        report = self.report()
+        lines = [f"⏱️ 总耗时 {report['wall_seconds']:.1f} 秒，{report['counters'].get('rows', 0)} 条房源"]
+        for phase, entry in sorted(report['phases'].items(), key=lambda item: -item[1]['seconds']):
+            share = f"，占 {entry['share']:.0%}" if entry.get('share') is not None else ''
+            lines.append(f"  {phase:<14} {entry['seconds']:>9.2f} 秒 / {entry['count']} 次{share}")
+        events = {k: v for k, v in report['counters'].items() if k != 'rows'}
+        events.update(report['gauges'])
+        if events:
+            lines.append('  ' + '，'.join(f"{k} {v}" for k, v in events.items()))
+        return '\n'.join(lines)
+
+
+def _phase_table(phases, wall=None):
+    table = {}
+    for phase, (seconds, count) in phases.items():
+        entry = {'seconds': round(seconds, 3), 'count': count}
+        if wall:
+            entry['share'] = round(seconds / wall, 4)
+        table[phase] = entry
+    return table
+
+
+# 整个进程共用一个实例，抓取层、解析层直接记录，由 crawl_with_selenium 在每次运行开始时 reset
+METRICS = CrawlMetrics()
@@ -0,0 +1,467 @@
+# crawl_queue.py
+"""多城市分片爬取：SQLite 工作队列（租约 + 心跳 + 重试）
+
+把 城市 × 区域 × 页码段 作为工作单元放进 data/crawl_queue.db，多个爬虫进程（或多台机器共用同一个库文件）
+各自领取单元爬取，互不重复：
+- 领取（lease）在 BEGIN IMMEDIATE 事务中完成，SQLite 的文件锁保证同一单元只会被一个进程领到
+- 领到的单元有租约期限（LEASE_SECONDS），后台线程定期心跳续约；进程崩溃或断网后租约过期，单元由其他进程接手，
+  从已完成页之后继续，已爬过的页不会重复抓取；失败的单元重试，超过 MAX_ATTEMPTS 次标记为失败
+- 每页结果写入库中的 pages 表（按 区域+页码 唯一），重试、重复领取都不会产生重复房源
+- 每个区域先只放入第一段页码（PAGE_SHARD 页）；一段爬满且还有后续页时才放入下一段，
+  到最后一页（不足 30 条/空页）就不再放入，不会为不存在的页码白白请求
+
+config.json 示例（"cities" 的格式见 city_sites.py，原来的 "urls" 仍可用，城市按域名识别）：
+    "cities": {
+        "上海": {"districts": ["jingan/rco11rt200600000001ra1ra2ra3ra4ra5/", "xuhui/"]},
+        "北京": {"districts": ["chaoyang/", "haidian/"], "max_pages": 50},
+        "佛山": {"site": "https://fs.lianjia.com", "geo_city": "佛山市", "districts": ["chancheng/"]}
+    },
+    "page_shard": 10,
+    "queue_file": "data/crawl_queue.db"
+
+用法（多台机器时把 queue_file 指向共享目录中的同一个文件）：
+    python crawl_queue.py seed            # 按配置放入工作单元（可重复执行，已有的不会重复放入；改了 max_pages 时按新上限调整）
+    python crawl_queue.py work            # 领取并爬取，直到队列中没有可做的单元；可在多个进程/机器上同时运行
+    python crawl_queue.py status          # 各状态单元数、已爬页数和房源数
+    python crawl_queue.py retry-failed    # 把失败的单元重新放回队列
+    python crawl_queue.py export          # 导出所有已爬房源（也可 python pipeline.py --from-queue 直接进入流水线）
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from city_sites import district_urls, register_cities
+
+QUEUE_FILE = os.path.join('data', 'crawl_queue.db')
+PAGE_SHARD = 10  # 每个工作单元的页数
+LEASE_SECONDS = 300  # 租约期限，超过未续约视为该进程已退出
+HEARTBEAT_SECONDS = 60
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 10  # 暂时没有可领取的单元、但别的进程还在爬时，隔多久再试
+
+
+class LeaseLost(Exception):
+    """单元的租约已过期并被其他进程接手"""
+
+
+class WorkQueue:
+    def __init__(self, path=QUEUE_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # 自行控制事务（isolation_level=None），领取时用 BEGIN IMMEDIATE 先拿到写锁；其他进程写入时最多等 60 秒
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS units (
+                    unit_id TEXT PRIMARY KEY,
+                    city TEXT,
+                    district TEXT,
+                    first_page INTEGER,
+                    last_page INTEGER,
+                    max_pages INTEGER,
+                    next_page INTEGER,
+                    status TEXT,
+                    owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER DEFAULT 0,
+                    rows INTEGER DEFAULT 0,
+                    error TEXT,
+                    updated TEXT,
+                    exhausted INTEGER DEFAULT 0
+                ) WITHOUT ROWID
+            ''')
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(units)')}
+            if 'exhausted' not in columns:  # 旧版本的队列库：区域是否已到最后一页
+                self.conn.execute('ALTER TABLE units ADD COLUMN exhausted INTEGER DEFAULT 0')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_units_status ON units (status, lease_expires)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS pages (
+                    district TEXT,
+                    page INTEGER,
+                    unit_id TEXT,
+                    rows TEXT,
+                    PRIMARY KEY (district, page)
+                ) WITHOUT ROWID
+            ''')
+
+    def _transaction(self, work):
+        """在写事务中执行 work(conn)，出错回滚"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(self.conn)
+                self.conn.execute('COMMIT')
+                return result
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _insert_unit(self, conn, city, district, first_page, max_pages, shard):
+        """放入一个单元；已有且未完成时改用新的页数上限（已爬过的页不会因上限调低而被截掉），已完成的不变"""
+        last_page = min(first_page + shard - 1, max_pages)
+        conn.execute('''
+            INSERT INTO units (unit_id, city, district, first_page, last_page, max_pages, next_page,
+                               status, lease_expires, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', 0, ?)
+            ON CONFLICT(unit_id) DO UPDATE SET
+                max_pages = excluded.max_pages,
+                last_page = MAX(excluded.last_page, units.next_page - 1),
+                updated = excluded.updated
+            WHERE units.status != 'done'
+                AND (units.max_pages != excluded.max_pages
+                     OR units.last_page != MAX(excluded.last_page, units.next_page - 1))
+        ''', (f"{district}#{first_page}", city, district, first_page, last_page, max_pages, first_page, self._now()))
+
+    def seed(self, districts, shard=PAGE_SHARD):
+        """放入每个区域的第一段页码，返回放入、更新或删除的单元数；可重复执行，配置没变时什么都不改
+
+        页数上限改了时：未完成的单元按新上限调整，调低后整段超出上限、还没开始爬的单元删除；
+        调高时，已完成、且是因为到了旧上限（而不是区域已到最后一页）才停下的区域放入下一段。
+        """
+        def work(conn):
+            before = conn.total_changes
+            for city, district, max_pages in districts:
+                self._insert_unit(conn, city, district, 1, max_pages, shard)
+                conn.execute('''
+                    DELETE FROM units WHERE district = ? AND status IN ('pending', 'failed')
+                        AND first_page > ? AND next_page = first_page
+                ''', (district, max_pages))
+                units = conn.execute('SELECT * FROM units WHERE district = ? AND first_page > 1',
+                                     (district,)).fetchall()
+                for unit in units:
+                    if unit['status'] != 'done':
+                        self._insert_unit(conn, city, district, unit['first_page'], max_pages, shard)
+                furthest = conn.execute('''
+                    SELECT MAX(last_page) FROM units WHERE district = ?
+                    HAVING SUM(status != 'done') = 0 AND SUM(exhausted) = 0
+                ''', (district,)).fetchone()
+                if furthest is not None and furthest[0] < max_pages:
+                    self._insert_unit(conn, city, district, furthest[0] + 1, max_pages, shard)
+            return conn.total_changes - before
+        return self._transaction(work)
+
+    def lease(self, owner):
+        """领取一个单元（待做的，或租约已过期的），返回单元字典；没有可领取的返回 None"""
+        def work(conn):
+            now = time.time()
+            while True:
+                unit = conn.execute('''
+                    SELECT * FROM units
+                    WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                    ORDER BY attempts, first_page, unit_id LIMIT 1
+                ''', (now,)).fetchone()
+                if unit is None:
+                    return None
+                if unit['attempts'] >= self.max_attempts:
+                    conn.execute("UPDATE units SET status = 'failed', owner = NULL, updated = ?, "
+                                 "error = COALESCE(error, '租约多次过期') WHERE unit_id = ?",
+                                 (self._now(), unit['unit_id']))
+                    continue
+                conn.execute('''
+                    UPDATE units SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ?
+                    WHERE unit_id = ?
+                ''', (owner, now + self.lease_seconds, self._now(), unit['unit_id']))
+                leased = dict(unit)
+                leased.update(owner=owner, attempts=unit['attempts'] + 1)
+                return leased
+        return self._transaction(work)
+
+    def heartbeat(self, unit_id, owner):
+        """续约；租约已被其他进程接手时返回 False"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE units SET lease_expires = ? WHERE unit_id = ? AND owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, unit_id, owner))
+        return cursor.rowcount == 1
+
+    def record_page(self, unit_id, owner, district, page, rows):
+        """保存一页结果并续约；租约已丢失时抛出 LeaseLost（该页由接手的进程重新爬取）"""
+        data = json.dumps(rows, ensure_ascii=False)
+
+        def work(conn):
+            cursor = conn.execute('''
+                UPDATE units SET next_page = ?, rows = rows + ?, lease_expires = ?, updated = ?
+                WHERE unit_id = ? AND owner = ? AND status = 'leased'
+            ''', (page + 1, len(rows), time.time() + self.lease_seconds, self._now(), unit_id, owner))
+            if cursor.rowcount != 1:
+                raise LeaseLost(unit_id)
+            conn.execute('INSERT OR REPLACE INTO pages (district, page, unit_id, rows) VALUES (?, ?, ?, ?)',
+                         (district, page, unit_id, data))
+        self._transaction(work)
+
+    def complete(self, unit, owner, exhausted, shard=PAGE_SHARD):
+        """标记完成；区域还有后续页（exhausted 为 False 且未到 max_pages）时放入下一段"""
+        def work(conn):
+            cursor = conn.execute('''
+                UPDATE units SET status = 'done', exhausted = ?, owner = NULL, error = NULL, updated = ?
+                WHERE unit_id = ? AND owner = ? AND status = 'leased'
+            ''', (int(exhausted), self._now(), unit['unit_id'], owner))
+            if cursor.rowcount != 1:
+                raise LeaseLost(unit['unit_id'])
+            # 页数上限以库中为准（领取之后可能重新 seed 改了上限），从本次实际爬到的页之后继续
+            max_pages = conn.execute('SELECT max_pages FROM units WHERE unit_id = ?', (unit['unit_id'],)).fetchone()[0]
+            if not exhausted and unit['last_page'] < max_pages:
+                self._insert_unit(conn, unit['city'], unit['district'], unit['last_page'] + 1, max_pages, shard)
+        self._transaction(work)
+
+    def fail(self, unit, owner, error):
+        """放回队列等待重试；已达到最大尝试次数时标记为失败"""
+        status = 'failed' if unit['attempts'] >= self.max_attempts else 'pending'
+        with self.lock:
+            self.conn.execute('''
+                UPDATE units SET status = ?, owner = NULL, lease_expires = 0, error = ?, updated = ?
+                WHERE unit_id = ? AND owner = ? AND status = 'leased'
+            ''', (status, str(error)[:500], self._now(), unit['unit_id'], owner))
+        return status
+
+    def retry_failed(self):
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE units SET status = 'pending', attempts = 0, lease_expires = 0, updated = ? WHERE status = 'failed'",
+                (self._now(),))
+        return cursor.rowcount
+
+    def outstanding(self):
+        """还没有完成的单元数（待领取 + 别的进程正在爬）"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM units WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def status(self):
+        with self.lock:
+            units = {row[0]: row[1] for row in
+                     self.conn.execute('SELECT status, COUNT(*) FROM units GROUP BY status')}
+            pages = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            rows = self.conn.execute('SELECT COALESCE(SUM(rows), 0) FROM units').fetchone()[0]
+            failed = [dict(row) for row in self.conn.execute(
+                "SELECT unit_id, attempts, error FROM units WHERE status = 'failed' ORDER BY unit_id")]
+        return {'units': units, 'pages': pages, 'rows': rows, 'failed': failed}
+
+    def iter_rows(self):
+        """按 区域、页码 顺序读出所有已爬房源"""
+        with self.lock:
+            records = self.conn.execute('''
+                SELECT pages.rows FROM pages
+                LEFT JOIN (SELECT district, MIN(city) AS city FROM units GROUP BY district) AS d
+                    ON d.district = pages.district
+                ORDER BY d.city, pages.district, pages.page
+            ''').fetchall()
+        for (data,) in records:
+            yield from json.loads(data)
+
+    def close(self):
+        self.conn.close()
+
+
+class UnitJournal:
+    """把单元的逐页结果写入队列，供 crawl_district 作为 journal 使用
+
+    传入 heartbeat 时每页写入前检查续约是否已失败，失败即抛出 LeaseLost 停止翻页，不再为别人接手的单元抓取。
+    """
+
+    def __init__(self, work_queue, unit, owner, heartbeat=None):
+        self.queue = work_queue
+        self.unit = unit
+        self.owner = owner
+        self.heartbeat = heartbeat
+        self.exhausted = True
+
+    def start_page(self, district):
+        return self.unit['next_page']
+
+    def record_page(self, district, page, rows):
+        if self.heartbeat is not None and self.heartbeat.lost:
+            raise LeaseLost(self.unit['unit_id'])
+        self.queue.record_page(self.unit['unit_id'], self.owner, district, page, rows)
+
+    def finish_district(self, district, exhausted=True):
+        self.exhausted = exhausted
+
+
+class Heartbeat:
+    """后台定期续约（人工验证等长时间等待期间租约也不会过期）"""
+
+    def __init__(self, work_queue, unit_id, owner, interval=HEARTBEAT_SECONDS):
+        self.stopped = threading.Event()
+        self.lost = False
+
+        def beat():
+            while not self.stopped.wait(interval):
+                if not work_queue.heartbeat(unit_id, owner):
+                    self.lost = True
+                    return
+
+        self.thread = threading.Thread(target=beat, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_worker(work_queue, owner, fetcher, crawl_kwargs, shard=PAGE_SHARD, tag=''):
+    """反复领取并爬取单元，直到队列中没有未完成的单元；返回本 worker 完成的单元数"""
+    from lianjia_selenium_crawler import crawl_district
+
+    done = 0
+    while True:
+        unit = work_queue.lease(owner)
+        if unit is None:
+            if not work_queue.outstanding():
+                return done
+            time.sleep(POLL_SECONDS)  # 别的进程还在爬，可能放入后续页码段或因失败放回队列
+            continue
+        if unit['next_page'] > unit['last_page']:
+            # 上一个进程爬完最后一页后、标记完成前退出，或重新 seed 调低了上限：各页都已保存，直接完成；
+            # 到了页数上限的记为未到末页（以后调高上限时接着爬），否则区域是否还有后续页已无从判断，按已到末页处理
+            print(f"\n📦 {tag}{unit['unit_id']} 各页均已爬完，直接标记完成")
+            try:
+                work_queue.complete(unit, owner, unit['last_page'] < unit['max_pages'], shard)
+                done += 1
+            except LeaseLost:
+                print(f"{tag}租约已过期并被其他进程接手，放弃该单元: {unit['unit_id']}")
+            continue
+        print(f"\n📦 {tag}领取 {unit['city'] or '未知城市'} 第 {unit['next_page']}-{unit['last_page']} 页"
+              f"（第 {unit['attempts']} 次尝试）")
+        heartbeat = Heartbeat(work_queue, unit['unit_id'], owner)
+        journal = UnitJournal(work_queue, unit, owner, heartbeat)
+        try:
+            crawl_district(fetcher, unit['district'], max_pages=unit['last_page'], tag=tag, journal=journal,
+                           **crawl_kwargs)
+            work_queue.complete(unit, owner, journal.exhausted, shard)
+            done += 1
+        except LeaseLost:
+            print(f"{tag}租约已过期并被其他进程接手，放弃该单元: {unit['unit_id']}")
+        except Exception as e:
+            status = work_queue.fail(unit, owner, e)
+            print(f"{tag}爬取单元出错（{'已标记失败' if status == 'failed' else '稍后重试'}）: {unit['unit_id']} {str(e)}")
+        finally:
+            heartbeat.stop()
+
+
+def work(config, path=QUEUE_FILE):
+    """按配置启动 workers 个浏览器，各自从队列领取单元，直到队列做完"""
+    from lianjia_selenium_crawler import (PROFILE_DIR, RECYCLE_AFTER_PAGES, make_fetcher, shared_limiter,
+                                          write_metrics_report)
+    from crawl_metrics import METRICS
+    from listing_index import ListingIndex
+    from rate_limit import AdaptiveDelay
+    from replay import FixtureStore
+
+    base_delay = config.get('delay', 1)
+    limiter = shared_limiter(config, config.get('workers', 1))
+    shard = config.get('page_shard', PAGE_SHARD)
+    index = ListingIndex() if config.get('incremental') else None
+    crawl_kwargs = {
+        'base_delay': base_delay,
+        'parser': config.get('parser', 'bs4'),
+        'batch_features': config.get('batch_features', False),
+        'limiter': limiter,
+        'index': index,
+        'stop_ratio': config.get('incremental_stop_ratio', 0.8),
+        'scheduler': AdaptiveDelay(base_delay, config.get('min_delay'), config.get('max_delay')),
+        'recorder': FixtureStore(config['record_fixtures']) if config.get('record_fixtures') else None,
+    }
+    host = f"{socket.gethostname()}-{os.getpid()}"
+    METRICS.reset()
+
+    def worker(worker_id):
+        tag = f"[W{worker_id}] "
+        profile_dir = PROFILE_DIR if worker_id == 1 else f"{PROFILE_DIR}_{worker_id}"
+        fetcher = make_fetcher(config.get('fetch_mode', 'selenium'), profile_dir, tag,
+                               config.get('recycle_after_pages', RECYCLE_AFTER_PAGES), limiter)
+        if not fetcher:
+            return
+        work_queue = WorkQueue(path)
+        try:
+            run_worker(work_queue, f"{host}-W{worker_id}", fetcher, crawl_kwargs, shard, tag)
+        finally:
+            fetcher.close()
+            work_queue.close()
+
+    threads = [threading.Thread(target=worker, args=(i + 1,), daemon=True)
+               for i in range(config.get('workers', 1))]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if index is not None:
+            index.close()
+    write_metrics_report(config.get('metrics_formats', ['json']))
+
+
+def export(config, path=QUEUE_FILE):
+    """把队列中所有已爬房源导出为结果文件，返回主文件路径"""
+    import pandas as pd
+
+    from lianjia_selenium_crawler import save_to_excel
+    from output_writer import export_rows, usable_formats
+
+    formats = usable_formats(config.get('output_formats', ['xlsx']))
+    work_queue = WorkQueue(path)
+    try:
+        output_file = os.path.join('data', f'链家租房数据_Queue_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
+        row_count, paths = export_rows(work_queue.iter_rows(), output_file, formats)
+        if row_count and 'xlsx' in formats and output_file not in paths:
+            # 未安装 xlsxwriter 时回退到原来的 openpyxl 写法
+            save_to_excel(pd.DataFrame(list(work_queue.iter_rows())), output_file)
+            paths.insert(0, output_file)
+    finally:
+        work_queue.close()
+    if not row_count:
+        print("❌ 队列中没有已爬取的房源")
+        return None
+    main_file = output_file if output_file in paths else paths[0]
+    with open('last_file.txt', 'w', encoding='utf-8') as f:
+        f.write(main_file)
+    print(f"✅ 共导出 {row_count} 条房源")
+    return main_file
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='多城市分片爬取工作队列')
+    arg_parser.add_argument('command', choices=['seed', 'work', 'status', 'retry-failed', 'export'])
+    arg_parser.add_argument('--config', default='config.json')
+    args = arg_parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    register_cities(config)
+    queue_file = config.get('queue_file', QUEUE_FILE)
+
+    if args.command == 'seed':
+        work_queue = WorkQueue(queue_file)
+        districts = district_urls(config)
+        added = work_queue.seed(districts, config.get('page_shard', PAGE_SHARD))
+        print(f"✅ {len(districts)} 个区域，放入或调整了 {added} 个工作单元")
+        work_queue.close()
+    elif args.command == 'work':
+        work(config, queue_file)
+    elif args.command == 'status':
+        work_queue = WorkQueue(queue_file)
+        status = work_queue.status()
+        work_queue.close()
+        print("单元：" + "，".join(f"{name} {count}" for name, count in sorted(status['units'].items())))
+        print(f"已爬 {status['pages']} 页，{status['rows']} 条房源")
+        for unit in status['failed']:
+            print(f"  失败 {unit['unit_id']}（{unit['attempts']} 次）: {unit['error']}")
+    elif args.command == 'retry-failed':
+        work_queue = WorkQueue(queue_file)
+        print(f"已放回 {work_queue.retry_failed()} 个失败单元")
+        work_queue.close()
+    else:
+        export(config, queue_file)
@@ -0,0 +1,144 @@
+# fast_parser.py
+"""基于 lxml 预编译 XPath 的列表页解析后端
+
+与 lianjia_selenium_crawler.parse_house（BeautifulSoup 参考实现）逐字段对齐，
+同一页面两种后端输出的字典完全一致，只是速度更快。
+"""
+from datetime import datetime
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from city_sites import DEFAULT_SITE
+from crawl_metrics import METRICS
+from feature_extract import classify_features
+
+_PARSER = etree.HTMLParser(encoding='utf-8')
+
+
+def _class_xpath(tag, cls):
+    """等价于 BeautifulSoup 的 find(tag, class_=cls)：class 属性按空白切分后包含 cls"""
+    return etree.XPath(f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]")
+
+
+XP_HOUSES = _class_xpath('div', 'content__list--item')
+XP_TITLE = _class_xpath('a', 'content__list--item--aside')
+XP_PRICE = _class_xpath('span', 'content__list--item-price')
+XP_DES = _class_xpath('p', 'content__list--item--des')
+XP_BOTTOM = _class_xpath('p', 'content__list--item--bottom')
+XP_BRAND_P = _class_xpath('p', 'content__list--item--brand')
+XP_BRAND = _class_xpath('span', 'brand')
+XP_TIME = _class_xpath('span', 'content__list--item--time')
+XP_VR = _class_xpath('i', 'vr-logo')
+XP_MUST_SEE = etree.XPath(".//img[@alt='必看好房']")
+XP_LINKS = etree.XPath('.//a')
+XP_ITAGS = etree.XPath('.//i')
+XP_TEXT = etree.XPath('.//text()')
+
+
+def _first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _stripped_strings(node):
+    """等价于 BeautifulSoup 的 stripped_strings"""
+    for text in XP_TEXT(node):
+        text = text.strip()
+        if text:
+            yield text
+
+
+def _text(node):
+    """等价于 BeautifulSoup 的 get_text(strip=True)"""
+    return ''.join(_stripped_strings(node))
+
+
+def extract_location_info(des_tag, site_url=DEFAULT_SITE):
+    location_data = {'一级区域': '', '二级区域': '', '小区名称': '', '小区链接': ''}
+    if des_tag is not None:
+        try:
+            links = XP_LINKS(des_tag)
+            if len(links) >= 1:
+                location_data['一级区域'] = _text(links[0])
+            if len(links) >= 2:
+                location_data['二级区域'] = _text(links[1])
+            if len(links) >= 3:
+                location_data['小区名称'] = _text(links[2])
+                location_data['小区链接'] = site_url + links[2].attrib['href']
+        except Exception as e:
+            print(f"提取位置信息出错: {str(e)}")
+    return location_data
+
+
+def parse_house(house, crawl_time=None, raw_features=False, site_url=DEFAULT_SITE) -> dict:
+    data = {}
+    try:
+        title_tag = _first(XP_TITLE, house)
+        data['标题'] = title_tag.get('title', '').strip() if title_tag is not None else ''
+        data['链接'] = site_url + title_tag.get('href', '').strip() if title_tag is not None else ''
+
+        price_tag = _first(XP_PRICE, house)
+        if price_tag is not None:
+            price_text = _text(price_tag)
+            data['价格(元)'] = int(''.join(filter(str.isdigit, price_text)))
+            data['价格单位'] = price_text.replace(str(data['价格(元)']), '').strip()
+
+        des_tag = _first(XP_DES, house)
+        data.update(extract_location_info(des_tag, site_url))
+
+        if des_tag is not None:
+            features = [f for f in _stripped_strings(des_tag) if f not in ['-', '/']]
+            if raw_features:
+                data['描述片段'] = features  # 留给 feature_extract.apply_features 整批提取
+            else:
+                classify_features(features, data)
+
+        tags = _first(XP_BOTTOM, house)
+        if tags is not None:
+            tag_list = [_text(tag) for tag in XP_ITAGS(tags)]
+            data['标签'] = '|'.join(tag_list)
+            data['官方核验'] = '官方核验' in tag_list
+            data['近地铁'] = '近地铁' in tag_list
+            data['精装'] = '精装' in tag_list
+
+        brand_tag = _first(XP_BRAND_P, house)
+        if brand_tag is not None:
+            brand = _first(XP_BRAND, brand_tag)
+            data['中介公司'] = _text(brand) if brand is not None else ''
+            time_tag = _first(XP_TIME, brand_tag)
+            data['维护时间'] = _text(time_tag) if time_tag is not None else ''
+
+        data['必看好房'] = bool(XP_MUST_SEE(house))
+        data['VR看房'] = bool(XP_VR(house))
+        data['爬取时间'] = crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    except Exception as e:
+        METRICS.incr('parse_errors')
+        print(f"解析房源出错: {str(e)}")
+    return data
+
+
+def peek_house(house, site_url=DEFAULT_SITE):
+    """只取链接、价格、维护时间，用于增量爬取时判断是否需要完整解析"""
+    title_tag = _first(XP_TITLE, house)
+    link = site_url + title_tag.get('href', '').strip() if title_tag is not None else ''
+    price_tag = _first(XP_PRICE, house)
+    digits = ''.join(filter(str.isdigit, _text(price_tag))) if price_tag is not None else ''
+    brand_tag = _first(XP_BRAND_P, house)
+    time_tag = _first(XP_TIME, brand_tag) if brand_tag is not None else None
+    return link, int(digits) if digits else None, _text(time_tag) if time_tag is not None else ''
+
+
+def find_houses(page_source):
+    """返回页面中的房源节点列表"""
+    if not page_source or not page_source.strip():
+        return []
+    root = lxml_html.document_fromstring(page_source.encode('utf-8'), parser=_PARSER)
+    return XP_HOUSES(root)
+
+
+def parse_page(page_source, crawl_time=None):
+    """解析整页 HTML，返回每条房源的字典（含未取到标题的空记录，与参考实现一致）"""
+    crawl_time = crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # 整页共用一个爬取时间
+    return [parse_house(house, crawl_time) for house in find_houses(page_source)]
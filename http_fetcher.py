@@ -0,0 +1,281 @@
+# http_fetcher.py
+"""列表页抓取层
+
+- SeleniumFetcher：原有方式，每页都用 Chrome 渲染
+- LightweightFetcher：无头 Chrome，屏蔽图片/字体/媒体和统计脚本，定期重启浏览器，只在需要人工验证时切换到有界面窗口
+- HybridFetcher：默认走长连接 HTTP 会话直接取静态列表 HTML，复用浏览器保存下来的 cookie；
+  只有被重定向到验证码/拦截页时才启动（或复用）Selenium 浏览器，人工验证后把新 cookie 同步回 HTTP 会话
+"""
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from crawl_metrics import METRICS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CHALLENGE_KEYWORDS = ("captcha", "verify", "unauthorized")
+COOKIE_FILE = os.path.join('data', 'lianjia_cookies.json')
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+PAGE_READY_SELECTOR = 'div.content__list--item'
+PAGE_READY_TIMEOUT = 10  # 等待列表渲染的最长秒数，超时后照常取页面内容
+
+_cookie_lock = threading.Lock()
+
+
+def is_challenge_url(url):
+    """与原爬虫相同的判定：跳转地址里带 captcha/verify/unauthorized 即为人机验证或拦截页"""
+    return any(keyword in (url or '') for keyword in CHALLENGE_KEYWORDS)
+
+
+def _page_ready(driver):
+    """列表项已出现、已跳到验证页，或页面加载完成（没有房源的空页）时视为就绪"""
+    if is_challenge_url(driver.current_url):
+        return True
+    if driver.find_elements(By.CSS_SELECTOR, PAGE_READY_SELECTOR):
+        return True
+    return driver.execute_script("return document.readyState") == 'complete'
+
+
+def _wait_limiter(limiter, url):
+    """同一页面的再次请求（浏览器回退、有界面窗口重开）也计入按域名的限速"""
+    if limiter is not None:
+        with METRICS.timer('rate_limit'):
+            limiter.wait(url)
+
+
+def load_in_browser(driver, url, prompt):
+    """浏览器加载页面，等到列表渲染完成（最多 PAGE_READY_TIMEOUT 秒），跳到验证页时提示人工处理
+
+    prompt 为 None 时只记录验证不提示（由调用方自行处理）。返回 (页面 HTML, 是否遇到验证)；各步耗时计入 METRICS。
+    """
+    with METRICS.timer('driver_get'):
+        driver.get(url)
+    with METRICS.timer('render_wait'):
+        try:
+            WebDriverWait(driver, PAGE_READY_TIMEOUT, poll_frequency=0.2).until(_page_ready)
+        except TimeoutException:
+            METRICS.incr('page_ready_timeouts')
+    challenged = is_challenge_url(driver.current_url)
+    if challenged:
+        METRICS.incr('captcha')
+        if prompt is not None:
+            with METRICS.timer('captcha_wait'):
+                prompt()
+    return driver.page_source, challenged
+
+
+class SeleniumFetcher:
+    """每页都通过浏览器加载"""
+
+    def __init__(self, driver, prompt):
+        self.driver = driver
+        self.prompt = prompt
+        self.challenged = False  # 最近一次抓取是否遇到验证，供自适应延迟参考
+
+    def fetch(self, url):
+        page_source, self.challenged = load_in_browser(self.driver, url, self.prompt)
+        return page_source
+
+    def close(self):
+        self.driver.quit()
+
+
+def driver_rss_mb(driver):
+    """chromedriver 及其启动的所有 Chrome 进程的常驻内存（MB），未安装 psutil 时返回 None"""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / 1024 / 1024
+    except Exception:
+        return None
+
+
+class LightweightFetcher:
+    """无头、屏蔽图片等资源的轻量浏览器，每 recycle_after 页重启一次以控制内存增长
+
+    driver_factory(headless) 返回新浏览器（同一个用户目录）。遇到验证时关闭无头浏览器，
+    用有界面的窗口打开同一地址供人工处理，完成后关闭窗口，下一页重新启动无头浏览器（验证状态保存在用户目录中）。
+    limiter 为共享的 HostRateLimiter 时，有界面窗口重新打开页面也先经过限速。
+    """
+
+    def __init__(self, driver_factory, prompt, recycle_after=200, limiter=None):
+        self.driver_factory = driver_factory
+        self.prompt = prompt
+        self.recycle_after = recycle_after
+        self.limiter = limiter
+        self.driver = None
+        self.driver_pages = 0
+        self.challenged = False
+
+    def _quit(self):
+        if self.driver is None:
+            return
+        rss = driver_rss_mb(self.driver)
+        if rss is not None:
+            METRICS.set_gauge('browser_rss_mb_max', max(rss, METRICS.gauges.get('browser_rss_mb_max', 0)))
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"关闭浏览器出错: {str(e)}")
+        self.driver = None
+        self.driver_pages = 0
+
+    def _solve_in_headed(self, url):
+        """关闭无头浏览器，在可见窗口中人工完成验证，返回验证后的页面 HTML"""
+        self._quit()
+        METRICS.incr('headed_switches')
+        headed = self.driver_factory(False)
+        if headed is None:
+            raise RuntimeError("浏览器启动失败，无法处理人机验证")
+        _wait_limiter(self.limiter, url)
+        try:
+            with METRICS.timer('captcha_wait'):
+                headed.get(url)
+                self.prompt()
+            return headed.page_source
+        finally:
+            headed.quit()
+
+    def fetch(self, url):
+        if self.driver is not None and self.driver_pages >= self.recycle_after:
+            METRICS.incr('driver_restarts')
+            self._quit()
+        if self.driver is None:
+            self.driver = self.driver_factory(True)
+            if self.driver is None:
+                raise RuntimeError("无头浏览器启动失败")
+        page_source, self.challenged = load_in_browser(self.driver, url, None)
+        self.driver_pages += 1
+        if self.challenged:
+            page_source = self._solve_in_headed(url)
+        return page_source
+
+    def close(self):
+        self._quit()
+
+
+class HybridFetcher:
+    """HTTP 优先，遇到验证时回退到 Selenium
+
+    limiter 为共享的 HostRateLimiter 时，回退到浏览器重新加载页面也先经过限速（HTTP 请求由 crawl_district 限速）。
+    """
+
+    def __init__(self, driver_factory, prompt, cookie_file=COOKIE_FILE, pool_size=4, timeout=15, limiter=None):
+        self.driver_factory = driver_factory
+        self.prompt = prompt
+        self.cookie_file = cookie_file
+        self.limiter = limiter
+        self.timeout = timeout
+        self.driver = None
+        self.challenged = False  # 最近一次抓取是否被重定向到验证页（HTTP 或浏览器）
+        self.http_pages = 0
+        self.browser_pages = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=Retry(total=2, backoff_factor=1,
+                                                status_forcelist=[500, 502, 503, 504]))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': DEFAULT_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'zh-CN,zh;q=0.9',
+        })
+        self._load_cookies()
+
+    def _load_cookies(self):
+        """读取上次浏览器验证后导出的 cookie"""
+        if not os.path.exists(self.cookie_file):
+            return
+        try:
+            with _cookie_lock, open(self.cookie_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            for cookie in saved.get('cookies', []):
+                self.session.cookies.set(cookie['name'], cookie['value'],
+                                         domain=cookie.get('domain'), path=cookie.get('path', '/'))
+            if saved.get('user_agent'):
+                self.session.headers['User-Agent'] = saved['user_agent']
+        except Exception as e:
+            print(f"读取cookie文件失败: {str(e)}")
+
+    def _sync_cookies_from_driver(self):
+        """把浏览器中的 cookie 与 UA 同步到 HTTP 会话，并保存到文件供下次运行复用"""
+        try:
+            cookies = self.driver.get_cookies()
+            user_agent = self.driver.execute_script("return navigator.userAgent")
+            for cookie in cookies:
+                self.session.cookies.set(cookie['name'], cookie['value'],
+                                         domain=cookie.get('domain'), path=cookie.get('path', '/'))
+            self.session.headers['User-Agent'] = user_agent
+            os.makedirs(os.path.dirname(self.cookie_file) or '.', exist_ok=True)
+            with _cookie_lock, open(self.cookie_file, 'w', encoding='utf-8') as f:
+                json.dump({'cookies': cookies, 'user_agent': user_agent}, f, ensure_ascii=False)
+        except Exception as e:
+            print(f"同步浏览器cookie失败: {str(e)}")
+
+    def _fetch_http(self, url):
+        """返回页面 HTML；被拦截或请求失败时返回 None"""
+        try:
+            with METRICS.timer('http_get'):
+                response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            METRICS.incr('http_errors')
+            print(f"  HTTP 请求失败，改用浏览器: {str(e)}")
+            return None
+        redirects = [r.headers.get('Location', '') for r in response.history]
+        if is_challenge_url(response.url) or any(is_challenge_url(loc) for loc in redirects):
+            METRICS.incr('http_challenges')
+            self.challenged = True
+            print("  HTTP 请求被重定向到验证页，改用浏览器")
+            return None
+        if response.status_code != 200:
+            METRICS.incr('http_errors')
+            print(f"  HTTP 状态码 {response.status_code}，改用浏览器")
+            return None
+        if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = 'utf-8'
+        return response.text
+
+    def _fetch_browser(self, url):
+        if self.driver is None:
+            self.driver = self.driver_factory()
+            if self.driver is None:
+                raise RuntimeError("浏览器启动失败，无法处理人机验证")
+        page_source, challenged = load_in_browser(self.driver, url, self.prompt)
+        self.challenged = self.challenged or challenged
+        self._sync_cookies_from_driver()
+        return page_source
+
+    def fetch(self, url):
+        self.challenged = False
+        page_source = self._fetch_http(url)
+        if page_source is not None:
+            self.http_pages += 1
+            METRICS.incr('http_pages')
+            return page_source
+        self.browser_pages += 1
+        METRICS.incr('browser_pages')
+        _wait_limiter(self.limiter, url)
+        return self._fetch_browser(url)
+
+    def close(self):
+        print(f"  HTTP 直取 {self.http_pages} 页，浏览器加载 {self.browser_pages} 页")
+        self.session.close()
+        if self.driver is not None:
+            self.driver.quit()
@@ -1,9 +1,11 @@
 # lianjia_selenium_crawler.py
 import time
 import random
+import argparse
 import json
 import os
-import re
+import queue
+import threading
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
@@ -11,24 +13,65 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
+from rate_limit import HostRateLimiter, AdaptiveDelay
+from http_fetcher import SeleniumFetcher, HybridFetcher, LightweightFetcher
+from listing_index import ListingIndex, extract_listing_id
+from crawl_checkpoint import CrawlJournal
+from output_writer import export_rows, usable_formats
+from listing_record import RecordBatchBuilder
+from price_history import PriceHistory
+from rent_cube import merge_crawl
+from replay import REPLAY_COOKIE_FILE, FixtureStore, ReplayBrowser
+from feature_extract import classify_features, apply_features
+from crawl_metrics import METRICS
+from city_sites import DEFAULT_SITE, district_urls, register_cities, site_of
 
 # 配置路径
 CONFIG_FILE = 'config.json'
 DATA_DIR = 'data'
 os.makedirs(DATA_DIR, exist_ok=True)
+PROFILE_DIR = 'C:\\Temp\\LianjiaProfile_Selenium'  # 保存登录/验证状态，多浏览器时依次加 _2、_3 后缀
+INPUT_LOCK = threading.Lock()
+RECYCLE_AFTER_PAGES = 200  # 轻量模式下每个浏览器加载多少页后重启，避免内存持续增长
+DELAY_JITTER = (0.5, 1.5)  # 翻页间隔在自适应延迟之上再加的随机秒数范围（基准测试时设为 0）
+LIGHTWEIGHT_ARGS = [
+    "--headless=new", "--disable-gpu", "--window-size=1366,900", "--mute-audio", "--no-first-run",
+    "--disable-extensions", "--disable-background-networking", "--disable-sync",
+    "--disable-default-apps", "--disable-component-update", "--blink-settings=imagesEnabled=false",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+]
+# 列表页只需要 HTML：图片、字体、媒体和第三方统计脚本一律不加载
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.mp3", "*.m3u8",
+    "*ljcdn.com/*.jpg*", "*hm.baidu.com*", "*google-analytics.com*", "*googletagmanager.com*",
+    "*dig.lianjia.com*", "*sentry*", "*vr.lianjia.com*", "*realsee*",
+]
 OUTPUT_FILE = os.path.join(DATA_DIR, f'链家租房数据_Selenium_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
-def init_driver():
-    """初始化带持久化配置的 Chrome 浏览器"""
+def init_driver(profile_dir=PROFILE_DIR, lightweight=False):
+    """初始化带持久化配置的 Chrome 浏览器
+
+    lightweight=True 时为无头轻量模式：不加载图片、字体、媒体和统计脚本，关闭用不到的后台功能，
+    DOMContentLoaded 后即返回（无法人工过验证，需要验证时由 LightweightFetcher 切换到有界面窗口）。
+    """
     chrome_options = Options()
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_argument("user-data-dir=C:\\Temp\\LianjiaProfile_Selenium")  # 保存登录/验证状态
+    chrome_options.add_argument(f"user-data-dir={profile_dir}")  # 保存登录/验证状态
 
     # 静默模式（可选）：取消下面两行注释可后台运行（但无法人工过验证！）
     # chrome_options.add_argument("--headless")
     # chrome_options.add_argument("--disable-gpu")
+    if lightweight:
+        for arg in LIGHTWEIGHT_ARGS:
+            chrome_options.add_argument(arg)
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+        chrome_options.page_load_strategy = 'eager'
 
     try:
         from webdriver_manager.chrome import ChromeDriverManager
@@ -46,6 +89,9 @@ def init_driver():
                 };
             '''
         })
+        if lightweight:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
         return driver
     except Exception as e:
         print(f"初始化浏览器失败: {e}")
@@ -68,12 +114,15 @@ def load_config():
 
     with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
         config = json.load(f)
-    return config['urls'], config.get('max_pages', 5), config.get('delay', 1)
+    register_cities(config)
+    # [(区域URL, 最大页数)]："cities" 中各城市的区域展开后排在 "urls" 之前，各城市可单独设置 max_pages
+    targets = [(url, max_pages) for _, url, max_pages in district_urls(config)]
+    return targets, config.get('delay', 1), config
 
 
 # ========== 保留你原有的解析函数 ==========
 
-def extract_location_info(des_tag):
+def extract_location_info(des_tag, site_url=DEFAULT_SITE):
     location_data = {'一级区域': '', '二级区域': '', '小区名称': '', '小区链接': ''}
     if des_tag:
         try:
@@ -84,18 +133,19 @@ def extract_location_info(des_tag):
                 location_data['二级区域'] = links[1].get_text(strip=True)
             if len(links) >= 3:
                 location_data['小区名称'] = links[2].get_text(strip=True)
-                location_data['小区链接'] = 'https://sh.lianjia.com' + links[2]['href']
+                location_data['小区链接'] = site_url + links[2]['href']
         except Exception as e:
             print(f"提取位置信息出错: {str(e)}")
     return location_data
 
 
-def parse_house(house) -> dict:
+def parse_house(house, crawl_time=None, raw_features=False, site_url=DEFAULT_SITE) -> dict:
+    """site_url 为列表页所在站点（如 https://bj.lianjia.com），用于拼接房源和小区链接"""
     data = {}
     try:
         title_tag = house.find('a', class_='content__list--item--aside')
         data['标题'] = title_tag.get('title', '').strip() if title_tag else ''
-        data['链接'] = 'https://sh.lianjia.com' + title_tag.get('href', '').strip() if title_tag else ''
+        data['链接'] = site_url + title_tag.get('href', '').strip() if title_tag else ''
 
         price_tag = house.find('span', class_='content__list--item-price')
         if price_tag:
@@ -104,25 +154,14 @@ def parse_house(house) -> dict:
             data['价格单位'] = price_text.replace(str(data['价格(元)']), '').strip()
 
         des_tag = house.find('p', class_='content__list--item--des')
-        data.update(extract_location_info(des_tag))
+        data.update(extract_location_info(des_tag, site_url))
 
         if des_tag:
             features = [f.strip() for f in des_tag.stripped_strings if f.strip() not in ['-', '/']]
-            for item in features:
-                if '㎡' in item:
-                    data['面积(㎡)'] = float(''.join(filter(lambda x: x.isdigit() or x == '.', item)))
-                elif any(c in item for c in ['东', '南', '西', '北']):
-                    data['朝向'] = item
-                elif any(c in item for c in ['室', '厅', '卫']):
-                    data['户型'] = item
-                elif '层' in item:
-                    data['楼层'] = item
-                    if '（' in item and '）' in item:
-                        nums = re.findall(r'(\d+)层', item)
-                        if nums:
-                            data['总楼层'] = int(nums[-1])
-                elif '年建' in item:
-                    data['建成年份'] = int(''.join(filter(str.isdigit, item)))
+            if raw_features:
+                data['描述片段'] = features  # 留给 feature_extract.apply_features 整批提取
+            else:
+                classify_features(features, data)
 
         tags = house.find('p', class_='content__list--item--bottom')
         if tags:
@@ -134,20 +173,75 @@ def parse_house(house) -> dict:
 
         brand_tag = house.find('p', class_='content__list--item--brand')
         if brand_tag:
-            data['中介公司'] = brand_tag.find('span', class_='brand').get_text(strip=True) if brand_tag.find('span',
-                                                                                                             class_='brand') else ''
-            data['维护时间'] = brand_tag.find('span', class_='content__list--item--time').get_text(
-                strip=True) if brand_tag.find('span', class_='content__list--item--time') else ''
+            brand = brand_tag.find('span', class_='brand')
+            data['中介公司'] = brand.get_text(strip=True) if brand else ''
+            time_tag = brand_tag.find('span', class_='content__list--item--time')
+            data['维护时间'] = time_tag.get_text(strip=True) if time_tag else ''
 
         data['必看好房'] = bool(house.find('img', alt='必看好房'))
         data['VR看房'] = bool(house.find('i', class_='vr-logo'))
-        data['爬取时间'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        data['爬取时间'] = crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     except Exception as e:
+        METRICS.incr('parse_errors')
         print(f"解析房源出错: {str(e)}")
     return data
 
 
+def peek_house(house, site_url=DEFAULT_SITE):
+    """只取链接、价格、维护时间，用于增量爬取时判断是否需要完整解析"""
+    title_tag = house.find('a', class_='content__list--item--aside')
+    link = site_url + title_tag.get('href', '').strip() if title_tag else ''
+    price_tag = house.find('span', class_='content__list--item-price')
+    digits = ''.join(filter(str.isdigit, price_tag.get_text(strip=True))) if price_tag else ''
+    brand_tag = house.find('p', class_='content__list--item--brand')
+    time_tag = brand_tag.find('span', class_='content__list--item--time') if brand_tag else None
+    return link, int(digits) if digits else None, time_tag.get_text(strip=True) if time_tag else ''
+
+
+def _page_houses(page_source, parser):
+    """返回 (房源节点列表, 解析函数, 预读函数)，parser 可选 'bs4'（参考实现）或 'lxml'"""
+    if parser == 'lxml':
+        try:
+            import fast_parser
+            return fast_parser.find_houses(page_source), fast_parser.parse_house, fast_parser.peek_house
+        except ImportError:
+            print("未安装 lxml，回退到 BeautifulSoup 解析")
+    soup = BeautifulSoup(page_source, 'html.parser')
+    return soup.find_all('div', class_='content__list--item'), parse_house, peek_house
+
+
+def parse_page(page_source, parser='bs4', crawl_time=None, batch_features=False, site_url=DEFAULT_SITE):
+    """解析整页房源，parser 可选 'bs4'（参考实现）或 'lxml'（预编译 XPath，输出一致）
+
+    batch_features=True 时先只收集描述片段，再由 feature_extract 整批提取面积、朝向等字段，
+    适合一次处理大量已保存页面；单页只有 30 条左右时逐条判断更快。
+    """
+    houses, parse, _ = _page_houses(page_source, parser)
+    crawl_time = crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # 整页共用一个爬取时间
+    rows = [parse(house, crawl_time, raw_features=batch_features, site_url=site_url) for house in houses]
+    return apply_features(rows) if batch_features else rows
+
+
+def parse_page_incremental(page_source, index, parser='bs4', crawl_time=None, site_url=DEFAULT_SITE,
+                           batch_features=False):
+    """增量解析：索引中价格和维护时间都未变的房源直接跳过
+
+    返回 (新增或变化的房源列表, 跳过的已知房源编号列表)；batch_features 同 parse_page
+    """
+    houses, parse, peek = _page_houses(page_source, parser)
+    crawl_time = crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows, known_ids = [], []
+    for house in houses:
+        link, price, maintain_time = peek(house, site_url)
+        listing_id = extract_listing_id(link)
+        if index.is_known(listing_id, price, maintain_time, crawl_time):
+            known_ids.append(listing_id)
+        else:
+            rows.append(parse(house, crawl_time, raw_features=batch_features, site_url=site_url))
+    return (apply_features(rows) if batch_features else rows), known_ids
+
+
 def save_to_excel(df: pd.DataFrame, filename: str):
     try:
         for col in ['一级区域', '二级区域', '小区名称']:
@@ -173,71 +267,297 @@ def save_to_excel(df: pd.DataFrame, filename: str):
 
 # ============================================
 
-def crawl_with_selenium():
-    urls, max_pages, base_delay = load_config()
-    driver = init_driver()
+def wait_for_manual_verify(tag=''):
+    """提示人工处理验证；多个浏览器同时遇到验证时逐个提示"""
+    with INPUT_LOCK:
+        print(f"⚠️ {tag}检测到人机验证或拦截页面，请手动完成验证...")
+        input(f"👉 {tag}验证完成后，请确保已回到房源列表页，然后按回车继续...")
+
+
+def make_fetcher(fetch_mode='selenium', profile_dir=PROFILE_DIR, tag='', recycle_after=RECYCLE_AFTER_PAGES,
+                 limiter=None):
+    """按配置创建抓取器：'selenium' 每页用浏览器，'hybrid' 先走 HTTP、遇验证再用浏览器，
+    'lightweight' 用无头轻量浏览器（每 recycle_after 页重启），遇验证切换到有界面窗口，
+    'replay' 对本地模拟站点（replay.StubSite）抓取，遇验证由模拟浏览器自动完成
+    limiter 为 crawl_district 使用的同一个限速器，验证时的再次请求也经过它"""
+    prompt = lambda: wait_for_manual_verify(tag)
+    if fetch_mode == 'replay':
+        return HybridFetcher(ReplayBrowser, None, cookie_file=REPLAY_COOKIE_FILE, limiter=limiter)
+    if fetch_mode == 'hybrid':
+        return HybridFetcher(lambda: init_driver(profile_dir), prompt, limiter=limiter)
+    if fetch_mode == 'lightweight':
+        return LightweightFetcher(lambda headless: init_driver(profile_dir, lightweight=headless), prompt,
+                                  recycle_after, limiter)
+    driver = init_driver(profile_dir)
     if not driver:
-        return
-
-    all_data = []
-
-    try:
-        for base_url in urls:
-            print(f"\n🚀 开始爬取区域: {base_url}")
-            page = 1
-
-            for page in range(1, max_pages + 1):
-                url = f"{base_url}pg{page}/"
-                print(f"  ➤ 访问第 {page} 页: {url}")
-
-                driver.get(url)
-                time.sleep(2)
-
-                # 检查是否跳转到验证码/拦截页
-                current_url = driver.current_url
-                if "captcha" in current_url or "verify" in current_url or "unauthorized" in current_url:
-                    print("⚠️ 检测到人机验证或拦截页面，请手动完成验证...")
-                    input("👉 验证完成后，请确保已回到房源列表页，然后按回车继续...")
-
-                # 解析页面
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
-                houses = soup.find_all('div', class_='content__list--item')
-
-                if not houses:
-                    print("  📭 本页无房源，提前终止")
+        return None
+    return SeleniumFetcher(driver, prompt)
+
+
+def crawl_district(fetcher, base_url, max_pages, base_delay, parser='bs4', limiter=None, tag='',
+                   index=None, stop_ratio=0.8, journal=None, scheduler=None, recorder=None, batch_features=False):
+    """逐页爬取单个区域，返回该区域的房源列表
+
+    传入 index 时为增量模式：只返回新增或价格/维护时间变化的房源，
+    某页已知房源占比达到 stop_ratio 时不再继续翻页。
+    传入 journal 时每页结果写入断点日志而不在内存中累积（返回空列表），
+    并从日志记录的最后完成页之后继续。
+    scheduler 为共享的 AdaptiveDelay，按验证码/空页/正常页调整翻页间隔；不传时以 base_delay 为下限单独调整。
+    recorder 为 replay.FixtureStore 时每页 HTML 录制为回放样本。
+    batch_features=True 时整页描述片段批量提取特征（config.json 中 "batch_features"，见 feature_extract.py）。
+    房源和小区链接按 base_url 所在站点拼接，其他城市（如 https://bj.lianjia.com/zufang/...）无需额外配置。
+    结束时调用 journal.finish_district(base_url, exhausted)：exhausted 为 False 表示只是到了 max_pages，后面可能还有页。
+    """
+    rows = []
+    site_url = site_of(base_url)
+    exhausted = True
+    scheduler = scheduler or AdaptiveDelay(base_delay)
+    start_page = journal.start_page(base_url) if journal else 1
+    print(f"\n🚀 {tag}开始爬取区域: {base_url}" + (f"（从第 {start_page} 页继续）" if start_page > 1 else ""))
+
+    with METRICS.district(base_url):
+        for page in range(start_page, max_pages + 1):
+            url = f"{base_url}pg{page}/"
+            print(f"  {tag}➤ 访问第 {page} 页: {url}")
+
+            if limiter:
+                with METRICS.timer('rate_limit'):
+                    limiter.wait(url)
+            # 抓取页面（遇到验证码/拦截页时由抓取器提示人工处理）
+            fetch_start = time.perf_counter()
+            with METRICS.timer('fetch'):
+                page_source = fetcher.fetch(url)
+            fetch_seconds = time.perf_counter() - fetch_start
+            METRICS.incr('pages')
+            delay_start = fetch_start
+            if getattr(fetcher, 'challenged', False):
+                scheduler.record(AdaptiveDelay.CAPTCHA)
+                delay_start = time.perf_counter()  # 人工验证用去的时间不能抵掉放大后的间隔
+
+            # 解析页面
+            parse_start = time.perf_counter()
+            with METRICS.timer('parse'), METRICS.profile():
+                if index is not None:
+                    houses, known_ids = parse_page_incremental(page_source, index, parser, site_url=site_url,
+                                                               batch_features=batch_features)
+                else:
+                    houses, known_ids = parse_page(page_source, parser, site_url=site_url,
+                                                   batch_features=batch_features), []
+            parse_seconds = time.perf_counter() - parse_start
+            page_total = len(houses) + len(known_ids)
+            if recorder is not None and (page_total or not getattr(fetcher, 'challenged', False)):
+                recorder.save_page(url, page_source)
+
+            if not page_total:
+                METRICS.incr('empty_pages')
+                scheduler.record(AdaptiveDelay.EMPTY)
+                METRICS.record_page(base_url, page, fetch_seconds=round(fetch_seconds, 3),
+                                    parse_seconds=round(parse_seconds, 3), listings=0, rows=0)
+                print(f"  {tag}📭 本页无房源，提前终止")
+                break
+
+            print(f"  {tag}📥 解析到 {page_total} 条房源" + (f"（已知未变 {len(known_ids)} 条）" if known_ids else ""))
+
+            # 提取数据
+            page_rows = [house_data for house_data in houses if house_data.get('标题')]
+            METRICS.incr('rows', len(page_rows))
+            if len(page_rows) < len(houses):
+                METRICS.incr('rows_without_title', len(houses) - len(page_rows))
+            if known_ids:
+                METRICS.incr('known_listings', len(known_ids))
+            METRICS.record_page(base_url, page, fetch_seconds=round(fetch_seconds, 3),
+                                parse_seconds=round(parse_seconds, 3), listings=page_total, rows=len(page_rows))
+            if journal:
+                with METRICS.timer('journal'):
+                    journal.record_page(base_url, page, page_rows)
+            else:
+                rows.extend(page_rows)
+
+            if index is not None:
+                with METRICS.timer('index_update'):
+                    index.update(page_rows, known_ids)
+                if len(known_ids) / page_total >= stop_ratio:
+                    print(f"  {tag}🛑 本页已知房源占比 {len(known_ids) / page_total:.0%}，增量爬取停止翻页")
                     break
 
-                print(f"  📥 解析到 {len(houses)} 条房源")
-
-                # 提取数据
-                for house in houses:
-                    house_data = parse_house(house)
-                    if house_data.get('标题'):
-                        all_data.append(house_data)
-
-                # ✅ 核心逻辑：如果本页 < 30 条，说明是最后一页，停止翻页
-                if len(houses) < 30:
-                    print("  🛑 本页房源少于30条，判定为最后一页，停止翻页")
+            # ✅ 核心逻辑：如果本页 < 30 条，说明是最后一页，停止翻页
+            if page_total < 30:
+                print(f"  {tag}🛑 本页房源少于30条，判定为最后一页，停止翻页")
+                break
+
+            # 延迟：间隔从本页开始请求时算起，抓取和解析已用去的时间不再重复等待；
+            # 遇到验证时从抓取返回（验证完成）时算起，验证之后至少再等满整个间隔
+            if not getattr(fetcher, 'challenged', False):
+                scheduler.record(AdaptiveDelay.OK)
+            delay = scheduler.current() + random.uniform(*DELAY_JITTER)
+            remaining = delay - (time.perf_counter() - delay_start)
+            if remaining > 0:
+                print(f"  {tag}⏳ 间隔 {delay:.1f} 秒，等待 {remaining:.1f} 秒后加载下一页...")
+                with METRICS.timer('delay'):
+                    time.sleep(remaining)
+        else:
+            exhausted = False  # 没有提前结束：到了 max_pages，该区域可能还有后续页
+
+    if journal:
+        journal.finish_district(base_url, exhausted)
+    return rows
+
+
+def crawl_with_pool(targets, workers, fetch_mode='selenium', recycle_after=RECYCLE_AFTER_PAGES, **crawl_kwargs):
+    """多个浏览器（各自独立的用户目录）从共享队列领取区域并行爬取，结果按配置顺序合并
+
+    targets 为 [(区域URL, 最大页数)]，crawl_kwargs 原样传给 crawl_district。
+    """
+    tasks = queue.Queue()
+    for target in targets:
+        tasks.put(target)
+    results = {}
+
+    def worker(worker_id):
+        tag = f"[W{worker_id}] "
+        profile_dir = PROFILE_DIR if worker_id == 1 else f"{PROFILE_DIR}_{worker_id}"
+        fetcher = make_fetcher(fetch_mode, profile_dir, tag, recycle_after, crawl_kwargs.get('limiter'))
+        if not fetcher:
+            return
+        try:
+            while True:
+                try:
+                    base_url, max_pages = tasks.get_nowait()
+                except queue.Empty:
                     break
+                try:
+                    results[base_url] = crawl_district(fetcher, base_url, max_pages, tag=tag, **crawl_kwargs)
+                except Exception as e:
+                    METRICS.incr('district_errors')
+                    print(f"{tag}爬取区域出错: {base_url} {str(e)}")
+        finally:
+            fetcher.close()
+
+    threads = [threading.Thread(target=worker, args=(i + 1,), daemon=True)
+               for i in range(min(workers, len(targets)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return [row for base_url, _ in targets for row in results.get(base_url, [])]
+
+
+def write_metrics_report(formats):
+    """输出本次运行的耗时分布，并按配置写出 JSON / Prometheus 报告和 cProfile 结果"""
+    METRICS.finish()
+    print("\n" + METRICS.summary())
+    try:
+        if 'json' in formats:
+            print(f"运行报告已保存到 {METRICS.write_json()}")
+        if 'prometheus' in formats:
+            print(f"Prometheus 指标已保存到 {METRICS.write_prometheus()}")
+        profile_text = METRICS.write_profile()
+        if profile_text:
+            print(profile_text)
+    except Exception as e:
+        print(f"保存运行报告失败: {str(e)}")
+
+
+def shared_limiter(config, workers=1):
+    """所有浏览器共享的按域名限速器
+
+    配置了 "max_requests_per_minute" 时按它限速；未配置且 workers > 1 时按 "delay" 折算（每 delay 秒一次），
+    多个浏览器合起来对同一站点的请求频率不超过单浏览器；单浏览器未配置时不限速（由翻页间隔控制）。
+    """
+    rpm = config.get('max_requests_per_minute')
+    delay = config.get('delay', 1)
+    if not rpm and workers > 1 and delay > 0:
+        rpm = 60 / delay
+    return HostRateLimiter(rpm) if rpm else None
+
+
+def crawl_to_journal(resume=False):
+    """按配置爬取所有区域，结果逐页写入断点日志；返回 (断点日志, 区域列表, 配置)，浏览器启动失败返回 None
+
+    日志已关闭，可用 journal.iter_rows(urls) 按区域顺序读回房源。
+    """
+    targets, base_delay, config = load_config()
+    urls = [base_url for base_url, _ in targets]
+    workers = config.get('workers', 1)
+    fetch_mode = config.get('fetch_mode', 'selenium')
+    recycle_after = config.get('recycle_after_pages', RECYCLE_AFTER_PAGES)
+    index = ListingIndex() if config.get('incremental') else None
+    journal = CrawlJournal(OUTPUT_FILE, resume=resume)
+    crawl_kwargs = {
+        'base_delay': base_delay,
+        'parser': config.get('parser', 'bs4'),
+        'batch_features': config.get('batch_features', False),
+        'limiter': shared_limiter(config, workers),
+        'index': index,
+        'stop_ratio': config.get('incremental_stop_ratio', 0.8),
+        'journal': journal,
+        'scheduler': AdaptiveDelay(base_delay, config.get('min_delay'), config.get('max_delay')),
+        'recorder': FixtureStore(config['record_fixtures']) if config.get('record_fixtures') else None,
+    }
+    pending = [(base_url, max_pages) for base_url, max_pages in targets if base_url not in journal.finished]
+    profile_parse = config.get('profile_parse', False)
+    if profile_parse and workers > 1:
+        print("cProfile 只支持单浏览器模式，本次不做解析性能采样")
+        profile_parse = False
+    METRICS.reset(profile=profile_parse)
 
-                # 延迟
-                delay = base_delay + random.uniform(0.5, 1.5)
-                print(f"  ⏳ 等待 {delay:.1f} 秒后加载下一页...")
-                time.sleep(delay)
-
+    try:
+        if workers > 1:
+            crawl_with_pool(pending, workers, fetch_mode, recycle_after, **crawl_kwargs)
+        else:
+            fetcher = make_fetcher(fetch_mode, recycle_after=recycle_after, limiter=crawl_kwargs['limiter'])
+            if not fetcher:
+                return None
+
+            try:
+                for base_url, max_pages in pending:
+                    crawl_district(fetcher, base_url, max_pages, **crawl_kwargs)
+            finally:
+                fetcher.close()
     finally:
-        driver.quit()
+        journal.close()
+        if index is not None:
+            index.close()
+    return journal, urls, config
 
-    # 保存结果
-    if all_data:
-        df = pd.DataFrame(all_data)
-        save_to_excel(df, OUTPUT_FILE)
+
+def crawl_with_selenium(resume=False):
+    crawled = crawl_to_journal(resume)
+    if crawled is None:
+        return
+    journal, urls, config = crawled
+    output_file = journal.output_file
+
+    # 保存结果：从断点日志读一遍装进紧凑记录（listing_record），导出、价格历史、租金汇总共用，逐条还原为字典
+    formats = usable_formats(config.get('output_formats', ['xlsx']))
+    batch = RecordBatchBuilder().extend(journal.iter_rows(urls))
+    with METRICS.timer('export'):
+        row_count, paths = export_rows(batch.iter_dicts(), output_file, formats)
+        if row_count and 'xlsx' in formats and output_file not in paths:
+            # 未安装 xlsxwriter 时回退到原来的 openpyxl 写法
+            save_to_excel(batch.to_dataframe(categorical=False), output_file)
+            paths.insert(0, output_file)
+    if row_count and config.get('price_history'):
+        store = PriceHistory()
+        try:
+            print(f"价格历史库已写入 {store.ingest_rows(batch.iter_dicts())} 条")
+        finally:
+            store.close()
+    if row_count and config.get('rent_cube'):
+        added, updated, expired = merge_crawl(batch.iter_dicts(), incremental=config.get('incremental', False))
+        print(f"租金汇总已更新：新增 {added} 套，更新 {updated} 套，撤回下架 {expired} 套")
+    write_metrics_report(config.get('metrics_formats', ['json']))
+    if row_count:
         with open('last_file.txt', 'w', encoding='utf-8') as f:
-            f.write(OUTPUT_FILE)
-        print(f"\n✅ 全部完成！共爬取 {len(all_data)} 条数据")
+            f.write(output_file if output_file in paths else paths[0])
+        print(f"\n✅ 全部完成！共爬取 {row_count} 条数据")
     else:
         print("❌ 未获取到任何数据")
 
 
 if __name__ == "__main__":
-    crawl_with_selenium()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description='链家租房数据爬虫')
+    arg_parser.add_argument('--resume', action='store_true', help='从断点日志中每个区域最后完成的页继续爬取')
+    args = arg_parser.parse_args()
+    crawl_with_selenium(resume=args.resume)
@@ -0,0 +1,108 @@
+# listing_index.py
+"""房源去重索引（SQLite）
+
+以链接中的房源编号（如 SH2108908120410423296）为键，记录上次见到的价格和维护日期，
+供增量爬取判断房源是新增、变化还是已知未变。
+链家显示的维护时间是相对说法（今天维护、3天前维护），每天都会变；入库和比较前按爬取日期换算成绝对日期。
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+INDEX_FILE = os.path.join('data', 'listing_index.db')
+LISTING_ID_RE = re.compile(r'/zufang/([A-Z]+\d+)\.html')
+MAINTAIN_RE = re.compile(r'(\d+)\s*(天|周|个月|月|年)前')
+DAY_WORDS = {'今天': 0, '刚刚': 0, '小时前': 0, '分钟前': 0, '昨天': 1, '前天': 2}
+UNIT_DAYS = {'天': 1, '周': 7, '个月': 30, '月': 30, '年': 365}
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def extract_listing_id(link):
+    """从房源链接中取出房源编号，取不到返回空字符串"""
+    match = LISTING_ID_RE.search(link or '')
+    return match.group(1) if match else ''
+
+
+def maintain_date(text, crawl_time=None):
+    """把维护时间换算成 (日期 YYYY-MM-DD, 允许误差天数)；认不出的说法原样返回，误差为 0
+
+    「3天前维护」精确到天，误差 0；「2周前」「1个月前」只精确到周、月，同一房源隔天爬取换算结果会漂移，误差取该单位的天数。
+    """
+    text = (text or '').strip()
+    today = datetime.strptime(crawl_time[:10], '%Y-%m-%d') if crawl_time else datetime.now()
+    for word, days in DAY_WORDS.items():
+        if word in text:
+            return (today - timedelta(days=days)).strftime('%Y-%m-%d'), 0
+    match = MAINTAIN_RE.search(text)
+    if match:
+        unit = UNIT_DAYS[match.group(2)]
+        return (today - timedelta(days=int(match.group(1)) * unit)).strftime('%Y-%m-%d'), 0 if unit == 1 else unit
+    return text, 0
+
+
+def _same_maintain(stored, current, slack):
+    if not (DATE_RE.match(stored or '') and DATE_RE.match(current or '')):
+        return (stored or '') == (current or '')  # 旧索引中的原始说法或认不出的说法，按原样比较
+    gap = abs((datetime.strptime(current, '%Y-%m-%d') - datetime.strptime(stored, '%Y-%m-%d')).days)
+    return gap <= slack
+
+
+class ListingIndex:
+    def __init__(self, path=INDEX_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id TEXT PRIMARY KEY,
+                price INTEGER,
+                maintain_time TEXT,
+                first_seen TEXT,
+                last_seen TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def is_known(self, listing_id, price, maintain_time, crawl_time=None):
+        """房源已在索引中且价格、维护日期都没有变化（维护时间按 crawl_time 的日期换算）"""
+        if not listing_id:
+            return False
+        with self.lock:
+            row = self.conn.execute('SELECT price, maintain_time FROM listings WHERE listing_id = ?',
+                                    (listing_id,)).fetchone()
+        if row is None or row[0] != price:
+            return False
+        current, slack = maintain_date(maintain_time, crawl_time)
+        return _same_maintain(row[1], current, slack)
+
+    def update(self, rows, known_ids=()):
+        """写入新增/变化的房源，并刷新已知房源的最后出现时间"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        records = []
+        for row in rows:
+            listing_id = extract_listing_id(row.get('链接'))
+            if listing_id:
+                maintained, _ = maintain_date(row.get('维护时间', ''), row.get('爬取时间') or now)
+                records.append((listing_id, row.get('价格(元)'), maintained, now, now))
+        with self.lock:
+            self.conn.executemany('''
+                INSERT INTO listings (listing_id, price, maintain_time, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(listing_id) DO UPDATE SET
+                    price = excluded.price,
+                    maintain_time = excluded.maintain_time,
+                    last_seen = excluded.last_seen
+            ''', records)
+            self.conn.executemany('UPDATE listings SET last_seen = ? WHERE listing_id = ?',
+                                  [(now, listing_id) for listing_id in known_ids])
+            self.conn.commit()
+
+    def seen_on(self, date):
+        """最后出现时间在某天（YYYY-MM-DD）的房源编号，含增量爬取时已知未变、只刷新了最后出现时间的房源"""
+        with self.lock:
+            rows = self.conn.execute('SELECT listing_id FROM listings WHERE last_seen LIKE ?', (date + '%',)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.conn.close()
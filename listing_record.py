@@ -0,0 +1,345 @@
+# listing_record.py
+"""紧凑的房源记录与列式批量构建
+
+parse_house 返回的每条字典约 22 个中文键，大量历史数据时内存和 DataFrame 构建开销都很大。
+这里提供：
+- Vocabulary：低基数字符串（区域、小区、朝向、户型、楼层、中介…）编码为整数，全局共享
+- ListingRecord：__slots__ 记录，价格/楼层为 int、面积为 float、朝向等为编码、标签为位掩码
+- RecordBatchBuilder：直接把记录追加到 array 类型数组，一次性生成带类型的 DataFrame
+
+标签位掩码按首次出现顺序分配比特位（常见标签预置），用于快速按标签筛选；
+原始 '标签' 串本身也编码保存，还原时顺序不变。
+
+爬取结束从断点日志读回房源时（lianjia_selenium_crawler.crawl_with_selenium、pipeline.Pipeline.crawl）
+先装进 RecordBatchBuilder，导出和分析再逐条还原为字典（iter_dicts）或一次性生成 DataFrame，
+整批房源不再以字典列表常驻内存。编码表为全局共享，新增编码时加锁，多个线程同时构建记录是安全的。
+
+运行 python listing_record.py 可对比 10 万条房源在字典与紧凑记录下的内存占用。
+"""
+import math
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+MISSING = -1
+
+
+class Vocabulary:
+    """字符串 <-> 整数编码表；已有的值直接查表，新增时加锁，多线程同时编码不会把一个值编成两个码"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        self.lock = threading.Lock()
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        if value is None or value != value:  # None / NaN 都是缺失
+            return MISSING
+        code = self.codes.get(value)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(value)
+                if code is None:
+                    self.values.append(value)  # 先追加值再登记编码，其他线程查到编码时一定能解码
+                    code = self.codes[value] = len(self.values) - 1
+        return code
+
+    def decode(self, code):
+        return None if code == MISSING else self.values[code]
+
+
+# 字段名 -> 编码表，所有记录共享
+VOCABS = {field: Vocabulary() for field in [
+    '价格单位', '一级区域', '二级区域', '小区名称', '小区链接', '朝向', '户型', '楼层', '标签', '中介公司', '维护时间',
+]}
+ORIENTATIONS = VOCABS['朝向']
+for _value in ['南', '北', '东', '西', '东南', '西南', '东北', '西北', '南 北', '东 西']:
+    ORIENTATIONS.encode(_value)
+
+# 标签 -> 比特位，常见标签预置，新标签依次分配
+TAGS = Vocabulary(['官方核验', '近地铁', '精装', '自营', '新上', '押一付一', '随时看房', '首次出租',
+                   '月租', '独立阳台', '独立卫生间', '双卫生间', '集中供暖', '免中介费', '租住保障'])
+FLAG_TAGS = ('官方核验', '近地铁', '精装')
+
+# flags 字段的比特位
+MUST_SEE = 1       # 必看好房
+VR = 2             # VR看房
+HAS_TIME = 4       # 原字典中有 爬取时间
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(text):
+    """'爬取时间' 字符串 -> 秒数（按字面时间计，不做时区换算）"""
+    return int((datetime.strptime(text, TIME_FORMAT) - EPOCH).total_seconds())
+
+
+def from_timestamp(ts):
+    return (EPOCH + timedelta(seconds=ts)).strftime(TIME_FORMAT)
+
+
+def _int_field(value):
+    """整数字段；缺失、None、NaN、空串（从表格或 JSON 读回的行常见）都记为 MISSING"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and not value.strip():
+        return MISSING
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return MISSING
+    return MISSING if math.isnan(number) else int(number)
+
+
+def _float_field(value):
+    """浮点字段；缺失、None、空串等取不出数字的都记为 NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def tag_mask(tag_text):
+    mask = 0
+    for tag in tag_text.split('|') if isinstance(tag_text, str) and tag_text else []:
+        mask |= 1 << TAGS.encode(tag)
+    return mask
+
+
+def mask_tags(mask):
+    return [tag for code, tag in enumerate(TAGS.values) if mask >> code & 1]
+
+
+class ListingRecord:
+    __slots__ = ('title', 'link', 'price', 'area', 'total_floors', 'build_year', 'tags', 'flags',
+                 'crawl_ts', 'price_unit', 'district1', 'district2', 'community', 'community_link',
+                 'orientation', 'layout', 'floor', 'tag_text', 'agency', 'maintain_time')
+
+    # 与 VOCABS 对应的属性名
+    CODED = {'price_unit': '价格单位', 'district1': '一级区域', 'district2': '二级区域',
+             'community': '小区名称', 'community_link': '小区链接', 'orientation': '朝向',
+             'layout': '户型', 'floor': '楼层', 'tag_text': '标签', 'agency': '中介公司',
+             'maintain_time': '维护时间'}
+
+    @classmethod
+    def from_dict(cls, data, crawl_ts=None):
+        """由 parse_house 的字典构建；crawl_ts 为整页共享的爬取时间戳（秒），不传则解析 '爬取时间'"""
+        record = cls()
+        record.title = data.get('标题', '')
+        record.link = data.get('链接', '')
+        record.price = _int_field(data.get('价格(元)'))
+        record.area = _float_field(data.get('面积(㎡)'))
+        record.total_floors = _int_field(data.get('总楼层'))
+        record.build_year = _int_field(data.get('建成年份'))
+        for attr, field in cls.CODED.items():
+            setattr(record, attr, VOCABS[field].encode(data.get(field)))
+
+        record.tags = tag_mask(data.get('标签'))
+        flags = 0
+        if data.get('必看好房'):
+            flags |= MUST_SEE
+        if data.get('VR看房'):
+            flags |= VR
+        if crawl_ts is None and isinstance(data.get('爬取时间'), str) and data['爬取时间']:
+            crawl_ts = to_timestamp(data['爬取时间'])
+        if crawl_ts is not None:
+            flags |= HAS_TIME
+        record.crawl_ts = crawl_ts if crawl_ts is not None else MISSING
+        record.flags = flags
+        return record
+
+    def has_tag(self, tag):
+        code = TAGS.codes.get(tag)
+        return code is not None and bool(self.tags >> code & 1)
+
+    def to_dict(self):
+        """还原为 parse_house 格式的字典（缺失字段不出现，与原字典一致）"""
+        data = {'标题': self.title, '链接': self.link}
+        if self.price != MISSING:
+            data['价格(元)'] = self.price
+        for attr, field in self.CODED.items():
+            value = VOCABS[field].decode(getattr(self, attr))
+            if value is not None:
+                data[field] = value
+        if not math.isnan(self.area):
+            data['面积(㎡)'] = self.area
+        if self.total_floors != MISSING:
+            data['总楼层'] = self.total_floors
+        if self.build_year != MISSING:
+            data['建成年份'] = self.build_year
+        if self.tag_text != MISSING:
+            for tag in FLAG_TAGS:
+                data[tag] = self.has_tag(tag)
+        data['必看好房'] = bool(self.flags & MUST_SEE)
+        data['VR看房'] = bool(self.flags & VR)
+        if self.flags & HAS_TIME:
+            data['爬取时间'] = from_timestamp(self.crawl_ts)
+        return data
+
+
+class RecordBatchBuilder:
+    """把房源记录直接追加到类型化数组，最后一次性生成 DataFrame"""
+
+    INT_FIELDS = {'price': '价格(元)', 'total_floors': '总楼层', 'build_year': '建成年份'}
+
+    def __init__(self):
+        self.titles = []
+        self.links = []
+        self.area = array('d')
+        self.ints = {attr: array('q') for attr in self.INT_FIELDS}
+        self.codes = {attr: array('i') for attr in ListingRecord.CODED}
+        self.tags = []
+        self.flags = array('B')
+        self.crawl_ts = array('q')
+
+    def __len__(self):
+        return len(self.flags)
+
+    def append(self, record):
+        self.titles.append(record.title)
+        self.links.append(record.link)
+        self.area.append(record.area)
+        for attr, values in self.ints.items():
+            values.append(getattr(record, attr))
+        for attr, values in self.codes.items():
+            values.append(getattr(record, attr))
+        self.tags.append(record.tags)
+        self.flags.append(record.flags)
+        self.crawl_ts.append(record.crawl_ts)
+
+    def append_dict(self, data, crawl_ts=None):
+        self.append(ListingRecord.from_dict(data, crawl_ts))
+
+    def extend(self, rows):
+        """追加一批 parse_house 格式的字典（可以是生成器），返回自身"""
+        for row in rows:
+            self.append_dict(row)
+        return self
+
+    def record(self, i):
+        """第 i 条记录"""
+        record = ListingRecord()
+        record.title = self.titles[i]
+        record.link = self.links[i]
+        record.area = self.area[i]
+        for attr, values in self.ints.items():
+            setattr(record, attr, values[i])
+        for attr, values in self.codes.items():
+            setattr(record, attr, values[i])
+        record.tags = self.tags[i]
+        record.flags = self.flags[i]
+        record.crawl_ts = self.crawl_ts[i]
+        return record
+
+    def iter_dicts(self):
+        """逐条还原为 parse_house 格式的字典，供 export_rows、价格历史、租金汇总流式消费"""
+        for i in range(len(self)):
+            yield self.record(i).to_dict()
+
+    def to_dataframe(self, categorical=True):
+        """生成带类型的 DataFrame：整数列为可空 Int64，标志列为 bool
+
+        categorical=True 时编码列为 category、爬取时间为 datetime，另有 标签掩码 列；
+        categorical=False 时编码列为普通字符串（缺失为 None）、爬取时间为原字符串，与 pd.DataFrame(字典列表) 的列一致。
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = {'标题': self.titles, '链接': self.links}
+        for attr, field in self.INT_FIELDS.items():
+            values = np.frombuffer(self.ints[attr], dtype=np.int64)
+            columns[field] = pd.arrays.IntegerArray(values.copy(), values == MISSING)
+        columns['面积(㎡)'] = np.frombuffer(self.area, dtype=np.float64)
+        for attr, field in ListingRecord.CODED.items():
+            codes = np.frombuffer(self.codes[attr], dtype=np.int32)
+            if categorical:
+                columns[field] = pd.Categorical.from_codes(codes, categories=VOCABS[field].values)
+            else:
+                values = np.array(VOCABS[field].values + [None], dtype=object)
+                columns[field] = values[codes]  # MISSING(-1) 取到末尾的 None
+        flags = np.frombuffer(self.flags, dtype=np.uint8)
+        for tag in FLAG_TAGS:
+            bit = 1 << TAGS.codes[tag]
+            columns[tag] = np.fromiter((mask & bit != 0 for mask in self.tags), dtype=bool, count=len(self))
+        if categorical:
+            columns['标签掩码'] = self.tags
+        columns['必看好房'] = flags & MUST_SEE != 0
+        columns['VR看房'] = flags & VR != 0
+        ts = pd.Series(np.frombuffer(self.crawl_ts, dtype=np.int64))
+        times = pd.to_datetime(ts.where(ts != MISSING), unit='s')
+        columns['爬取时间'] = times.to_numpy() if categorical else times.dt.strftime(TIME_FORMAT).to_numpy()
+        return pd.DataFrame(columns)
+
+
+def _measure():
+    """对比 10 万条房源在字典列表、记录列表和批量数组三种形式下的内存"""
+    import random
+    import time
+    import tracemalloc
+
+    import pandas as pd
+
+    def fresh(text):
+        # 模拟解析：每条记录持有独立的字符串对象
+        return ''.join(list(text))
+
+    def make_rows(n):
+        rng = random.Random(0)
+        districts = [('浦东', '陆家嘴'), ('浦东', '塘桥'), ('徐汇', '徐家汇'), ('静安', '静安寺')]
+        for i in range(n):
+            d1, d2 = districts[i % len(districts)]
+            yield {
+                '标题': fresh(f'整租·小区{i % 500} {1 + i % 3}室1厅 南'),
+                '链接': fresh(f'https://sh.lianjia.com/zufang/SH{2108908120410423296 + i}.html'),
+                '价格(元)': rng.randint(2000, 20000), '价格单位': fresh('元/月'),
+                '一级区域': fresh(d1), '二级区域': fresh(d2), '小区名称': fresh(f'小区{i % 500}'),
+                '小区链接': fresh(f'https://sh.lianjia.com/zufang/c50110000{i % 500:05d}/'),
+                '朝向': fresh(rng.choice(['南', '南 北', '东南'])), '面积(㎡)': float(rng.randint(20, 150)),
+                '户型': fresh(f'{1 + i % 3}室1厅1卫'), '楼层': fresh(f'中楼层 （{6 + i % 30}层）'),
+                '总楼层': 6 + i % 30, '建成年份': 1990 + i % 30,
+                '标签': fresh('自营|新上|近地铁|押一付一'), '官方核验': False, '近地铁': True, '精装': False,
+                '中介公司': fresh('贝壳优选'), '维护时间': fresh(f'{i % 7}天前维护'),
+                '必看好房': False, 'VR看房': bool(i % 2),
+                '爬取时间': fresh(f'2025-12-10 05:{i // 3000 % 60:02d}:00'),
+            }
+
+    n = 100_000
+    results = {}
+    for name in ['dict', 'record', 'batch']:
+        tracemalloc.start()
+        if name == 'dict':
+            kept = list(make_rows(n))
+        elif name == 'record':
+            kept = [ListingRecord.from_dict(row) for row in make_rows(n)]
+        else:
+            kept = RecordBatchBuilder()
+            for row in make_rows(n):
+                kept.append_dict(row)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = current
+        del kept
+
+    print(f"{n} 条房源常驻内存：")
+    print(f"  字典列表     {results['dict'] / 1024 / 1024:8.1f} MB")
+    print(f"  记录列表     {results['record'] / 1024 / 1024:8.1f} MB")
+    print(f"  批量类型数组 {results['batch'] / 1024 / 1024:8.1f} MB")
+
+    rows = list(make_rows(n))
+    start = time.perf_counter()
+    pd.DataFrame(rows)
+    dict_seconds = time.perf_counter() - start
+    builder = RecordBatchBuilder()
+    for row in rows:
+        builder.append_dict(row)
+    start = time.perf_counter()
+    builder.to_dataframe()
+    batch_seconds = time.perf_counter() - start
+    print(f"构建 DataFrame：字典列表 {dict_seconds:.2f} 秒，批量类型数组 {batch_seconds:.2f} 秒")
+
+
+if __name__ == "__main__":
+    _measure()
@@ -0,0 +1,89 @@
+# map_cache.py
+"""百度地图查询结果的持久化缓存（SQLite）
+
+- 按键保存 JSON 结果，每条带过期时间（TTL）
+- 条目数超过上限时按最近访问时间淘汰（LRU）
+- 统计命中/未命中次数
+多个线程共享同一个实例是安全的。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = os.path.join('data', 'map_cache.db')
+
+
+def geocode_key(address, city):
+    return f"geo|{city}|{address.strip()}"
+
+
+def route_key(mode, origin, destination, precision=4):
+    """坐标四舍五入到 precision 位小数（4 位约 10 米），附近的起终点共用缓存"""
+    o = f"{round(origin[0], precision)},{round(origin[1], precision)}"
+    d = f"{round(destination[0], precision)},{round(destination[1], precision)}"
+    return f"{mode}|{o}|{d}"
+
+
+class MapCache:
+    def __init__(self, path=CACHE_FILE, max_entries=100000):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires REAL,
+                accessed REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed)')
+        self.conn.commit()
+
+    def get(self, key):
+        """返回缓存的值；不存在或已过期时返回 None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self.conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        """写入缓存，ttl 单位为秒"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                              (key, json.dumps(value, ensure_ascii=False), now + ttl, now))
+            count = self.conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self.max_entries:
+                # 一次淘汰超出部分再多 10%，避免每次写入都触发淘汰
+                evict = count - self.max_entries + self.max_entries // 10
+                self.conn.execute('DELETE FROM cache WHERE key IN '
+                                  '(SELECT key FROM cache ORDER BY accessed LIMIT ?)', (evict,))
+            self.conn.commit()
+
+    def purge_expired(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+            self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,155 @@
+# output_writer.py
+"""流式输出房源数据
+
+逐行写入，内存占用与数据量无关：
+- xlsx：xlsxwriter 常量内存模式，列宽边写边统计，关闭时一次性设置
+- parquet：pyarrow 按批（row group）写入，列带类型，后续分析直接读取无需再解析 Excel
+- feather：Arrow IPC 文件，按批写入
+
+pyarrow / xlsxwriter 均为可选依赖，未安装时对应格式跳过（xlsx 由调用方回退到 save_to_excel）；
+调用方先用 usable_formats 过滤配置中的格式，一个都写不了时回退到 xlsx。
+"""
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 列顺序与 save_to_excel 一致：一级区域…标题 在前，其余按 parse_house 的字段顺序
+COLUMN_TYPES = {
+    '一级区域': 'string', '二级区域': 'string', '小区名称': 'string',
+    '价格(元)': 'int', '面积(㎡)': 'float', '户型': 'string', '标题': 'string',
+    '链接': 'string', '价格单位': 'string', '小区链接': 'string', '朝向': 'string',
+    '楼层': 'string', '总楼层': 'int', '建成年份': 'int', '标签': 'string',
+    '官方核验': 'bool', '近地铁': 'bool', '精装': 'bool', '中介公司': 'string',
+    '维护时间': 'string', '必看好房': 'bool', 'VR看房': 'bool', '爬取时间': 'string',
+}
+COLUMNS = list(COLUMN_TYPES)
+MAX_COLUMN_WIDTH = 50
+
+
+def arrow_schema(column_types=None):
+    types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_()}
+    return pa.schema([(col, types[kind]) for col, kind in (column_types or COLUMN_TYPES).items()])
+
+
+class StreamingWriter:
+    """按行接收房源字典，同时写出多种格式
+
+    base_path 为不带扩展名的输出路径，formats 可包含 'xlsx'、'parquet'、'feather'。
+    column_types 为 {列名: 类型} 的有序字典，默认 COLUMN_TYPES；附加列（如通勤时间）可追加在后面。
+    """
+
+    def __init__(self, base_path, formats=('xlsx',), batch_rows=5000, column_types=None):
+        self.column_types = column_types or COLUMN_TYPES
+        self.columns = list(self.column_types)
+        self.batch_rows = batch_rows
+        self.buffer = []
+        self.row_count = 0
+        self.paths = []
+        self.workbook = None
+        self.parquet_writer = None
+        self.feather_writer = None
+        self.feather_sink = None
+
+        if 'xlsx' in formats:
+            if xlsxwriter is None:
+                print("未安装 xlsxwriter，跳过流式 Excel 输出")
+            else:
+                path = base_path + '.xlsx'
+                self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+                self.worksheet = self.workbook.add_worksheet('Sheet1')
+                header_format = self.workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+                self.worksheet.write_row(0, 0, self.columns, header_format)
+                self.widths = [len(col) for col in self.columns]
+                self.paths.append(path)
+
+        if ('parquet' in formats or 'feather' in formats) and pa is None:
+            print("未安装 pyarrow，跳过 Parquet/Feather 输出")
+        elif pa is not None:
+            self.schema = arrow_schema(self.column_types)
+            if 'parquet' in formats:
+                path = base_path + '.parquet'
+                self.parquet_writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+                self.paths.append(path)
+            if 'feather' in formats:
+                path = base_path + '.feather'
+                self.feather_sink = pa.OSFile(path, 'wb')
+                self.feather_writer = pa.ipc.new_file(self.feather_sink, self.schema)
+                self.paths.append(path)
+
+    def write_row(self, row):
+        self.row_count += 1
+        if self.workbook is not None:
+            for idx, col in enumerate(self.columns):
+                value = row.get(col)
+                if value is None:
+                    continue
+                self.worksheet.write(self.row_count, idx, value)
+                self.widths[idx] = max(self.widths[idx], len(str(value)))
+        if self.parquet_writer is not None or self.feather_writer is not None:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_rows:
+                self._flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        batch = pa.RecordBatch.from_pylist(self.buffer, schema=self.schema)
+        if self.parquet_writer is not None:
+            self.parquet_writer.write_batch(batch)
+        if self.feather_writer is not None:
+            self.feather_writer.write_batch(batch)
+        self.buffer = []
+
+    def close(self):
+        """写完剩余数据并关闭文件，返回生成的文件路径列表"""
+        if pa is not None:
+            self._flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.feather_writer is not None:
+            self.feather_writer.close()
+            self.feather_sink.close()
+        if self.workbook is not None:
+            for idx, width in enumerate(self.widths):
+                self.worksheet.set_column(idx, idx, min(width + 2, MAX_COLUMN_WIDTH))
+            self.workbook.close()
+        for path in self.paths:
+            print(f"数据已保存到 {path}")
+        return self.paths
+
+
+def usable_formats(formats):
+    """去掉当前环境写不了的格式（未安装 pyarrow 时的 parquet/feather）；一个都不剩时回退到 xlsx"""
+    usable = [fmt for fmt in formats if fmt == 'xlsx' or (fmt in ('parquet', 'feather') and pa is not None)]
+    if not usable:
+        print(f"输出格式 {', '.join(formats) or '（空）'} 均不可用（需 pip install pyarrow），改为输出 xlsx")
+        return ['xlsx']
+    return usable
+
+
+def export_rows(rows, output_file, formats=('xlsx',), column_types=None):
+    """把可迭代的房源行流式写出；返回 (写出的行数, 生成的文件路径列表)，没有数据时不生成文件"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0, []
+    writer = StreamingWriter(os.path.splitext(output_file)[0], formats, column_types=column_types)
+    try:
+        writer.write_row(first)
+        writer.write_rows(rows)
+    finally:
+        paths = writer.close()
+    return writer.row_count, paths
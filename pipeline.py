@@ -0,0 +1,378 @@
+# pipeline.py
+"""每日流水线：爬取 → 去重 → 小区坐标 → 通勤补充 ∥ 分析 → 导出 → 邮件
+
+各阶段在内存中的同一张 DataFrame 上依次处理，不再通过 last_file.txt 和中间 xlsx 交接，
+结果只在导出阶段写一次文件。
+
+- 小区坐标：按小区编号从 data/community_geo.db 取坐标，只对新出现的小区地理编码（community_geo.py），
+  config.json 中 "geocode": false 关闭
+- 通勤补充：按小区编号查询到 config.json 中 "commute_destination" 的驾车/公交时间，起点直接用小区坐标；
+  已查过的小区结果保存在 data/pipeline_commute.json，只对新出现的小区请求百度地图
+- 分析：按配置更新价格历史库（"price_history"）和租金汇总（"rent_cube"），与通勤补充并行
+- 邮件："mail": true 时用摘要模式发送（sendmail.send_digest）
+
+每个阶段记录输入的指纹（data/pipeline_state.json），输入没有变化时跳过该阶段。
+
+用法：
+    python pipeline.py                   # 爬取并执行全部阶段
+    python pipeline.py --skip-crawl      # 不爬取，使用 last_file.txt 指向的最近一次结果
+    python pipeline.py --input 文件.xlsx  # 使用指定文件
+    python pipeline.py --from-queue      # 不爬取，使用分片工作队列（crawl_queue.py）中已爬的房源
+    python pipeline.py --force           # 忽略指纹，所有阶段重新执行
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from city_sites import register_cities
+from community_geo import GEO_COLUMNS, CommunityGeo, unique_communities
+from listing_index import extract_listing_id
+from listing_record import RecordBatchBuilder
+from output_writer import COLUMN_TYPES, export_rows, usable_formats
+
+STATE_FILE = os.path.join('data', 'pipeline_state.json')
+COMMUTE_FILE = os.path.join('data', 'pipeline_commute.json')
+COMMUTE_JOURNAL = os.path.join('data', 'pipeline_commute.jsonl')
+COMMUTE_COLUMN_TYPES = {'行车距离(公里)': 'float', '行车时间(分钟)': 'float', '公共交通时间(分钟)': 'float'}
+
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def dataset_fingerprint(df):
+    """按 房源编号、价格、维护时间 计算数据指纹，列顺序和行顺序无关"""
+    cols = [c for c in ('房源编号', '价格(元)', '维护时间') if c in df.columns]
+    if df.empty or not cols:
+        return fingerprint(len(df))
+    hashed = pd.util.hash_pandas_object(df[cols].astype(str), index=False)
+    return fingerprint(len(df), int(hashed.sum()))  # 按位求和（溢出回绕），与行顺序无关
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _clean_row(row, column_types):
+    """DataFrame 行转成写出用的字典：去掉 NaN，整数列转回 int"""
+    cleaned = {}
+    for col, value in row.items():
+        if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+            continue  # 可空整数列（Int64）的缺失值为 pd.NA
+        if column_types.get(col) == 'int':
+            value = int(value)
+        elif column_types.get(col) == 'bool':
+            value = bool(value)
+        cleaned[col] = value
+    return cleaned
+
+
+class Pipeline:
+    def __init__(self, config, force=False, state_file=STATE_FILE):
+        self.config = config
+        register_cities(config)  # 地理编码按小区链接所在站点确定城市
+        self.force = force
+        self.state_file = state_file
+        self.state = _load_json(state_file, {})
+        self.state_lock = threading.Lock()  # 通勤补充和分析两个线程都会写状态文件
+        self.timings = {}
+
+    def unchanged(self, stage, key):
+        """该阶段上次成功时的输入指纹与本次相同"""
+        return not self.force and self.state.get(stage) == key
+
+    def done(self, stage, key, **extra):
+        """记录阶段完成（extra 为同时保存的其他状态），修改和写文件在同一把锁内，并行阶段不会互相覆盖"""
+        with self.state_lock:
+            self.state[stage] = key
+            self.state.update(extra)
+            _save_json(self.state_file, self.state)
+
+    def timed(self, stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0) + time.perf_counter() - start
+
+    # ---------------- 各阶段 ----------------
+
+    def crawl(self, resume=False):
+        """爬取并从断点日志读回内存；返回 (DataFrame, 输出文件名)"""
+        from lianjia_selenium_crawler import crawl_to_journal, write_metrics_report
+
+        crawled = crawl_to_journal(resume)
+        if crawled is None:
+            return None, None
+        journal, urls, config = crawled
+        # 经紧凑记录直接生成列式 DataFrame，不先构建整批字典列表
+        df = RecordBatchBuilder().extend(journal.iter_rows(urls)).to_dataframe(categorical=False)
+        write_metrics_report(config.get('metrics_formats', ['json']))
+        return df, journal.output_file
+
+    @staticmethod
+    def load(input_file):
+        """读取已有结果；同名 parquet 存在时优先读取"""
+        from sendmail import load_dataset
+
+        return load_dataset(input_file)
+
+    @staticmethod
+    def dedup(df):
+        """去掉没有链接的空记录，同一房源只保留最后一次出现"""
+        if df.empty:
+            return df
+        df = df[df['链接'].notna() & (df['链接'] != '')].copy()
+        ids = df['链接'].map(extract_listing_id)
+        df['房源编号'] = ids.where(ids != '', df['链接'])  # 品牌公寓等链接中没有房源编号，按链接去重
+        before = len(df)
+        df = df.drop_duplicates('房源编号', keep='last').reset_index(drop=True)
+        if before != len(df):
+            print(f"去重：{before} 条 → {len(df)} 条")
+        return df
+
+    def geocode(self, df):
+        """给房源加上 小区ID、小区纬度、小区经度；只对坐标库里还没有的小区请求地理编码"""
+        if not self.config.get('geocode', True):
+            return df
+        import query_distance_from_map as qd
+        from rate_limit import TokenBucket
+
+        geo = CommunityGeo()
+        try:
+            communities = unique_communities(df)
+            key = fingerprint(sorted(communities.index))
+            if not self.unchanged('geocode', key):
+                qd.RATE_LIMITER = TokenBucket(qd.QPS, capacity=qd.QPS)
+                qd.STOP_EVENT.clear()
+                try:
+                    geo.geocode_missing(communities)
+                finally:
+                    qd.RATE_LIMITER = None
+                if not qd.STOP_EVENT.is_set():
+                    self.done('geocode', key)
+            df = geo.enrich(df)
+        finally:
+            geo.close()
+        located = df.loc[df['小区纬度'].notna(), '小区ID'].nunique()
+        print(f"小区坐标：{len(communities)} 个小区，已有坐标 {located} 个")
+        return df
+
+    def commute(self, df):
+        """返回 {小区ID: {通勤列: 值}}；起点用小区坐标，只对之前没查过的小区请求接口"""
+        destination_str = self.config.get('commute_destination')
+        if not destination_str:
+            print("未配置 commute_destination，跳过通勤补充")
+            return {}
+        if '小区纬度' not in df.columns:
+            print("没有小区坐标（\"geocode\": false），跳过通勤补充")
+            return {}
+        import query_distance_from_map as qd
+        from commute_journal import CommuteJournal
+        from rate_limit import TokenBucket
+
+        located = df[df['小区纬度'].notna()].drop_duplicates('小区ID').set_index('小区ID')
+        communities = sorted(located.index)
+        key = fingerprint(communities, destination_str)
+        known = _load_json(COMMUTE_FILE, {})
+        if known.get('destination') != destination_str:
+            known = {'destination': destination_str, 'communities': {}}
+        results = known['communities']
+        if self.unchanged('commute', key) and all(cid in results for cid in communities):
+            print(f"通勤补充：{len(communities)} 个小区均已查询，跳过")
+            return results
+
+        destination = qd.parse_coordinates(destination_str)
+        if destination[0] is None:
+            print(f"无法解析 commute_destination: {destination_str}")
+            return results
+        missing = [cid for cid in communities if cid not in results]
+        print(f"通勤补充：{len(communities)} 个小区，新小区 {len(missing)} 个")
+        if missing:
+            rows = located.loc[missing]
+            sheet = pd.DataFrame({
+                '出发地': rows['小区名称'].values, '小区ID': missing, '目的地坐标': destination_str,
+                '出发地坐标': [f"纬度 {lat}, 经度 {lng}" for lat, lng in zip(rows['小区纬度'], rows['小区经度'])],
+                '行车距离(公里)': None, '行车时间(分钟)': None, '公共交通时间(分钟)': None,
+            })
+            journal = CommuteJournal(COMMUTE_JOURNAL, key_column='小区ID')  # 每次的新小区集合和顺序不同，按小区ID对应
+            journal.restore(sheet)
+            qd.RATE_LIMITER = TokenBucket(qd.QPS, capacity=qd.QPS)
+            qd.STOP_EVENT.clear()
+            try:
+                pending = [i for i, row in sheet.iterrows()
+                           if pd.isna(row['行车距离(公里)']) or pd.isna(row['公共交通时间(分钟)'])]
+                ok = qd.run_lookups(sheet, pending, destination, journal, qd.WORKERS)
+            finally:
+                qd.RATE_LIMITER = None
+            for _, row in sheet.iterrows():
+                values = {col: row[col] for col in COMMUTE_COLUMN_TYPES if not pd.isna(row[col])}
+                if len(values) == len(COMMUTE_COLUMN_TYPES):
+                    results[row['小区ID']] = values  # 只保存查全的小区，缺项的下次再查
+            _save_json(COMMUTE_FILE, known)
+            journal.close(remove=ok)
+        if all(cid in results for cid in communities):
+            self.done('commute', key)
+        return results
+
+    def locate_and_commute(self, df):
+        """小区坐标 → 通勤补充（后者依赖前者），返回 (加了坐标的 df, 通勤结果)"""
+        df = self.timed('geocode', self.geocode, df)
+        return df, self.timed('commute', self.commute, df)
+
+    def analytics(self, df, key):
+        """更新价格历史库和租金汇总"""
+        if self.unchanged('analytics', key):
+            print("分析：数据未变化，跳过")
+            return
+        rows = [_clean_row(row, COLUMN_TYPES) for row in df.to_dict('records')]
+        if self.config.get('price_history'):
+            from price_history import PriceHistory
+
+            store = PriceHistory()
+            try:
+                print(f"价格历史库已写入 {store.ingest_rows(rows)} 条")
+            finally:
+                store.close()
+        if self.config.get('rent_cube'):
+            from rent_cube import merge_crawl
+
+            added, updated, expired = merge_crawl(rows, incremental=self.config.get('incremental', False))
+            print(f"租金汇总已更新：新增 {added} 套，更新 {updated} 套，撤回下架 {expired} 套")
+        self.done('analytics', key)
+
+    def export(self, df, output_file, key):
+        """写出一次结果文件（含通勤列），返回主文件路径"""
+        formats = usable_formats(self.config.get('output_formats', ['xlsx']))
+        previous = self.state.get('export_file')
+        if self.unchanged('export', key) and previous and os.path.exists(previous):
+            print(f"导出：数据未变化，沿用 {previous}")
+            return previous
+        column_types = dict(COLUMN_TYPES)
+        extra_types = dict(GEO_COLUMNS, **COMMUTE_COLUMN_TYPES)
+        column_types.update({col: kind for col, kind in extra_types.items() if col in df.columns})
+        rows = (_clean_row(row, column_types) for row in df.to_dict('records'))
+        row_count, paths = export_rows(rows, output_file, formats, column_types)
+        if not row_count:
+            return None
+        if 'xlsx' in formats and output_file not in paths:
+            # 未安装 xlsxwriter 时回退到 pandas 写 Excel
+            df.drop(columns=['房源编号'], errors='ignore').to_excel(output_file, index=False, engine='openpyxl')
+            paths.insert(0, output_file)
+        main_file = output_file if output_file in paths else paths[0]
+        with open('last_file.txt', 'w', encoding='utf-8') as f:
+            f.write(main_file)
+        self.done('export', key, export_file=main_file)
+        return main_file
+
+    def mail(self, df, main_file, key):
+        if not self.config.get('mail'):
+            return
+        if self.unchanged('mail', key):
+            print("邮件：数据未变化，本次不发送")
+            return
+        from sendmail import send_digest
+
+        if send_digest(main_file, df=df.drop(columns=['房源编号'], errors='ignore')):
+            self.done('mail', key)
+
+    # ---------------- 串联 ----------------
+
+    def run(self, input_file=None, skip_crawl=False, resume=False, from_queue=False):
+        if self.config.get('record_fixtures'):
+            # 爬虫按同一配置录制列表页，这里录制百度地图接口响应
+            import query_distance_from_map as qd
+            from replay import FixtureStore
+
+            qd.RECORDER = FixtureStore(self.config['record_fixtures'])
+        if from_queue:
+            from crawl_queue import QUEUE_FILE, WorkQueue
+
+            work_queue = WorkQueue(self.config.get('queue_file', QUEUE_FILE))
+            df = self.timed('load', lambda: pd.DataFrame(list(work_queue.iter_rows())))
+            work_queue.close()
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = os.path.join('data', f'链家租房数据_Pipeline_{stamp}.xlsx')
+        elif input_file or skip_crawl:
+            input_file = input_file or _last_file()
+            if not input_file:
+                print("未找到可用的数据文件")
+                return
+            print(f"使用已有数据: {input_file}")
+            df = self.timed('load', self.load, input_file)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = os.path.join('data', f'链家租房数据_Pipeline_{stamp}.xlsx')
+        else:
+            df, output_file = self.timed('crawl', self.crawl, resume)
+            if df is None:
+                return
+        if df.empty:
+            print("❌ 没有数据")
+            return
+
+        df = self.timed('dedup', self.dedup, df)
+        data_key = dataset_fingerprint(df)
+
+        # 小区坐标与通勤补充（网络请求为主）和分析（本地 CPU/磁盘为主）互不依赖，并行执行
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            commute_future = executor.submit(self.locate_and_commute, df)
+            analytics_future = executor.submit(self.timed, 'analytics', self.analytics, df, data_key)
+            df, commute = commute_future.result()
+            analytics_future.result()
+
+        df = df.drop(columns=[c for c in COMMUTE_COLUMN_TYPES if c in df.columns])
+        if commute:
+            enriched = pd.DataFrame.from_dict(commute, orient='index')
+            df = df.join(enriched, on='小区ID')
+        located = df.loc[df['小区纬度'].notna(), '小区ID'].unique().tolist() if '小区纬度' in df.columns else []
+        export_key = fingerprint(data_key, sorted(located), commute)
+        main_file = self.timed('export', self.export, df, output_file, export_key)
+        if main_file:
+            self.timed('mail', self.mail, df, main_file, export_key)
+
+        print("\n⏱️ 各阶段耗时：" + "，".join(f"{name} {seconds:.1f} 秒" for name, seconds in self.timings.items()))
+        print(f"✅ 流水线完成，共 {len(df)} 条房源" + (f"，结果文件 {main_file}" if main_file else ""))
+
+
+def _last_file():
+    if not os.path.exists('last_file.txt'):
+        return None
+    with open('last_file.txt', 'r', encoding='utf-8') as f:
+        path = f.read().strip()
+    return path if os.path.exists(path) else None
+
+
+def load_pipeline_config(path='config.json'):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='链家租房每日流水线')
+    arg_parser.add_argument('--skip-crawl', action='store_true', help='不爬取，使用 last_file.txt 指向的最近结果')
+    arg_parser.add_argument('--input', help='使用指定的数据文件（xlsx 或 parquet）')
+    arg_parser.add_argument('--resume', action='store_true', help='爬取从断点日志继续')
+    arg_parser.add_argument('--from-queue', action='store_true', help='不爬取，使用分片工作队列中已爬的房源')
+    arg_parser.add_argument('--force', action='store_true', help='忽略指纹，所有阶段重新执行')
+    args = arg_parser.parse_args()
+
+    Pipeline(load_pipeline_config(), force=args.force).run(args.input, args.skip_crawl, args.resume, args.from_queue)
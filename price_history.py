@@ -0,0 +1,330 @@
+# price_history.py
+"""房源价格历史库（SQLite，只追加）
+
+每次爬取的结果按 (房源编号, 爬取日期) 写入 data/price_history.db，同一房源同一天只保留当天最后一次爬取，
+重复导入同一批数据结果不变。可以从爬虫的行数据导入，也可以导入历史 xlsx 文件：
+    python price_history.py ingest data/链家租房数据_Selenium_*.xlsx
+
+查询（房源编号、小区名称、二级区域、爬取日期上都有索引，一年的每日数据也在毫秒级返回）：
+    python price_history.py history SH2108908120410423296          # 单个房源的价格变化
+    python price_history.py median 东昌新村 --window 30              # 小区租金滚动中位数
+    python price_history.py median 5011000012345                    # 按小区编号（小区链接中的数字）查询
+    python price_history.py median 东昌新村 --parent 陆家嘴          # 同名小区不止一个时按所在区域区分
+    python price_history.py median 陆家嘴 --level 二级区域 --unit     # 二级区域每平米租金滚动中位数
+    python price_history.py changes 2025-12-10                      # 当天新上和下架的房源
+
+滚动中位数只在同一个小区（城市 + 小区编号）或同一个区域（城市 + 上级区域 + 名称）内计算，
+不同区域、不同城市的同名小区或区域不会合并；名称对应多个时列出候选，用 --parent 或小区编号指定。
+下架判断只比较当天爬取过的二级区域；增量爬取只记录新增或变化的房源，不适合用来判断下架。
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from city_sites import city_of
+from community_geo import extract_community_id
+from listing_index import extract_listing_id
+
+HISTORY_FILE = os.path.join('data', 'price_history.db')
+LEVEL_COLUMNS = {'小区': 'community', '二级区域': 'district', '一级区域': 'region'}
+# 各层级区分同名范围的列（没有小区编号的旧记录按 城市+区域+名称 区分），以及 --parent 可以匹配的上级列
+SCOPE_COLUMNS = {'小区': ('city', 'region', 'district'), '二级区域': ('city', 'region'), '一级区域': ('city',)}
+PARENT_COLUMNS = {'小区': ('district', 'region', 'city'), '二级区域': ('region', 'city'), '一级区域': ('city',)}
+COMMUNITY_NUMBER_RE = re.compile(r'^c?\d+$')
+
+
+def _crawl_time(value):
+    """爬取时间可能是字符串（爬虫行数据）或 Timestamp（读自 xlsx），统一成 'YYYY-MM-DD HH:MM:SS'"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    return pd.Timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _optional(value):
+    return None if value is None or (not isinstance(value, str) and pd.isna(value)) else value
+
+
+def _borrow(df, column, base):
+    """column 为空的记录借用 base 相同、且 base 下该列只有一个取值的记录的值（旧版本的库没有城市、小区编号）"""
+    values = df[column].fillna('')
+    known = pd.DataFrame({'base': base, 'value': values})[values != ''].drop_duplicates()
+    unique = known.drop_duplicates('base', keep=False)
+    return values.where(values != '', base.map(dict(zip(unique['base'], unique['value']))).fillna(''))
+
+
+def _scopes(df, level):
+    """每条观测所属的范围：小区为 城市|小区编号（没有编号的按 城市|一级|二级|名称），区域为 城市|上级|名称"""
+    names = df[[col for col in SCOPE_COLUMNS[level] if col != 'city'] + [LEVEL_COLUMNS[level]]]
+    base = names.fillna('').astype(str).agg('|'.join, axis=1)
+    df = df.assign(city=_borrow(df, 'city', base))
+    scopes = df['city'] + '|' + base
+    if level != '小区':
+        return scopes
+    ids = _borrow(df.assign(community_id=df['community_id'].fillna('').str.lstrip('c')), 'community_id', scopes)
+    return (df['city'] + '|' + ids).where(ids != '', scopes)
+
+
+class PriceHistory:
+    def __init__(self, path=HISTORY_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript('''
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS observations (
+                listing_id TEXT NOT NULL,
+                crawl_date TEXT NOT NULL,
+                crawl_time TEXT NOT NULL,
+                price INTEGER,
+                area REAL,
+                community TEXT,
+                district TEXT,
+                region TEXT,
+                title TEXT,
+                PRIMARY KEY (listing_id, crawl_date)
+            ) WITHOUT ROWID;
+        ''')
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(observations)')}
+        for column in ('community_id', 'city'):  # 旧版本的库没有这两列，补上后旧记录为空
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE observations ADD COLUMN {column} TEXT')
+        self.conn.executescript('''
+            -- 覆盖索引：滚动中位数只读索引，不回表（WITHOUT ROWID 表的二级索引自带主键列 listing_id）
+            DROP INDEX IF EXISTS idx_obs_community;
+            DROP INDEX IF EXISTS idx_obs_district;
+            DROP INDEX IF EXISTS idx_obs_region;
+            CREATE INDEX IF NOT EXISTS idx_obs_community_scope
+                ON observations (community, crawl_date, price, area, community_id, city, region, district);
+            CREATE INDEX IF NOT EXISTS idx_obs_community_id
+                ON observations (community_id, crawl_date, price, area, community, city, region, district);
+            CREATE INDEX IF NOT EXISTS idx_obs_district_scope
+                ON observations (district, crawl_date, price, area, city, region);
+            CREATE INDEX IF NOT EXISTS idx_obs_region_scope ON observations (region, crawl_date, price, area, city);
+            CREATE INDEX IF NOT EXISTS idx_obs_date ON observations (crawl_date, district);
+        ''')
+        self.conn.commit()
+
+    # ---------------- 导入 ----------------
+
+    def ingest_rows(self, rows, default_time=None):
+        """导入爬虫行数据（parse_house 的字典），返回写入条数；没有房源编号或爬取时间的行跳过"""
+        records = []
+        for row in rows:
+            listing_id = extract_listing_id(row.get('链接'))
+            crawl_time = _crawl_time(row.get('爬取时间')) or default_time
+            if not listing_id or not crawl_time:
+                continue
+            price = _optional(row.get('价格(元)'))
+            area = _optional(row.get('面积(㎡)'))
+            records.append((listing_id, crawl_time[:10], crawl_time,
+                            int(price) if price is not None else None,
+                            float(area) if area is not None else None,
+                            _optional(row.get('小区名称')), _optional(row.get('二级区域')),
+                            _optional(row.get('一级区域')), _optional(row.get('标题')),
+                            extract_community_id(row.get('小区链接')) or None,
+                            city_of(row.get('链接') or '') or None))
+        with self.lock:
+            # 同一房源同一天只保留最晚的一次爬取，重复导入不改变结果
+            self.conn.executemany('''
+                INSERT INTO observations
+                    (listing_id, crawl_date, crawl_time, price, area, community, district, region, title,
+                     community_id, city)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(listing_id, crawl_date) DO UPDATE SET
+                    crawl_time = excluded.crawl_time,
+                    price = excluded.price,
+                    area = excluded.area,
+                    community = excluded.community,
+                    district = excluded.district,
+                    region = excluded.region,
+                    title = excluded.title,
+                    community_id = excluded.community_id,
+                    city = excluded.city
+                WHERE excluded.crawl_time >= observations.crawl_time
+            ''', records)
+            self.conn.commit()
+        return len(records)
+
+    def ingest_excel(self, path):
+        """导入一次爬取导出的 xlsx；文件中没有爬取时间时用文件名里的时间戳"""
+        try:
+            df = pd.read_excel(path, engine='openpyxl')
+        except Exception as e:
+            print(f"无法读取Excel文件: {path} {str(e)}")
+            return 0
+        default_time = None
+        stamp = os.path.splitext(os.path.basename(path))[0].rsplit('_', 2)[-2:]
+        try:
+            default_time = datetime.strptime('_'.join(stamp), '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+        count = self.ingest_rows(df.to_dict('records'), default_time)
+        print(f"已导入 {path}：{count} 条")
+        return count
+
+    # ---------------- 查询 ----------------
+
+    def listing_history(self, listing_id):
+        """单个房源每次被爬到的价格，只保留价格发生变化的日期（首尾两次也保留）"""
+        df = pd.read_sql_query('''
+            SELECT crawl_date AS 日期, price AS "价格(元)", area AS "面积(㎡)", community AS 小区名称, title AS 标题
+            FROM observations WHERE listing_id = ? ORDER BY crawl_date
+        ''', self.conn, params=(listing_id,))
+        if len(df) <= 2:
+            return df
+        changed = df['价格(元)'].ne(df['价格(元)'].shift())
+        changed.iloc[-1] = True
+        return df[changed].reset_index(drop=True)
+
+    def rolling_median(self, name, level='小区', window_days=30, start=None, end=None, unit_price=False,
+                       parent=None):
+        """小区 / 二级区域 / 一级区域 的租金滚动中位数
+
+        每个爬取日期取之前 window_days 天内（含当天）每个房源最后一次的价格求中位数，
+        长期挂牌的房源不会被重复计入。unit_price=True 时按 元/㎡ 计算。
+        小区可按名称或小区编号查询；同名的小区（按 城市 + 小区编号）或区域（按 城市 + 上级区域）分开计算，
+        name 对应不止一个时打印候选并返回空表，用 parent（所在区域或城市名）或小区编号指定。
+        """
+        column = LEVEL_COLUMNS[level]
+        empty = pd.DataFrame(columns=['日期', '中位数', '房源数'])
+        end = end or '9999-12-31'
+        query_start = None
+        if start:
+            query_start = (datetime.strptime(start, '%Y-%m-%d') - timedelta(days=window_days - 1)).strftime('%Y-%m-%d')
+        names = (name,)
+        if level == '小区' and COMMUNITY_NUMBER_RE.match(name):
+            column = 'community_id'
+            names = (name.lstrip('c'), 'c' + name.lstrip('c'))  # 小区链接有 /zufang/c5011.../ 和 /xiaoqu/5011.../ 两种写法
+        df = pd.read_sql_query(f'''
+            SELECT listing_id, crawl_date, price, area, community, community_id, city, region, district
+            FROM observations
+            WHERE {column} IN ({', '.join('?' * len(names))}) AND crawl_date BETWEEN ? AND ? AND price IS NOT NULL
+            ORDER BY crawl_date
+        ''', self.conn, params=names + (query_start or '0000-01-01', end))
+        if parent:
+            df = df[df[list(PARENT_COLUMNS[level])].eq(parent).any(axis=1)]
+        if df.empty:
+            return empty
+        scopes = _scopes(df, level)
+        if scopes.nunique() > 1:
+            candidates = df.assign(scope=scopes).drop_duplicates('scope')
+            print(f"「{name}」对应 {len(candidates)} 个{level}，请用 --parent 指定所在区域" +
+                  ("或用小区编号查询：" if level == '小区' else "："))
+            for _, row in candidates.iterrows():
+                where = ' '.join(str(row[col]) for col in ('city', 'region', 'district') if pd.notna(row[col]))
+                print(f"  {where} {row['community'] if level == '小区' else ''} {row['community_id'] if pd.notna(row['community_id']) else ''}".rstrip())
+            return empty
+        df = df[['listing_id', 'crawl_date', 'price', 'area']]
+        if unit_price:
+            df = df[df['area'] > 0].copy()
+            df['price'] = df['price'] / df['area']
+        if df.empty:
+            return pd.DataFrame(columns=['日期', '中位数', '房源数'])
+
+        # 每条观测是该房源在 [本次日期, min(下次出现前一天, 本次日期 + 窗口 - 1)] 内各计算日的“最后价格”，
+        # 展开到这些计算日后按日期分组求中位数；每日都爬的房源每条观测只展开到一天
+        day = pd.to_datetime(df['crawl_date']).to_numpy(dtype='datetime64[D]')
+        listing = df['listing_id'].to_numpy()
+        order = np.lexsort((day, listing))
+        day, listing, price = day[order], listing[order], df['price'].to_numpy(dtype=np.float64)[order]
+        valid_until = day + np.timedelta64(window_days - 1, 'D')
+        same_next = np.append(listing[1:] == listing[:-1], False)
+        next_day = np.append(day[1:], day[-1:])
+        valid_until = np.where(same_next, np.minimum(valid_until, next_day - np.timedelta64(1, 'D')), valid_until)
+
+        dates = np.unique(day)
+        lo = np.searchsorted(dates, day)
+        hi = np.searchsorted(dates, valid_until, side='right')
+        counts = hi - lo
+        eval_index = np.repeat(lo - np.cumsum(np.append(0, counts[:-1])), counts) + np.arange(counts.sum())
+        expanded = pd.DataFrame({'date': dates[eval_index], 'price': np.repeat(price, counts)})
+        grouped = expanded.groupby('date')['price'].agg(['median', 'size'])
+        if start:
+            grouped = grouped[grouped.index >= np.datetime64(start, 'D')]
+        return pd.DataFrame({
+            '日期': [str(d) for d in grouped.index.to_numpy(dtype='datetime64[D]')],
+            '中位数': grouped['median'].round(2).to_numpy(),
+            '房源数': grouped['size'].to_numpy(),
+        })
+
+    def previous_date(self, date):
+        row = self.conn.execute('SELECT MAX(crawl_date) FROM observations WHERE crawl_date < ?', (date,)).fetchone()
+        return row[0]
+
+    def changes(self, date):
+        """返回 (新上房源, 下架房源) 两个 DataFrame
+
+        新上：当天出现、此前从未出现过的房源；下架：上一次爬取日期出现、当天未出现的房源，
+        只统计当天也爬取过的二级区域，避免把当天没爬的区域误判为下架。
+        """
+        new_listings = pd.read_sql_query('''
+            SELECT o.listing_id AS 房源编号, o.community AS 小区名称, o.district AS 二级区域,
+                   o.price AS "价格(元)", o.title AS 标题
+            FROM observations o
+            WHERE o.crawl_date = ? AND NOT EXISTS (
+                SELECT 1 FROM observations p WHERE p.listing_id = o.listing_id AND p.crawl_date < o.crawl_date)
+        ''', self.conn, params=(date,))
+        previous = self.previous_date(date)
+        if previous is None:
+            new_listings = new_listings.iloc[0:0]  # 第一次爬取，没有可比较的基准
+
+        delisted = pd.read_sql_query('''
+            SELECT p.listing_id AS 房源编号, p.community AS 小区名称, p.district AS 二级区域,
+                   p.price AS "价格(元)", p.title AS 标题
+            FROM observations p
+            WHERE p.crawl_date = ?
+              AND p.district IN (SELECT DISTINCT district FROM observations WHERE crawl_date = ?)
+              AND NOT EXISTS (
+                SELECT 1 FROM observations o WHERE o.listing_id = p.listing_id AND o.crawl_date = ?)
+        ''', self.conn, params=(previous or '', date, date))
+        return new_listings, delisted
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='链家租房价格历史')
+    sub = arg_parser.add_subparsers(dest='command', required=True)
+    p_ingest = sub.add_parser('ingest', help='导入爬取结果 xlsx')
+    p_ingest.add_argument('files', nargs='+')
+    p_history = sub.add_parser('history', help='单个房源的价格变化')
+    p_history.add_argument('listing_id')
+    p_median = sub.add_parser('median', help='租金滚动中位数')
+    p_median.add_argument('name')
+    p_median.add_argument('--level', choices=list(LEVEL_COLUMNS), default='小区')
+    p_median.add_argument('--window', type=int, default=30, help='滚动窗口天数')
+    p_median.add_argument('--start')
+    p_median.add_argument('--end')
+    p_median.add_argument('--unit', action='store_true', help='按每平米租金计算')
+    p_median.add_argument('--parent', help='同名时按所在区域（小区的二级/一级区域、区域的上级区域）或城市区分')
+    p_changes = sub.add_parser('changes', help='某天新上和下架的房源')
+    p_changes.add_argument('date', help='YYYY-MM-DD')
+    args = arg_parser.parse_args()
+
+    store = PriceHistory()
+    try:
+        if args.command == 'ingest':
+            total = sum(store.ingest_excel(path) for path in args.files)
+            print(f"✅ 共导入 {total} 条")
+        elif args.command == 'history':
+            print(store.listing_history(args.listing_id).to_string(index=False))
+        elif args.command == 'median':
+            print(store.rolling_median(args.name, args.level, args.window, args.start, args.end,
+                                       args.unit, args.parent).to_string(index=False))
+        elif args.command == 'changes':
+            new_listings, delisted = store.changes(args.date)
+            print(f"新上 {len(new_listings)} 套：")
+            print(new_listings.to_string(index=False))
+            print(f"\n下架 {len(delisted)} 套：")
+            print(delisted.to_string(index=False))
+    finally:
+        store.close()
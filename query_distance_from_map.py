@@ -1,30 +1,110 @@
+import numpy as np
 import pandas as pd
 import requests
+import threading
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from api_key import BAIDU_MAP_AK
+from map_cache import MapCache, geocode_key, route_key
+from commute_journal import CommuteJournal
+from rate_limit import TokenBucket
+from spatial_index import haversine_km, select_candidates
 
 # 忽略Pandas的版本警告
 warnings.filterwarnings("ignore", message="Pandas requires version")
 
 # 百度地图API密钥（需自行申请）
 
-
-def get_coordinates(address, city="上海市"):
-    """获取地址的经纬度坐标"""
+# 百度地图接口地址（测试时可指向本地模拟服务）
+BAIDU_API_BASE = "http://api.map.baidu.com"
+
+# 查询结果缓存：小区坐标基本不变，路线耗时随路况变化，过期时间分别设置
+GEOCODE_TTL = 180 * 24 * 3600
+ROUTE_TTL = 30 * 24 * 3600
+CACHE = None  # 首次查询时才打开 data/map_cache.db；测试或其他目录下运行时可先设为别的 MapCache
+_cache_lock = threading.Lock()
+
+# 并发模式：每秒请求数按百度账号等级设置（个人认证开发者一般为 3）
+QPS = 3
+WORKERS = 8
+
+# 直线距离预筛选：只对半径内（公里）/ 最近的 k 个小区查询路线，None 表示不筛选
+MAX_RADIUS_KM = None
+NEAREST_K = None
+
+# 所有请求共用一个长连接会话；并发模式下由令牌桶统一限速
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=WORKERS, pool_maxsize=WORKERS))
+SESSION.mount('https://', HTTPAdapter(pool_connections=WORKERS, pool_maxsize=WORKERS))
+RATE_LIMITER = None
+STOP_EVENT = threading.Event()
+
+# 设为 replay.FixtureStore 时把接口响应录制为回放样本；直接运行本程序时由 RECORD_DIR 指定目录
+RECORDER = None
+RECORD_DIR = None  # 例如 'data/fixtures/replay'
+
+
+def get_cache():
+    """返回查询结果缓存，第一次调用时才创建（仅导入本模块不会在当前目录生成缓存文件）"""
+    global CACHE
+    if CACHE is None:
+        with _cache_lock:
+            if CACHE is None:
+                CACHE = MapCache(max_entries=100000)
+    return CACHE
+
+
+class QueryCancelled(Exception):
+    """配额用尽后取消尚未发出的请求"""
+
+
+def api_get(url):
+    """发出一次百度地图接口请求，返回解析后的 JSON"""
+    if RATE_LIMITER is not None and not RATE_LIMITER.acquire(STOP_EVENT):
+        raise QueryCancelled("配额已用尽，取消请求")
+    response = SESSION.get(url, timeout=10)
+    data = response.json()
+    if RECORDER is not None:
+        RECORDER.save_api(url, data)
+    return data
+
+
+def _no_result(data):
+    """地理编码接口明确表示查不到这个地址（而不是网络、权限、并发等临时错误）"""
+    message = str(data.get('msg') or data.get('message') or '')
+    if data['status'] == 0:
+        return not (data.get('result') or {}).get('location')
+    return data['status'] == 1 and '无相关结果' in message
+
+
+def get_coordinates(address, city="上海市", report_missing=False):
+    """获取地址的经纬度坐标
+
+    失败时返回空字符串；report_missing=True 时，接口明确查无此地址返回 "NO_RESULT"，与临时错误区分开。
+    """
+    key = geocode_key(address, city)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
     try:
-        url = f"http://api.map.baidu.com/geocoding/v3/?address={address}&city={city}&output=json&ak={BAIDU_MAP_AK}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        url = f"{BAIDU_API_BASE}/geocoding/v3/?address={address}&city={city}&output=json&ak={BAIDU_MAP_AK}"
+        data = api_get(url)
 
+        if report_missing and _no_result(data):
+            print(f"地址无相关结果：{address}")
+            return "NO_RESULT"
         if data['status'] == 0:
             location = data['result']['location']
-            return f"纬度 {location['lat']}, 经度 {location['lng']}"
+            result = f"纬度 {location['lat']}, 经度 {location['lng']}"
+            get_cache().set(key, result, GEOCODE_TTL)
+            return result
         elif data['status'] == 302:  # 配额超限错误码
             print("\n错误：API配额已用尽")
             return "QUOTA_EXCEEDED"
         else:
-            print(f"获取坐标失败：{data['message']}")
+            print(f"获取坐标失败：{data.get('msg') or data.get('message')}")
             return ""
     except Exception as e:
         print(f"获取坐标异常：{str(e)}")
@@ -33,16 +113,21 @@ def get_coordinates(address, city="上海市"):
 
 def get_driving_info(origin, destination):
     """获取驾车路线信息"""
+    key = route_key('driving', origin, destination)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return tuple(cached)
     try:
-        url = f"http://api.map.baidu.com/directionlite/v1/driving?origin={origin[0]},{origin[1]}&destination={destination[0]},{destination[1]}&ak={BAIDU_MAP_AK}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        url = f"{BAIDU_API_BASE}/directionlite/v1/driving?origin={origin[0]},{origin[1]}&destination={destination[0]},{destination[1]}&ak={BAIDU_MAP_AK}"
+        data = api_get(url)
 
         if data['status'] == 0:
             route = data['result']['routes'][0]
             distance = route['distance']  # 单位：米
             duration = route['duration']  # 单位：秒
-            return distance / 1000, duration / 60  # 返回公里和分钟
+            result = distance / 1000, duration / 60  # 返回公里和分钟
+            get_cache().set(key, result, ROUTE_TTL)
+            return result
         elif data['status'] == 302:  # 配额超限错误码
             print("\n错误：API配额已用尽")
             return "QUOTA_EXCEEDED", "QUOTA_EXCEEDED"
@@ -56,14 +141,18 @@ def get_driving_info(origin, destination):
 
 def get_transit_info(origin, destination):
     """获取公共交通信息"""
+    key = route_key('transit', origin, destination)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return cached
     try:
-        url = f"http://api.map.baidu.com/directionlite/v1/transit?origin={origin[0]},{origin[1]}&destination={destination[0]},{destination[1]}&ak={BAIDU_MAP_AK}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        url = f"{BAIDU_API_BASE}/directionlite/v1/transit?origin={origin[0]},{origin[1]}&destination={destination[0]},{destination[1]}&ak={BAIDU_MAP_AK}"
+        data = api_get(url)
 
         if data['status'] == 0 and data['result']['routes']:
             best_route = min(data['result']['routes'], key=lambda x: x['duration'])
             duration = best_route['duration']  # 总时间（秒）
+            get_cache().set(key, duration / 60, ROUTE_TTL)
             return duration / 60  # 返回分钟
         elif data['status'] == 302:  # 配额超限错误码
             print("\n错误：API配额已用尽")
@@ -88,51 +177,65 @@ def parse_coordinates(coord_str):
         return None, None
 
 
-def process_excel(input_file):
-    """处理Excel文件"""
-    try:
-        # 生成输出文件名（自动添加"-结果"后缀）
-        if input_file.endswith('.xlsx'):
-            output_file = input_file.replace('.xlsx', '-结果.xlsx')
-        else:
-            output_file = input_file + '-结果.xlsx'
+def load_sheet(input_file):
+    """读取待处理的表格并补齐结果列，返回 (df, 输出文件名, 目的地坐标)；失败时返回 None"""
+    # 生成输出文件名（自动添加"-结果"后缀）
+    if input_file.endswith('.xlsx'):
+        output_file = input_file.replace('.xlsx', '-结果.xlsx')
+    else:
+        output_file = input_file + '-结果.xlsx'
 
-        # 尝试使用openpyxl引擎读取Excel
+    # 尝试使用openpyxl引擎读取Excel
+    try:
+        df = pd.read_excel(input_file, engine='openpyxl')
+    except:
+        # 如果失败，尝试其他引擎
         try:
-            df = pd.read_excel(input_file, engine='openpyxl')
+            df = pd.read_excel(input_file, engine='xlrd')
         except:
-            # 如果失败，尝试其他引擎
-            try:
-                df = pd.read_excel(input_file, engine='xlrd')
-            except:
-                print("无法读取Excel文件，请确保文件格式正确且已安装必要的依赖包")
-                return
-
-        # 检查必要列是否存在
-        required_columns = ['出发地', '目的地坐标']
-        for col in required_columns:
-            if col not in df.columns:
-                print(f"缺少必要列：{col}")
-                return
-
-        # 解析目的地坐标（假设所有行的目的地坐标相同）
-        dest_coord_str = df.iloc[0]['目的地坐标']
-        dest_lat, dest_lng = parse_coordinates(dest_coord_str)
-        if dest_lat is None:
-            print("无法解析目的地坐标")
-            return
+            print("无法读取Excel文件，请确保文件格式正确且已安装必要的依赖包")
+            return None
 
-        # 添加新列（如果不存在）
-        new_columns = {
-            '出发地坐标': "",
-            '行车距离(公里)': None,
-            '行车时间(分钟)': None,
-            '公共交通时间(分钟)': None
-        }
+    # 检查必要列是否存在
+    required_columns = ['出发地', '目的地坐标']
+    for col in required_columns:
+        if col not in df.columns:
+            print(f"缺少必要列：{col}")
+            return None
+
+    # 解析目的地坐标（假设所有行的目的地坐标相同）
+    dest_coord_str = df.iloc[0]['目的地坐标']
+    dest_lat, dest_lng = parse_coordinates(dest_coord_str)
+    if dest_lat is None:
+        print("无法解析目的地坐标")
+        return None
+
+    # 添加新列（如果不存在）
+    new_columns = {
+        '出发地坐标': "",
+        '行车距离(公里)': None,
+        '行车时间(分钟)': None,
+        '公共交通时间(分钟)': None
+    }
+
+    for col, default_value in new_columns.items():
+        if col not in df.columns:
+            df[col] = default_value
 
-        for col, default_value in new_columns.items():
-            if col not in df.columns:
-                df[col] = default_value
+    return df, output_file, (dest_lat, dest_lng)
+
+
+def process_excel(input_file):
+    """处理Excel文件"""
+    try:
+        loaded = load_sheet(input_file)
+        if loaded is None:
+            return
+        df, output_file, (dest_lat, dest_lng) = loaded
+        journal = CommuteJournal(output_file)
+        restored = journal.restore(df)
+        if restored:
+            print(f"从进度日志 {journal.path} 恢复 {restored} 行结果")
 
         # 处理每一行数据
         quota_exceeded = False
@@ -152,6 +255,7 @@ def process_excel(input_file):
                         quota_exceeded = True
                         break
                     df.at[index, '出发地坐标'] = coord_result
+                    journal.record(df, index, {'出发地坐标': coord_result})
                     time.sleep(1)  # 避免请求过于频繁
 
                 # 2. 解析出发地坐标
@@ -169,6 +273,8 @@ def process_excel(input_file):
                     if distance:
                         df.at[index, '行车距离(公里)'] = round(distance, 2)
                         df.at[index, '行车时间(分钟)'] = round(driving_time, 1)
+                        journal.record(df, index, {'行车距离(公里)': round(distance, 2),
+                                                   '行车时间(分钟)': round(driving_time, 1)})
                         time.sleep(1)
 
                 # 4. 获取公共交通信息
@@ -179,27 +285,161 @@ def process_excel(input_file):
                         break
                     if transit_time:
                         df.at[index, '公共交通时间(分钟)'] = round(transit_time, 1)
+                        journal.record(df, index, {'公共交通时间(分钟)': round(transit_time, 1)})
                         time.sleep(1)
 
-                # 每处理5行保存一次进度
-                if (index + 1) % 5 == 0:
-                    df.to_excel(output_file, index=False, engine='openpyxl')
-                    print(f"已保存临时进度到 {output_file}")
+            except Exception as e:
+                print(f"处理第 {index + 1} 行出错: {str(e)}")
+                continue
+
+        # 最终保存结果（只写这一次 xlsx；配额用尽时保留进度日志供下次继续）
+        df.to_excel(output_file, index=False, engine='openpyxl')
+        journal.close(remove=not quota_exceeded)
+        print(f"\n处理完成，结果已保存到 {output_file}")
+        stats = get_cache().stats()
+        print(f"缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.0%}")
+
+    except Exception as e:
+        print(f"处理过程中发生错误: {str(e)}")
+
 
+def lookup_row(row, destination, with_routes=True):
+    """查询一行所需的坐标和路线，返回 {列名: 值}；配额用尽时额外带 'QUOTA_EXCEEDED': True
+
+    with_routes=False 时只补坐标（直线距离预筛选的第一轮）。
+    """
+    result = {}
+    if STOP_EVENT.is_set():
+        return result
+    coord_str = row['出发地坐标']
+    if pd.isna(coord_str) or coord_str == "":
+        coord_str = get_coordinates(row['出发地'])
+        if coord_str == "QUOTA_EXCEEDED":
+            return {'QUOTA_EXCEEDED': True}
+        result['出发地坐标'] = coord_str
+        if STOP_EVENT.is_set() or not with_routes:
+            return result
+    elif not with_routes:
+        return result
+
+    start_lat, start_lng = parse_coordinates(coord_str)
+    if start_lat is None:
+        print(f"无法解析出发地坐标: {row['出发地']}")
+        return result
+
+    if pd.isna(row['行车距离(公里)']) and not STOP_EVENT.is_set():
+        distance, driving_time = get_driving_info((start_lat, start_lng), destination)
+        if distance == "QUOTA_EXCEEDED":
+            result['QUOTA_EXCEEDED'] = True
+            return result
+        if distance:
+            result['行车距离(公里)'] = round(distance, 2)
+            result['行车时间(分钟)'] = round(driving_time, 1)
+
+    if pd.isna(row['公共交通时间(分钟)']) and not STOP_EVENT.is_set():
+        transit_time = get_transit_info((start_lat, start_lng), destination)
+        if transit_time == "QUOTA_EXCEEDED":
+            result['QUOTA_EXCEEDED'] = True
+            return result
+        if transit_time:
+            result['公共交通时间(分钟)'] = round(transit_time, 1)
+
+    return result
+
+
+def run_lookups(df, indices, destination, journal, workers, with_routes=True):
+    """并发查询指定行并把结果写回 df，每行完成即追加到进度日志；返回是否未触发配额用尽"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(lookup_row, df.loc[index], destination, with_routes): index
+                   for index in indices}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            index = futures[future]
+            try:
+                result = future.result()
             except Exception as e:
                 print(f"处理第 {index + 1} 行出错: {str(e)}")
                 continue
 
-        # 最终保存结果
+            if result.pop('QUOTA_EXCEEDED', False) and not STOP_EVENT.is_set():
+                print("\nAPI配额已用尽，取消剩余查询")
+                STOP_EVENT.set()
+                for other in futures:
+                    other.cancel()
+            for col, value in result.items():
+                df.at[index, col] = value
+            journal.record(df, index, result)
+            print(f"完成第 {index + 1}/{len(df)} 行: {df.at[index, '出发地']}")
+    return not STOP_EVENT.is_set()
+
+
+def prefilter_by_distance(df, indices, destination, max_radius_km=None, nearest_k=None):
+    """计算直线距离列，只保留半径内 / 最近 k 个小区作为路线查询候选"""
+    coords = [parse_coordinates(value) for value in df['出发地坐标']]
+    lats = np.array([lat if lat is not None else np.nan for lat, _ in coords])
+    lngs = np.array([lng if lng is not None else np.nan for _, lng in coords])
+    distances = haversine_km(lats, lngs, destination[0], destination[1])
+    df['直线距离(公里)'] = np.round(distances, 2)
+
+    mask = select_candidates(distances, max_radius_km, nearest_k)
+    selected = [index for index in indices if mask[df.index.get_loc(index)]]
+    print(f"直线距离预筛选：{len(indices)} 行中 {len(selected)} 行需要查询路线")
+    return selected
+
+
+def process_excel_concurrent(input_file, qps=QPS, workers=WORKERS, max_radius_km=None, nearest_k=None):
+    """并发处理Excel文件：多线程共用一个连接池，由令牌桶把总请求速率控制在 qps 以内
+
+    每行结果查到即写入进度日志，xlsx 只在最后写一次；再次运行时先从日志恢复，已查过的行不再请求。
+    配额用尽时取消尚未开始的行，已完成的结果照常保存。
+    给出 max_radius_km / nearest_k 时先补齐坐标，再只对直线距离在半径内或最近的 k 个小区查询路线。
+    """
+    global RATE_LIMITER
+    try:
+        loaded = load_sheet(input_file)
+        if loaded is None:
+            return
+        df, output_file, destination = loaded
+        journal = CommuteJournal(output_file)
+        restored = journal.restore(df)
+        if restored:
+            print(f"从进度日志 {journal.path} 恢复 {restored} 行结果")
+
+        pending = [index for index, row in df.iterrows()
+                   if pd.isna(row['出发地坐标']) or row['出发地坐标'] == ""
+                   or pd.isna(row['行车距离(公里)']) or pd.isna(row['公共交通时间(分钟)'])]
+        print(f"共 {len(df)} 行，待查询 {len(pending)} 行，限速 {qps} 次/秒，{workers} 个线程")
+
+        RATE_LIMITER = TokenBucket(qps, capacity=qps)
+        STOP_EVENT.clear()
+        ok = True
+        if max_radius_km is not None or nearest_k is not None:
+            need_coords = [index for index in pending
+                           if pd.isna(df.at[index, '出发地坐标']) or df.at[index, '出发地坐标'] == ""]
+            ok = run_lookups(df, need_coords, destination, journal, workers, with_routes=False)
+            pending = prefilter_by_distance(df, pending, destination, max_radius_km, nearest_k)
+        if ok:
+            ok = run_lookups(df, pending, destination, journal, workers)
+
         df.to_excel(output_file, index=False, engine='openpyxl')
+        journal.close(remove=ok)
         print(f"\n处理完成，结果已保存到 {output_file}")
+        stats = get_cache().stats()
+        print(f"缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.0%}")
 
     except Exception as e:
         print(f"处理过程中发生错误: {str(e)}")
+    finally:
+        RATE_LIMITER = None
 
 
 if __name__ == "__main__":
 
     input_file = 'data\小区信息20250816 - 副本.xlsx'
+    if RECORD_DIR:
+        from replay import FixtureStore
+
+        RECORDER = FixtureStore(RECORD_DIR)
     print(f"开始处理文件: {input_file}")
-    process_excel(input_file)
\ No newline at end of file
+    process_excel_concurrent(input_file, max_radius_km=MAX_RADIUS_KM, nearest_k=NEAREST_K)
\ No newline at end of file
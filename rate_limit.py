@@ -0,0 +1,109 @@
+# rate_limit.py
+"""线程安全的令牌桶限速器，供多个爬虫/查询线程共享"""
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 次，最多允许 capacity 次突发"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """阻塞直到拿到一个令牌；stop_event 被置位时立即返回 False"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class HostRateLimiter:
+    """按域名分别限速，所有线程共享同一个实例即可保证全局礼貌访问频率"""
+
+    def __init__(self, requests_per_minute):
+        self.rate = requests_per_minute / 60.0
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate)
+        bucket.acquire()
+
+
+class AdaptiveDelay:
+    """根据抓取结果自适应调整翻页间隔，多个浏览器共享同一实例（同一站点的容忍度是共同的）
+
+    - 连续 decrease_after 页正常后间隔乘以 decrease_factor，逐步逼近下限
+    - 遇到验证码间隔乘以 captcha_factor，遇到空页乘以 empty_factor
+    - 验证码出现时的间隔（放大 1.25 倍）记为新的下限；之后每连续 floor_decay_after 页正常，
+      下限乘以 decrease_factor 逐步回落到 min_delay，一次早期的验证码不会拖慢整次爬取
+    间隔始终限制在 [min_delay, max_delay] 之间；min_delay 默认等于起始间隔（配置的 delay 是礼貌访问的下限，
+    要让间隔在连续正常后缩短到 delay 以下需显式设置更小的 min_delay），max_delay 默认为 8 倍
+    """
+
+    OK, CAPTCHA, EMPTY = 'ok', 'captcha', 'empty'
+    MIN_DELAY_RATIO = 1.0
+
+    def __init__(self, base_delay, min_delay=None, max_delay=None, decrease_after=5, decrease_factor=0.85,
+                 captcha_factor=3.0, empty_factor=2.0, floor_decay_after=50):
+        self.min_delay = float(base_delay * self.MIN_DELAY_RATIO if min_delay is None else min_delay)
+        self.max_delay = float(base_delay * 8 if max_delay is None else max_delay)
+        self.decrease_after = decrease_after
+        self.decrease_factor = decrease_factor
+        self.captcha_factor = captcha_factor
+        self.empty_factor = empty_factor
+        self.floor_decay_after = floor_decay_after
+        self.floor = self.min_delay
+        self.delay = self._clamp(base_delay)
+        self.streak = 0
+        self.clean_pages = 0  # 上次验证码之后、上次下限回落之后的正常页数
+        self.lock = threading.Lock()
+
+    def _clamp(self, delay):
+        return min(self.max_delay, max(self.floor, delay))
+
+    def record(self, outcome):
+        """outcome 为 OK / CAPTCHA / EMPTY，返回调整后的间隔"""
+        with self.lock:
+            if outcome == self.CAPTCHA:
+                self.floor = min(self.max_delay, max(self.min_delay, self.delay * 1.25))
+                self.delay = self._clamp(self.delay * self.captcha_factor)
+                self.streak = 0
+                self.clean_pages = 0
+            elif outcome == self.EMPTY:
+                self.delay = self._clamp(self.delay * self.empty_factor)
+                self.streak = 0
+            else:
+                self.streak += 1
+                self.clean_pages += 1
+                if self.floor > self.min_delay and self.clean_pages >= self.floor_decay_after:
+                    self.floor = max(self.min_delay, self.floor * self.decrease_factor)
+                    self.clean_pages = 0
+                if self.streak >= self.decrease_after:
+                    self.delay = self._clamp(self.delay * self.decrease_factor)
+                    self.streak = 0
+            return self.delay
+
+    def current(self):
+        with self.lock:
+            return self.delay
@@ -0,0 +1,374 @@
+# rent_cube.py
+"""租金汇总立方体（增量更新）
+
+把爬取结果按 位置层级 × 户型 × 近地铁 × 精装 的各种组合预先汇总，
+每个格子保存 房源数、租金和、面积和、每平米租金和，以及租金 / 每平米租金的分位数草图，
+查询时直接读格子，不再每次把整份 xlsx 读进 pandas 重算。
+
+- 位置层级：全部 / 一级区域 / 一级区域+二级区域 / 一级区域+二级区域+小区名称
+- 属性：户型、近地铁、精装 的任意子集
+共 4 × 8 = 32 种组合。
+
+同一房源（按链接中的房源编号）再次出现时先减去旧的贡献再加上新的，重复合并同一批数据结果不变。
+每套房源记录最后一次出现的日期（爬取时间），超过 EXPIRE_DAYS 天没有再出现的房源（已下架）从汇总中撤回，
+汇总反映当前在租房源而不是历史上出现过的所有房源；天数以汇总中最新的爬取日期为准，导入历史 xlsx 时不会误撤。
+增量爬取时未变化的房源不在结果中，由调用方用 touch 刷新其最后出现日期（见 listing_index.ListingIndex.seen_on）。
+汇总保存在 data/rent_cube.json：
+    python rent_cube.py update data/链家租房数据_Selenium_*.xlsx
+    python rent_cube.py show 二级区域 --filter 一级区域=浦东 --filter 近地铁=True
+    python rent_cube.py show 户型 --filter 小区名称=东昌新村
+"""
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import pandas as pd
+
+from listing_index import INDEX_FILE, ListingIndex, extract_listing_id
+
+CUBE_FILE = os.path.join('data', 'rent_cube.json')
+LOCATION_LEVELS = ('一级区域', '二级区域', '小区名称')
+ATTRIBUTES = ('户型', '近地铁', '精装')
+DIMENSIONS = LOCATION_LEVELS + ATTRIBUTES
+EXPIRE_DAYS = 14  # 超过这么多天没有再出现的房源视为已下架
+
+
+class QuantileSketch:
+    """对数分桶的分位数草图（DDSketch 思路）：相对误差不超过 relative_accuracy，可合并、可减去"""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.count = 0
+
+    def _bin(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value, n=1):
+        """n 为负数时减去之前加入的值"""
+        if value is None or not value > 0:
+            return
+        self.add_bin(self._bin(value), n)
+
+    def add_bin(self, key, n=1):
+        """按已算好的桶号加入，同一个值要加入很多草图时只算一次对数"""
+        total = self.bins.get(key, 0) + n
+        if total:
+            self.bins[key] = total
+        else:
+            self.bins.pop(key, None)
+        self.count += n
+
+    def merge(self, other):
+        for key, n in other.bins.items():
+            total = self.bins.get(key, 0) + n
+            if total:
+                self.bins[key] = total
+            else:
+                self.bins.pop(key, None)
+        self.count += other.count
+
+    def quantile(self, q):
+        """第 q 分位数；空草图（如只有租金为 0 的房源）返回 NaN"""
+        if self.count <= 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)  # 桶内代表值，相对误差不超过 relative_accuracy
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {'a': self.relative_accuracy, 'bins': {str(k): n for k, n in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['a'])
+        sketch.bins = {int(k): n for k, n in data['bins'].items()}
+        sketch.count = sum(sketch.bins.values())
+        return sketch
+
+
+class Cell:
+    """一个维度组合下的汇总值"""
+
+    __slots__ = ('count', 'price_sum', 'area_price_sum', 'area_sum', 'unit_sum', 'price_sketch', 'unit_sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.price_sum = 0.0
+        self.area_price_sum = 0.0  # 有面积的房源的租金和，与 area_sum 相除得 总租金/总面积
+        self.area_sum = 0.0
+        self.unit_sum = 0.0
+        self.price_sketch = QuantileSketch()
+        self.unit_sketch = QuantileSketch()
+
+    def add(self, price, area, n=1, price_bin=None, unit_bin=None):
+        unit = price / area if area else None
+        self.count += n
+        self.price_sum += n * price
+        if unit is not None:
+            self.area_price_sum += n * price
+            self.area_sum += n * area
+            self.unit_sum += n * unit
+        if price_bin is not None:
+            self.price_sketch.add_bin(price_bin, n)
+        if unit_bin is not None:
+            self.unit_sketch.add_bin(unit_bin, n)
+
+    def to_dict(self):
+        return {'count': self.count, 'price_sum': self.price_sum, 'area_price_sum': self.area_price_sum,
+                'area_sum': self.area_sum,
+                'unit_sum': self.unit_sum, 'price_sketch': self.price_sketch.to_dict(),
+                'unit_sketch': self.unit_sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        cell = cls()
+        cell.count, cell.price_sum = data['count'], data['price_sum']
+        cell.area_price_sum, cell.area_sum, cell.unit_sum = data['area_price_sum'], data['area_sum'], data['unit_sum']
+        cell.price_sketch = QuantileSketch.from_dict(data['price_sketch'])
+        cell.unit_sketch = QuantileSketch.from_dict(data['unit_sketch'])
+        return cell
+
+
+def _cuboids():
+    """所有预先汇总的维度组合（每个为维度名元组）"""
+    result = []
+    for depth in range(len(LOCATION_LEVELS) + 1):
+        for r in range(len(ATTRIBUTES) + 1):
+            for attrs in combinations(ATTRIBUTES, r):
+                result.append(LOCATION_LEVELS[:depth] + attrs)
+    return result
+
+
+CUBOIDS = _cuboids()
+
+
+def _dimension_value(row, dim):
+    value = row.get(dim)
+    if dim in ('近地铁', '精装'):
+        return bool(value) if value is not None and not (isinstance(value, float) and math.isnan(value)) else False
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+class RentCube:
+    def __init__(self):
+        self.cells = {dims: {} for dims in CUBOIDS}  # 维度组合 -> {该组合下的取值元组: Cell}
+        self.listings = {}  # 房源编号 -> [各维度取值列表, 租金, 面积, 最后出现日期]，用于撤回旧贡献和过期房源
+
+    def _apply(self, values, price, area, n):
+        row = dict(zip(DIMENSIONS, values))
+        sketch = QuantileSketch()
+        price_bin = sketch._bin(price) if price > 0 else None
+        unit_bin = sketch._bin(price / area) if area and price > 0 else None
+        for dims, cells in self.cells.items():
+            key = tuple(row[dim] for dim in dims)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = Cell()
+            cell.add(price, area, n, price_bin, unit_bin)
+            if cell.count == 0:
+                del cells[key]
+
+    def add_rows(self, rows):
+        """合并一批房源（parse_house 的字典或 xlsx 的行），返回 (新增房源数, 更新房源数)"""
+        added = updated = 0
+        for row in rows:
+            listing_id = extract_listing_id(row.get('链接'))
+            price = row.get('价格(元)')
+            if not listing_id or price is None or pd.isna(price):
+                continue
+            area = row.get('面积(㎡)')
+            area = float(area) if area is not None and not pd.isna(area) and area > 0 else None
+            values = [_dimension_value(row, dim) for dim in DIMENSIONS]
+            entry = [values, float(price), area]
+            seen = _seen_date(row.get('爬取时间'))
+            previous = self.listings.get(listing_id)
+            if previous is not None and previous[:3] == entry:
+                previous[3] = max(previous[3], seen)
+                continue
+            if previous is not None:
+                self._apply(previous[0], previous[1], previous[2], -1)
+                updated += 1
+            else:
+                added += 1
+            self._apply(values, float(price), area, 1)
+            self.listings[listing_id] = entry + [max(previous[3], seen) if previous is not None else seen]
+        return added, updated
+
+    def touch(self, listing_ids, seen=None):
+        """刷新房源的最后出现日期（增量爬取时未变化、没有出现在结果中的房源），返回刷新数"""
+        seen = seen or datetime.now().strftime('%Y-%m-%d')
+        touched = 0
+        for listing_id in listing_ids:
+            entry = self.listings.get(listing_id)
+            if entry is not None:
+                entry[3] = max(entry[3], seen)
+                touched += 1
+        return touched
+
+    def expire(self, max_age_days=EXPIRE_DAYS, today=None):
+        """撤回最后出现日期早于 today - max_age_days 的房源，返回撤回数
+
+        today 默认为汇总中最新的最后出现日期（而不是当前日期），合并历史数据时按数据本身的时间判断。
+        """
+        if not self.listings:
+            return 0
+        today = today or max(entry[3] for entry in self.listings.values())
+        cutoff = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=max_age_days)).strftime('%Y-%m-%d')
+        expired = [listing_id for listing_id, entry in self.listings.items() if entry[3] < cutoff]
+        for listing_id in expired:
+            values, price, area, _ = self.listings.pop(listing_id)
+            self._apply(values, price, area, -1)
+        return len(expired)
+
+    def summary(self, by=(), filters=None):
+        """按 by 中的维度分组、按 filters（{维度: 取值}）筛选，返回汇总 DataFrame
+
+        位置维度会自动补上上级（如按小区名称分组时同时区分一级、二级区域），只读取对应组合的格子。
+        """
+        filters = dict(filters or {})
+        wanted = set(by) | set(filters)
+        unknown = wanted - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"未知维度: {', '.join(sorted(unknown))}")
+        depth = max([LOCATION_LEVELS.index(d) + 1 for d in wanted if d in LOCATION_LEVELS], default=0)
+        dims = LOCATION_LEVELS[:depth] + tuple(d for d in ATTRIBUTES if d in wanted)
+        group_dims = [d for d in dims if d in by or (d in LOCATION_LEVELS and d not in filters)]
+        filter_values = {dim: _filter_value(dim, value) for dim, value in filters.items()}
+
+        records = []
+        for key, cell in self.cells[dims].items():
+            values = dict(zip(dims, key))
+            if any(_filter_value(dim, values[dim]) != value for dim, value in filter_values.items()):
+                continue
+            record = {dim: values[dim] for dim in group_dims}
+            # 只有租金为 0 的房源时草图为空，分位数和均值为 NaN，列保持浮点类型
+            record.update({
+                '房源数': cell.count,
+                '平均租金': round(cell.price_sum / cell.count, 1),
+                '租金中位数': round(cell.price_sketch.quantile(0.5), 1),
+                '平均每平米租金': round(cell.unit_sum / cell.unit_sketch.count, 2) if cell.unit_sketch.count else math.nan,
+                '总租金/总面积': round(cell.area_price_sum / cell.area_sum, 2) if cell.area_sum else math.nan,
+                '每平米租金P25': round(cell.unit_sketch.quantile(0.25), 2),
+                '每平米租金中位数': round(cell.unit_sketch.quantile(0.5), 2),
+                '每平米租金P75': round(cell.unit_sketch.quantile(0.75), 2),
+            })
+            records.append(record)
+        df = pd.DataFrame(records)
+        if not df.empty:
+            df = df.sort_values('房源数', ascending=False, kind='stable').reset_index(drop=True)
+        return df
+
+    def save(self, path=CUBE_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = {
+            'cells': [[list(dims), list(key), cell.to_dict()]
+                      for dims, cells in self.cells.items() for key, cell in cells.items()],
+            'listings': self.listings,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CUBE_FILE):
+        cube = cls()
+        if not os.path.exists(path):
+            return cube
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for dims, key, cell in data['cells']:
+            cube.cells[tuple(dims)][tuple(key)] = Cell.from_dict(cell)
+        cube.listings = data['listings']
+        today = datetime.now().strftime('%Y-%m-%d')
+        for entry in cube.listings.values():
+            if len(entry) == 3:
+                entry.append(today)  # 旧版本保存的汇总没有最后出现日期，从今天开始计
+        return cube
+
+
+def merge_crawl(rows, incremental=False):
+    """把一次爬取结果合并进 data/rent_cube.json 并撤回过期房源，返回 (新增, 更新, 撤回)
+
+    incremental 为 True 时结果中只有新增/变化的房源，按去重索引刷新今天见过的已知房源的最后出现日期。
+    """
+    cube = RentCube.load()
+    added, updated = cube.add_rows(rows)
+    if incremental and os.path.exists(INDEX_FILE):
+        index = ListingIndex()
+        try:
+            today = datetime.now().strftime('%Y-%m-%d')
+            cube.touch(index.seen_on(today), today)
+        finally:
+            index.close()
+    expired = cube.expire()
+    cube.save()
+    return added, updated, expired
+
+
+def _seen_date(value):
+    """爬取时间（字符串或 Timestamp）-> 'YYYY-MM-DD'，没有时为今天"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return datetime.now().strftime('%Y-%m-%d')
+    if isinstance(value, str):
+        return value.strip()[:10] or datetime.now().strftime('%Y-%m-%d')
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _filter_value(dim, value):
+    """命令行传入的筛选值都是字符串，布尔维度统一转成 bool 比较"""
+    if dim in ('近地铁', '精装'):
+        return value if isinstance(value, bool) else str(value).lower() in ('true', '1', '是', 'yes')
+    return str(value)
+
+
+def update_from_excel(cube, paths):
+    """把若干次爬取导出的 xlsx 合并进立方体"""
+    for path in paths:
+        try:
+            df = pd.read_excel(path, engine='openpyxl')
+        except Exception as e:
+            print(f"无法读取Excel文件: {path} {str(e)}")
+            continue
+        added, updated = cube.add_rows(df.to_dict('records'))
+        print(f"已合并 {path}：新增 {added} 套，更新 {updated} 套")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='链家租金汇总立方体')
+    sub = arg_parser.add_subparsers(dest='command', required=True)
+    p_update = sub.add_parser('update', help='合并爬取结果 xlsx')
+    p_update.add_argument('files', nargs='+')
+    p_show = sub.add_parser('show', help='查看汇总')
+    p_show.add_argument('by', nargs='*', help=f"分组维度，可选 {'、'.join(DIMENSIONS)}")
+    p_show.add_argument('--filter', action='append', default=[], help='维度=取值，可多次指定')
+    args = arg_parser.parse_args()
+
+    cube = RentCube.load()
+    if args.command == 'update':
+        update_from_excel(cube, args.files)
+        expired = cube.expire()
+        if expired:
+            print(f"已撤回 {expired} 套超过 {EXPIRE_DAYS} 天未出现的房源")
+        cube.save()
+        print(f"✅ 汇总已保存到 {CUBE_FILE}（{len(cube.listings)} 套房源，{len(cube.cells)} 个格子）")
+    else:
+        filters = dict(item.split('=', 1) for item in args.filter)
+        try:
+            result = cube.summary(args.by, filters)
+        except ValueError as e:
+            print(str(e))
+        else:
+            print(result.to_string(index=False) if not result.empty else "没有符合条件的数据")
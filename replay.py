@@ -0,0 +1,307 @@
+# replay.py
+"""录制与回放：离线测试爬虫和通勤查询，不访问链家和百度
+
+- FixtureStore：样本库（默认 data/fixtures/replay），保存爬取时抓到的列表页（pages/*.html，pages.json 为 路径→文件）
+  和百度地图接口响应（api.jsonl，按 路径+参数（去掉 ak）索引）。
+  config.json 中 "record_fixtures": "data/fixtures/replay" 时爬虫每页录制；
+  query_distance_from_map.RECORDER 设为 FixtureStore 时录制接口响应（流水线按同一配置自动设置）。
+- StubSite：本地模拟站点，同时充当链家列表页和百度地图接口：
+  录制过的页面/响应原样返回，没有录制的列表页按 listings 条房源生成模拟页面（最后一页不足 30 条），
+  接口按坐标生成确定的模拟结果；可设置响应延迟，并每隔 captcha_every 次列表请求重定向到验证页，
+  完成验证时像真实站点一样下发一个验证 cookie（lianjia_verified）。
+- ReplayBrowser：代替 Selenium 浏览器的最小实现，遇到验证页时自动“完成验证”回到原页面，
+  供 "fetch_mode": "replay" 使用（HTTP 直取，被验证拦截时走它）。
+
+完整流水线的基准测试见 benchmark_pipeline.py。
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urlsplit
+
+import requests
+
+REPLAY_DIR = os.path.join('data', 'fixtures', 'replay')
+REPLAY_COOKIE_FILE = os.path.join('data', 'replay_cookies.json')  # 回放模式的 cookie，不覆盖真实站点的会话 cookie
+PAGE_RE = re.compile(r'^(/.*/)pg(\d+)/$')
+EMPTY_PAGE = '<html><head><meta charset="utf-8"></head><body><div class="content__list"></div></body></html>'
+CAPTCHA_PAGE = '<html><head><meta charset="utf-8"></head><body><div class="captcha">人机验证</div></body></html>'
+CENTER = (31.2304, 121.4737)  # 模拟地理编码结果分布在上海市中心附近
+
+
+def api_key(url):
+    """接口请求的索引键：路径 + 排序后的参数，去掉 ak；录制和回放两侧的编码差异不影响匹配"""
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'ak')
+    return parts.path + '?' + urlencode(params)
+
+
+class FixtureStore:
+    """录制样本库；多个线程同时写入是安全的"""
+
+    def __init__(self, root=REPLAY_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.page_index_file = os.path.join(root, 'pages.json')
+        self.api_file = os.path.join(root, 'api.jsonl')
+        self.pages = {}
+        self.api = {}
+        if os.path.exists(self.page_index_file):
+            with open(self.page_index_file, 'r', encoding='utf-8') as f:
+                self.pages = json.load(f)
+        if os.path.exists(self.api_file):
+            with open(self.api_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.api[record['key']] = record['response']
+
+    def save_page(self, url, html):
+        path = urlsplit(url).path
+        name = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16] + '.html'
+        with self.lock:
+            os.makedirs(os.path.join(self.root, 'pages'), exist_ok=True)
+            with open(os.path.join(self.root, 'pages', name), 'w', encoding='utf-8') as f:
+                f.write(html)
+            self.pages[path] = name
+            tmp_path = self.page_index_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.pages, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.page_index_file)
+
+    def load_page(self, path):
+        name = self.pages.get(path)
+        if name is None:
+            return None
+        with open(os.path.join(self.root, 'pages', name), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def save_api(self, url, response):
+        key = api_key(url)
+        line = json.dumps({'key': key, 'response': response}, ensure_ascii=False)
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.api_file, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.api[key] = response
+
+    def districts(self):
+        """录制过的区域（列表页路径去掉 pgN/），按路径排序"""
+        return sorted({match.group(1) for match in map(PAGE_RE.match, self.pages) if match})
+
+
+def _point(text):
+    lat, lng = text.split(',')
+    return float(lat), float(lng)
+
+
+def _distance_km(origin, destination):
+    lat1, lng1, lat2, lng2 = map(math.radians, origin + destination)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+def synthetic_api(path, params):
+    """没有录制时的模拟接口响应：地理编码按地址散列到市中心附近，路线按直线距离估算"""
+    if path.startswith('/geocoding/'):
+        digest = int(hashlib.md5(params.get('address', '').encode('utf-8')).hexdigest(), 16)
+        lat = CENTER[0] + (digest % 2000 - 1000) / 10000
+        lng = CENTER[1] + (digest // 2000 % 2000 - 1000) / 10000
+        return {'status': 0, 'result': {'location': {'lat': round(lat, 6), 'lng': round(lng, 6)}}}
+    if path.startswith('/directionlite/'):
+        km = _distance_km(_point(params['origin']), _point(params['destination'])) * 1.3
+        if path.endswith('/transit'):
+            return {'status': 0, 'result': {'routes': [{'duration': int(km / 15 * 3600) + 600},
+                                                       {'duration': int(km / 18 * 3600) + 900}]}}
+        return {'status': 0, 'result': {'routes': [{'distance': int(km * 1000), 'duration': int(km / 30 * 3600)}]}}
+    if path.startswith('/routematrix/'):
+        speed = {'driving': 30, 'riding': 15, 'walking': 5}.get(path.rsplit('/', 1)[-1], 30)
+        result = []
+        for origin in params['origins'].split('|'):
+            for destination in params['destinations'].split('|'):
+                km = _distance_km(_point(origin), _point(destination)) * 1.3
+                result.append({'distance': {'value': int(km * 1000)}, 'duration': {'value': int(km / speed * 3600)}})
+        return {'status': 0, 'result': result}
+    return {'status': 1, 'message': f'模拟站点不支持的接口: {path}'}
+
+
+class StubSite:
+    """本地模拟站点（链家列表页 + 百度地图接口），start() 后 url 为站点地址
+
+    latency / api_latency 为每次响应前的等待秒数；captcha_every 为 N 时每第 N 次列表页请求被重定向到验证页，
+    该页面在完成验证前一直被拦截；验证完成（GET /captcha/solve，等待 captcha_seconds）后下发验证 cookie，
+    重定向回原页面且该次不再拦截。
+    listings 为没有录制的区域每个区域生成的房源数。
+    """
+
+    def __init__(self, store=None, latency=0.0, api_latency=0.0, captcha_every=0, captcha_seconds=0.0,
+                 listings=95, per_page=30):
+        self.store = store
+        self.latency = latency
+        self.api_latency = api_latency
+        self.captcha_every = captcha_every
+        self.captcha_seconds = captcha_seconds
+        self.listings = listings
+        self.per_page = per_page
+        self.lock = threading.Lock()
+        self.counters = {'list_requests': 0, 'pages_served': 0, 'captchas': 0, 'api_calls': 0}
+        self.passes = set()  # 已完成验证、下一次请求不再拦截的页面
+        self.blocked = set()  # 已被重定向到验证页、完成验证前一直拦截的页面
+        self.fresh_requests = 0  # 不在上面两种状态的列表请求数，决定每第几次拦截
+        self.synthetic_districts = {}  # 区域路径 -> 编号
+        self.recorded_districts = set(store.districts()) if store is not None else set()
+        self.server = None
+        self.url = None
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+            return self.counters[name]
+
+    def list_page(self, path):
+        """录制过的页面原样返回，否则生成模拟页面；不是列表页路径时返回 None"""
+        if self.store is not None:
+            html = self.store.load_page(path)
+            if html is not None:
+                return html
+        match = PAGE_RE.match(path)
+        if not match:
+            return None
+        district, page = match.group(1), int(match.group(2))
+        if district in self.recorded_districts:
+            return EMPTY_PAGE  # 录制到最后一页之后
+        from benchmark_parser import make_synthetic_page
+
+        with self.lock:
+            number = self.synthetic_districts.setdefault(district, len(self.synthetic_districts))
+        remaining = self.listings - (page - 1) * self.per_page
+        if remaining <= 0:
+            return EMPTY_PAGE
+        first = number * 1000000 + (page - 1) * self.per_page  # 各区域的房源编号互不重叠
+        return make_synthetic_page(page, min(self.per_page, remaining), first=first)
+
+    def start(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, body, content_type='text/html; charset=utf-8', location=None, cookie=None):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                if location:
+                    self.send_header('Location', location)
+                if cookie:
+                    self.send_header('Set-Cookie', cookie)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                path = parts.path
+                if path.startswith(('/geocoding/', '/directionlite/', '/routematrix/')):
+                    site.count('api_calls')
+                    if site.api_latency:
+                        time.sleep(site.api_latency)
+                    response = None
+                    if site.store is not None:
+                        response = site.store.api.get(api_key(self.path))
+                    if response is None:
+                        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                        response = synthetic_api(path, params)
+                    self._send(200, json.dumps(response, ensure_ascii=False), 'application/json')
+                    return
+                if path == '/captcha/verify':
+                    self._send(200, CAPTCHA_PAGE)
+                    return
+                if path == '/captcha/solve':
+                    target = parse_qs(parts.query).get('return', ['/'])[0]
+                    if site.captcha_seconds:
+                        time.sleep(site.captcha_seconds)
+                    with site.lock:
+                        site.blocked.discard(target)
+                        site.passes.add(target)
+                    self._send(302, '', location=target, cookie=f'lianjia_verified={int(time.time())}; Path=/')
+                    return
+
+                site.count('list_requests')
+                if site.latency:
+                    time.sleep(site.latency)
+                with site.lock:
+                    passed = path in site.passes
+                    site.passes.discard(path)
+                    blocked = path in site.blocked
+                    if not passed and not blocked:
+                        site.fresh_requests += 1
+                        blocked = bool(site.captcha_every) and site.fresh_requests % site.captcha_every == 0
+                    if blocked:
+                        site.blocked.add(path)
+                if blocked:
+                    site.count('captchas')
+                    self._send(302, '', location='/captcha/verify?return=' + quote(path))
+                    return
+                html = site.list_page(path)
+                if html is None:
+                    self._send(404, EMPTY_PAGE)
+                    return
+                site.count('pages_served')
+                self._send(200, html)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class ReplayBrowser:
+    """只实现 load_in_browser / HybridFetcher 用到的几个 WebDriver 方法；落到验证页时自动完成验证"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.current_url = ''
+        self.page_source = ''
+
+    def get(self, url):
+        response = self.session.get(url, timeout=30)
+        if '/captcha/verify' in response.url:
+            parts = urlsplit(response.url)
+            solve_url = f"{parts.scheme}://{parts.netloc}/captcha/solve?{parts.query}"
+            response = self.session.get(solve_url, timeout=30)
+        response.encoding = 'utf-8'
+        self.current_url = response.url
+        self.page_source = response.text
+
+    def find_elements(self, by, selector):
+        class_name = selector.rsplit('.', 1)[-1]
+        return [selector] if class_name in self.page_source else []
+
+    def execute_script(self, script):
+        if 'readyState' in script:
+            return 'complete'
+        if 'userAgent' in script:
+            return self.session.headers.get('User-Agent', '')
+        return None
+
+    def get_cookies(self):
+        return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in self.session.cookies]
+
+    def quit(self):
+        self.session.close()
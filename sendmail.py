@@ -1,13 +1,28 @@
 # -*- coding: utf-8 -*-
+import argparse
+import io
+import json
+import math
 import os
 import smtplib
 import time  # 注意：你原来在 if __name__ == "__main__" 里 import time，建议移到顶部
+import zipfile
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.utils import formataddr, COMMASPACE
 from email import encoders
+
+import pandas as pd
+
 from api_key import SMTP_SERVER, SMTP_PORT, USERNAME, PASSWORD, RECIPIENTS  # ← 新增导入 RECIPIENTS
+from listing_index import extract_listing_id
+
+MAIL_STATE_FILE = os.path.join('data', 'mail_state.json')  # 上次邮件发出时各房源的价格，用于计算变化
+MAX_ATTACHMENT_MB = 15  # 单封邮件附件上限，超过自动拆分（163/QQ 邮箱普通附件上限约 50MB，base64 后会再大三分之一）
+DIGEST_ROWS_IN_BODY = 50  # 正文最多列出的变化条数，更多的放进附件
+DIGEST_COLUMNS = ['一级区域', '二级区域', '小区名称', '户型', '面积(㎡)', '价格(元)', '标题', '链接']
 
 
 def get_latest_data_file():
@@ -37,7 +52,49 @@ def get_latest_data_file():
         print(f"获取最新文件失败: {str(e)}")
         return None
 
-def send_email_with_attachment(file_path):
+def make_attachment(file_name, data, maintype="application", subtype="octet-stream"):
+    """构造附件；文件名按 RFC 2231 编码，中文文件名在各邮件客户端都能正确显示"""
+    part = MIMEBase(maintype, subtype)
+    part.set_payload(data)
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", "attachment", filename=("utf-8", "", file_name))
+    return part
+
+
+@contextmanager
+def smtp_session(debug_server=None):
+    """打开一个 SMTP 会话，多封邮件复用同一连接
+
+    debug_server 为 'host:port' 时连接本地调试服务器（明文、不登录），例如：
+        python -m aiosmtpd -n -l localhost:1025
+    """
+    if debug_server:
+        host, port = debug_server.rsplit(':', 1)
+        server = smtplib.SMTP(host, int(port), timeout=30)
+    else:
+        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=30)
+        server.login(USERNAME, PASSWORD)
+    try:
+        yield server
+    finally:
+        try:
+            server.quit()
+        except smtplib.SMTPException:
+            server.close()
+
+
+def build_message(subject, body, attachments=()):
+    msg = MIMEMultipart()
+    msg["From"] = formataddr(("机器牛马", USERNAME))
+    msg["To"] = COMMASPACE.join(RECIPIENTS)  # ← 使用从 api_key 导入的收件人列表
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain", "utf-8"))
+    for part in attachments:
+        msg.attach(part)
+    return msg
+
+
+def send_email_with_attachment(file_path, debug_server=None):
     """发送带附件的邮件（修正MIME类型问题）"""
     try:
         print(f"\n开始发送邮件，附件路径: {file_path}")
@@ -50,48 +107,20 @@ def send_email_with_attachment(file_path):
 
         print(f"附件信息: {file_name} ({file_size:.1f}KB)")
 
-        # 创建邮件对象
-        msg = MIMEMultipart()
-        msg["From"] = formataddr(("机器牛马", USERNAME))
-        msg["To"] = COMMASPACE.join(RECIPIENTS)  # ← 使用从 api_key 导入的收件人列表
-        msg["Subject"] = f"链家租房数据 - {file_name}"
-
-        # 添加正文
-        msg.attach(MIMEText(
+        with open(file_path, "rb") as attachment:
+            part = make_attachment(file_name, attachment.read(),
+                                   "application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        msg = build_message(
+            f"链家租房数据 - {file_name}",
             f"附件是最近摘录的链家租房数据：\n"
             f"文件名: {file_name}\n"
             f"大小: {file_size:.1f}KB\n"
             f"生成时间: {time.strftime('%Y-%m-%d %H:%M:%S')}",
-            "plain", "utf-8"
-        ))
-
-        # 添加附件
-        with open(file_path, "rb") as attachment:
-            part = MIMEBase("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            part.set_payload(attachment.read())
-
-        encoders.encode_base64(part)
-
-        # 处理中文文件名（使用 gb2312 或 utf-8，但多数邮件客户端接受 utf-8）
-        # 更稳妥的方式：使用 RFC 2231 编码（email.utils 会自动处理）
-        # 简化写法（推荐）：
-        part.add_header(
-            "Content-Disposition",
-            f'attachment; filename="{file_name}"'
+            [part],
         )
-        # 如果文件名含中文，建议使用以下方式（兼容性更好）：
-        from email.header import Header
-        part.add_header(
-            "Content-Disposition",
-            "attachment",
-            filename=Header(file_name, 'utf-8').encode()
-        )
-
-        msg.attach(part)
 
         # 发送邮件
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=30) as server:
-            server.login(USERNAME, PASSWORD)
+        with smtp_session(debug_server) as server:
             server.sendmail(USERNAME, RECIPIENTS, msg.as_string())  # ← 收件人列表
 
         print(f"邮件发送成功！附件：{file_name}")
@@ -101,8 +130,170 @@ def send_email_with_attachment(file_path):
         print(f"发送失败: {type(e).__name__}: {str(e)}")
         return False
 
+
+# ============================================
+# 摘要模式：只发上次邮件之后新上和调价的房源，完整数据压缩后作附件
+
+def load_dataset(file_path):
+    """读取爬取结果；同名 .parquet 存在时优先读取（更快）"""
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path)
+        except Exception as e:
+            print(f"读取 parquet 失败，改读 {file_path}: {str(e)}")
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path, engine='openpyxl')
+
+
+def load_mail_state(path=MAIL_STATE_FILE):
+    """上次邮件发出时每套房源的价格 {房源编号: 价格}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_mail_state(state, path=MAIL_STATE_FILE, listing_ids=None):
+    """保存状态；给出 listing_ids（本次数据中的房源）时删掉已下架的房源，状态文件不会越积越大"""
+    if listing_ids is not None:
+        listing_ids = set(listing_ids)
+        state = {listing_id: price for listing_id, price in state.items() if listing_id in listing_ids}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def compute_digest(df, state):
+    """返回 (变化明细 DataFrame, 新的状态)；变化类型为 新上 / 调价
+
+    state 为空（第一次发摘要）时只建立基准，不把全部房源当作新上。
+    """
+    ids = df['链接'].map(extract_listing_id)
+    prices = pd.to_numeric(df['价格(元)'], errors='coerce')
+    previous = ids.map(state)
+    is_new = previous.isna() & (ids != '') & bool(state)
+    is_changed = previous.notna() & prices.notna() & (prices != previous)
+
+    digest = df.loc[is_new | is_changed, [c for c in DIGEST_COLUMNS if c in df.columns]].copy()
+    digest.insert(0, '变化', ['新上' if new else '调价' for new in is_new[is_new | is_changed]])
+    digest.insert(digest.columns.get_loc('价格(元)') + 1 if '价格(元)' in digest.columns else len(digest.columns),
+                  '原价格', previous[is_new | is_changed])
+    digest = digest.sort_values(['变化', '一级区域', '二级区域'] if '二级区域' in digest.columns else ['变化'],
+                                kind='stable')
+
+    new_state = dict(state)
+    for listing_id, price in zip(ids, prices):
+        if listing_id and not pd.isna(price):
+            new_state[listing_id] = int(price)
+    return digest, new_state
+
+
+def format_digest(digest, limit=DIGEST_ROWS_IN_BODY):
+    """正文中的摘要文本，最多列出 limit 条"""
+    counts = digest['变化'].value_counts()
+    lines = [f"新上 {counts.get('新上', 0)} 套，调价 {counts.get('调价', 0)} 套"]
+    for _, row in digest.head(limit).iterrows():
+        price = f"{row.get('价格(元)')}元" if pd.isna(row.get('原价格')) else f"{row.get('原价格'):.0f}→{row.get('价格(元)')}元"
+        lines.append(f"[{row['变化']}] {row.get('二级区域', '')} {row.get('小区名称', '')} "
+                     f"{row.get('户型', '')} {row.get('面积(㎡)', '')}㎡ {price}  {row.get('链接', '')}")
+    if len(digest) > limit:
+        lines.append(f"……其余 {len(digest) - limit} 条见附件")
+    return "\n".join(lines)
+
+
+def _encode_frame(frame, stem):
+    """压缩为 parquet（zstd）；没有 pyarrow 或列类型混杂时改为 zip 压缩的 CSV。返回 (文件名, 字节)"""
+    try:
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, index=False, compression='zstd')
+        return f"{stem}.parquet", buffer.getvalue()
+    except Exception:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            zf.writestr(f"{stem}.csv", frame.to_csv(index=False).encode('utf-8-sig'))
+        return f"{stem}.zip", buffer.getvalue()
+
+
+def split_attachments(frame, stem, max_bytes):
+    """压缩后超过 max_bytes 时按行拆成若干份，返回 [(文件名, 字节), ...]"""
+    name, data = _encode_frame(frame, stem)
+    if len(data) <= max_bytes or len(frame) <= 1:
+        return [(name, data)]
+    parts = math.ceil(len(data) / max_bytes) + 1  # 多拆一份留出余量
+    size = math.ceil(len(frame) / parts)
+    result = []
+    for i, start in enumerate(range(0, len(frame), size), 1):
+        result.extend(split_attachments(frame.iloc[start:start + size], f"{stem}_part{i}", max_bytes))
+    return result
+
+
+def pack_messages(attachments, max_bytes):
+    """把附件装进若干封邮件，每封附件总大小不超过 max_bytes（单个附件本身已不超过）"""
+    batches, current, current_size = [], [], 0
+    for name, data in attachments:
+        if current and current_size + len(data) > max_bytes:
+            batches.append(current)
+            current, current_size = [], 0
+        current.append((name, data))
+        current_size += len(data)
+    if current or not batches:
+        batches.append(current)
+    return batches
+
+
+def send_digest(file_path, debug_server=None, max_mb=MAX_ATTACHMENT_MB, state_file=MAIL_STATE_FILE, df=None):
+    """摘要模式：正文为上次邮件后新上/调价的房源，附件为压缩后的变化明细和完整数据，超限自动拆成多封
+
+    所有邮件复用一个 SMTP 会话；全部发送成功后才更新状态文件。
+    df 为已在内存中的数据（如流水线中）时不再读取 file_path，file_path 只用于附件命名。
+    """
+    try:
+        if df is None:
+            df = load_dataset(file_path)
+        state = load_mail_state(state_file)
+        digest, new_state = compute_digest(df, state)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        max_bytes = int(max_mb * 1024 * 1024)
+
+        attachments = []
+        if len(digest) > DIGEST_ROWS_IN_BODY:
+            attachments += split_attachments(digest, f"链家房源变化_{stamp}", max_bytes)
+        attachments += split_attachments(df, os.path.splitext(os.path.basename(file_path))[0], max_bytes)
+        batches = pack_messages(attachments, max_bytes)
+
+        summary = format_digest(digest) if state else f"首次发送摘要，已记录 {len(new_state)} 套房源作为基准"
+        body = summary + (
+            f"\n\n完整数据 {len(df)} 条（{os.path.basename(file_path)}）已压缩为附件"
+            f"\n生成时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        subject = f"链家租房变化 - 新上/调价 {len(digest)} 套"
+
+        with smtp_session(debug_server) as server:
+            for i, batch in enumerate(batches, 1):
+                parts = [make_attachment(name, data) for name, data in batch]
+                suffix = f" ({i}/{len(batches)})" if len(batches) > 1 else ""
+                msg = build_message(subject + suffix, body if i == 1 else f"附件续{suffix}", parts)
+                server.sendmail(USERNAME, RECIPIENTS, msg.as_string())
+                size_kb = sum(len(data) for _, data in batch) / 1024
+                print(f"已发送第 {i}/{len(batches)} 封，附件 {len(batch)} 个，共 {size_kb:.1f}KB")
+
+        save_mail_state(new_state, state_file, df['链接'].map(extract_listing_id))
+        print(f"邮件发送成功！变化 {len(digest)} 套，共 {len(batches)} 封")
+        return True
+
+    except Exception as e:
+        print(f"发送失败: {type(e).__name__}: {str(e)}")
+        return False
+
+
 if __name__ == "__main__":
-    import time
+    arg_parser = argparse.ArgumentParser(description='链家租房数据邮件发送程序')
+    arg_parser.add_argument('--digest', action='store_true', help='只发上次邮件之后的新上/调价房源，完整数据压缩后作附件')
+    arg_parser.add_argument('--debug-smtp', metavar='HOST:PORT', help='发到本地调试 SMTP 服务器（不加密、不登录）')
+    arg_parser.add_argument('--max-mb', type=float, default=MAX_ATTACHMENT_MB, help='单封邮件附件上限（MB）')
+    args = arg_parser.parse_args()
 
     print("=" * 50)
     print("链家租房数据邮件发送程序")
@@ -112,7 +303,11 @@ if __name__ == "__main__":
 
     if latest_file:
         print(f"\n找到最新数据文件: {latest_file}")
-        if send_email_with_attachment(latest_file):
+        if args.digest:
+            sent = send_digest(latest_file, args.debug_smtp, args.max_mb)
+        else:
+            sent = send_email_with_attachment(latest_file, args.debug_smtp)
+        if sent:
             print("\n邮件发送成功！")
         else:
             print("\n邮件发送失败！")
@@ -120,4 +315,4 @@ if __name__ == "__main__":
         print("\n未找到有效数据文件，请检查：")
         print("1. 是否已运行爬虫程序生成数据")
         print("2. last_file.txt内容是否正确")
-        print("3. 数据文件是否被移动或删除")
\ No newline at end of file
+        print("3. 数据文件是否被移动或删除")
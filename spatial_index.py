@@ -0,0 +1,132 @@
+# spatial_index.py
+"""直线距离预筛选与小区空间索引
+
+- haversine_km：NumPy 向量化计算球面直线距离
+- SpatialIndex：对所有已知坐标的小区建索引，即时回答“离某点最近的 k 个小区”“半径内的小区”
+  安装了 scipy 时用 KD 树（单位球面三维坐标），否则用经纬度网格分桶
+
+用于在请求驾车/公交路线前剔除明显过远的小区，节省配额（commute_matrix 用 within 逐个目的地挑出半径内的出发地）。
+"""
+import math
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """两组点之间的直线距离（公里），参数可以是标量或等长数组，也可一侧为标量"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def select_candidates(distances, max_radius_km=None, nearest_k=None):
+    """按直线距离挑选需要查询路线的行，返回布尔数组；两个条件都给时取交集，距离为 NaN 的行不选"""
+    distances = np.asarray(distances, dtype=np.float64)
+    mask = ~np.isnan(distances)
+    if max_radius_km is not None:
+        mask &= distances <= max_radius_km
+    if nearest_k is not None:
+        ranked = np.argsort(np.where(np.isnan(distances), np.inf, distances), kind='stable')
+        nearest = np.zeros(len(distances), dtype=bool)
+        nearest[ranked[:nearest_k]] = True
+        mask &= nearest
+    return mask
+
+
+def _unit_vectors(lats, lngs):
+    lat, lng = np.radians(lats), np.radians(lngs)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+class SpatialIndex:
+    """小区坐标索引，names 与 lats/lngs 一一对应"""
+
+    def __init__(self, names, lats, lngs, cell_deg=0.02):
+        self.names = list(names)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_deg = cell_deg
+        if cKDTree is not None:
+            self.tree = cKDTree(_unit_vectors(self.lats, self.lngs))
+        else:
+            self.tree = None
+            self.grid = {}
+            for i, cell in enumerate(zip((self.lats // cell_deg).astype(int), (self.lngs // cell_deg).astype(int))):
+                self.grid.setdefault(cell, []).append(i)
+
+    @classmethod
+    def from_dataframe(cls, df, name_col='出发地', coord_col='出发地坐标'):
+        """由带「纬度 x, 经度 y」坐标列的表格建索引，无法解析坐标的行跳过"""
+        from query_distance_from_map import parse_coordinates
+
+        names, lats, lngs = [], [], []
+        for name, coord_str in zip(df[name_col], df[coord_col]):
+            lat, lng = parse_coordinates(coord_str)
+            if lat is not None:
+                names.append(name)
+                lats.append(lat)
+                lngs.append(lng)
+        return cls(names, lats, lngs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _grid_candidates(self, lat, lng, rings):
+        row, col = int(lat // self.cell_deg), int(lng // self.cell_deg)
+        found = []
+        for r in range(row - rings, row + rings + 1):
+            for c in range(col - rings, col + rings + 1):
+                found.extend(self.grid.get((r, c), ()))
+        return np.array(found, dtype=np.intp)
+
+    def nearest(self, lat, lng, k=1):
+        """离 (lat, lng) 最近的 k 个小区，返回 [(名称, 直线距离公里), ...]"""
+        k = min(k, len(self))
+        if k == 0:
+            return []
+        if self.tree is not None:
+            _, idx = self.tree.query(_unit_vectors([lat], [lng])[0], k=k)
+            idx = np.atleast_1d(idx)
+        else:
+            # 逐圈扩大网格，直到候选足够且最远候选不超过已搜索范围
+            rings = 1
+            while True:
+                idx = self._grid_candidates(lat, lng, rings)
+                if len(idx) >= k:
+                    dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+                    kth = np.sort(dist)[k - 1]
+                    if kth <= rings * self.cell_deg * 111 * math.cos(math.radians(lat)) or len(idx) == len(self):
+                        break
+                if len(idx) == len(self):
+                    break
+                rings *= 2
+            dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+            idx = idx[np.argsort(dist, kind='stable')[:k]]
+        dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+        return [(self.names[i], float(d)) for i, d in zip(idx, dist)]
+
+    def within(self, lat, lng, radius_km):
+        """半径内的所有小区，按距离排序；先用 KD 树 / 网格取候选，再按直线距离精确过滤"""
+        if not len(self):
+            return []
+        if self.tree is not None:
+            chord = 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)  # 球面距离换算成单位球弦长
+            idx = np.array(self.tree.query_ball_point(_unit_vectors([lat], [lng])[0], chord), dtype=np.intp)
+        else:
+            # 网格在经度方向最窄，按该方向的格宽算出需要覆盖的圈数，多留一圈余量
+            cell_km = self.cell_deg * 111.32 * max(math.cos(math.radians(abs(lat) + radius_km / 111.32)), 0.01)
+            idx = self._grid_candidates(lat, lng, int(radius_km // cell_km) + 1)
+        if not len(idx):
+            return []
+        dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')
+        return [(self.names[i], float(dist[k])) for k, i in zip(order, idx[order])]
@@ -0,0 +1,47 @@
+# tests/conftest.py
+"""离线测试：不访问链家和百度，需要站点时用 replay.StubSite
+
+没有 api_key.py（未配置授权码）时用 api_key_sample.py 的占位值，测试不会用它们发出真实请求。
+地图查询缓存每个测试都换成临时目录下的新库（map_cache 夹具），测试结果不会混进真实缓存。
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    importlib.import_module('api_key')
+except ImportError:
+    sys.modules['api_key'] = importlib.import_module('api_key_sample')
+
+
+@pytest.fixture(autouse=True)
+def map_cache(tmp_path, monkeypatch):
+    """每个测试用临时目录下的地图缓存，不读写工作目录中的 data/map_cache.db"""
+    import query_distance_from_map as qd
+    from map_cache import MapCache
+
+    cache = MapCache(str(tmp_path / 'map_cache.db'))
+    monkeypatch.setattr(qd, 'CACHE', cache)
+    yield cache
+    cache.close()
+
+
+class DictCache(dict):
+    """只在内存中的地图缓存替身，不过期、不淘汰"""
+
+    def set(self, key, value, ttl=None):
+        self[key] = value
+
+
+@pytest.fixture
+def dict_cache(monkeypatch):
+    """把地图缓存换成内存字典，测试可以直接检查写入了哪些键"""
+    import query_distance_from_map as qd
+
+    cache = DictCache()
+    monkeypatch.setattr(qd, 'CACHE', cache)
+    return cache
@@ -0,0 +1,45 @@
+# tests/test_benchmarks.py
+import json
+import os
+import sys
+
+import benchmark_parser
+import benchmark_pipeline
+import lianjia_selenium_crawler as crawler
+import query_distance_from_map as qd
+
+
+def run_main(module, monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', [module.__name__ + '.py', *args])
+    module.main()
+
+
+def test_parser_benchmark_reports_identical_backends(monkeypatch, capsys):
+    run_main(benchmark_parser, monkeypatch, '--synthetic', '3', '--repeat', '1')
+    out = capsys.readouterr().out
+    assert '共 3 页' in out
+    assert '✅ lxml 后端输出与 bs4 参考实现一致' in out
+
+
+def test_parser_benchmark_without_fixtures(monkeypatch, capsys, tmp_path):
+    run_main(benchmark_parser, monkeypatch, '--fixtures', str(tmp_path))
+    assert '未找到页面样本' in capsys.readouterr().out
+
+
+def test_pipeline_benchmark_runs_offline_and_writes_the_report(monkeypatch, tmp_path):
+    # 基准测试会改这几个模块级设置，测试结束后还原
+    for module, name in [(crawler, 'DELAY_JITTER'), (qd, 'BAIDU_API_BASE'), (qd, 'QPS')]:
+        monkeypatch.setattr(module, name, getattr(module, name))
+    cwd = os.getcwd()
+    report_file = tmp_path / 'benchmark.json'
+    run_main(benchmark_pipeline, monkeypatch, '--synthetic', '2', '--listings', '40', '--captcha-every', '3',
+             '--fixtures', str(tmp_path / 'no_fixtures'), '--json', str(report_file))
+
+    assert os.getcwd() == cwd
+    report = json.loads(report_file.read_text(encoding='utf-8'))
+    assert report['source'] == 'synthetic'
+    assert (report['districts'], report['pages'], report['rows']) == (2, 4, 80)
+    assert report['captchas'] == 2
+    assert report['api_calls'] > 0 and report['api_calls_per_row'] == round(report['api_calls'] / 80, 4)
+    assert {'crawl', 'geocode', 'commute', 'export'} <= set(report['stages'])
+    assert report['workdir'] is None
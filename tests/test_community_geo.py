@@ -0,0 +1,35 @@
+# tests/test_community_geo.py
+import pandas as pd
+
+import query_distance_from_map as qd
+from community_geo import CommunityGeo
+
+RESPONSES = {
+    '甲小区': {'status': 0, 'result': {'location': {'lat': 31.2, 'lng': 121.5}}},
+    '乙小区': {'status': 1, 'msg': 'Internal Service Error:无相关结果', 'results': []},
+    '丙小区': {'status': 401, 'msg': '当前并发量已经超过约定并发配额'},
+}
+
+
+def fake_api_get(url):
+    for name, data in RESPONSES.items():
+        if name in url:
+            return data
+    raise ConnectionError('网络异常')
+
+
+def communities():
+    names = list(RESPONSES) + ['丁小区']
+    return pd.DataFrame({'name': names, 'region': '浦东', 'district': '陆家嘴', 'city': '上海市',
+                         'address': names, 'listings': 1}, index=[f'c{i}' for i in range(len(names))])
+
+
+def test_only_no_result_responses_are_saved_as_failed(tmp_path, monkeypatch, dict_cache):
+    monkeypatch.setattr(qd, 'api_get', fake_api_get)
+    geo = CommunityGeo(str(tmp_path / 'community_geo.db'))
+    assert geo.geocode_missing(communities(), workers=2) == (1, 1)
+    assert geo.known_ids() == {'c0', 'c1'}  # 并发超限和网络异常的小区不入库
+
+    monkeypatch.setitem(RESPONSES, '丙小区', {'status': 0, 'result': {'location': {'lat': 31.3, 'lng': 121.4}}})
+    assert geo.geocode_missing(communities(), workers=2) == (1, 0)
+    assert geo.known_ids(include_failed=False) == {'c0', 'c2'}
@@ -0,0 +1,86 @@
+# tests/test_commute_concurrent.py
+import time
+
+import pandas as pd
+import pytest
+
+import query_distance_from_map as qd
+from map_cache import MapCache
+from replay import StubSite
+
+DESTINATION = '纬度 31.2397, 经度 121.4998'
+COLUMNS = ['出发地坐标', '行车距离(公里)', '行车时间(分钟)', '公共交通时间(分钟)']
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = StubSite()
+    site.start()
+    monkeypatch.setattr(qd, 'BAIDU_API_BASE', site.url)
+    yield site
+    site.stop()
+    qd.STOP_EVENT.clear()
+
+
+def write_sheet(path, rows):
+    pd.DataFrame({'出发地': [f'小区{i}' for i in range(rows)], '目的地坐标': DESTINATION}).to_excel(path, index=False)
+    return str(path)
+
+
+def test_concurrent_results_match_serial_lookups_within_qps(site, tmp_path, monkeypatch):
+    input_file = write_sheet(tmp_path / '小区.xlsx', 12)
+    started = time.monotonic()
+    qd.process_excel_concurrent(input_file, qps=20, workers=6)
+    elapsed = time.monotonic() - started
+
+    result = pd.read_excel(tmp_path / '小区-结果.xlsx')
+    assert site.counters['api_calls'] == 36
+    assert elapsed >= (36 - 20) / 20 * 0.9  # 令牌桶起始 20 个令牌，其余按每秒 20 个发放
+    assert not (tmp_path / '小区-结果.jsonl').exists()
+
+    monkeypatch.setattr(qd, 'CACHE', MapCache(str(tmp_path / 'serial.db')))
+    destination = qd.parse_coordinates(DESTINATION)
+    for index, row in pd.read_excel(input_file).assign(**{col: None for col in COLUMNS}).iterrows():
+        expected = qd.lookup_row(row, destination)
+        assert {col: result.at[index, col] for col in COLUMNS} == expected
+    qd.CACHE.close()
+
+
+def test_quota_exceeded_cancels_the_remaining_rows(site, tmp_path, monkeypatch):
+    input_file = write_sheet(tmp_path / '小区.xlsx', 12)
+    api_get = qd.api_get
+    calls = []
+
+    def quota_after_ten(url):
+        calls.append(url)
+        return {'status': 302, 'message': '天配额超限'} if len(calls) > 10 else api_get(url)
+
+    monkeypatch.setattr(qd, 'api_get', quota_after_ten)
+    qd.process_excel_concurrent(input_file, qps=1000, workers=4)
+
+    assert len(calls) < 36
+    assert qd.STOP_EVENT.is_set()
+    result = pd.read_excel(tmp_path / '小区-结果.xlsx')
+    assert 0 < result['行车距离(公里)'].notna().sum() < 12
+    assert (tmp_path / '小区-结果.jsonl').exists()  # 配额用尽时保留进度日志
+
+
+def test_rerun_resumes_from_the_journal_without_repeating_queries(site, tmp_path, monkeypatch):
+    input_file = write_sheet(tmp_path / '小区.xlsx', 12)
+    api_get = qd.api_get
+    monkeypatch.setattr(qd, 'api_get', lambda url: {'status': 302} if site.counters['api_calls'] >= 14 else api_get(url))
+    qd.process_excel_concurrent(input_file, qps=1000, workers=4)
+    partial = pd.read_excel(tmp_path / '小区-结果.xlsx')
+    missing = int(partial[['出发地坐标', '行车距离(公里)', '公共交通时间(分钟)']].isna().sum().sum())
+    assert 0 < missing < 36
+
+    monkeypatch.setattr(qd, 'api_get', api_get)
+    monkeypatch.setattr(qd, 'CACHE', MapCache(str(tmp_path / 'empty.db')))  # 只靠进度日志恢复，不靠缓存
+    calls = site.counters['api_calls']
+    qd.process_excel_concurrent(input_file, qps=1000, workers=4)
+    qd.CACHE.close()
+
+    assert site.counters['api_calls'] - calls == missing
+    result = pd.read_excel(tmp_path / '小区-结果.xlsx')
+    assert result[COLUMNS].notna().all().all()
+    assert not (tmp_path / '小区-结果.jsonl').exists()
@@ -0,0 +1,37 @@
+# tests/test_commute_journal.py
+import pandas as pd
+
+from commute_journal import CommuteJournal
+
+
+def sheet(ids, names):
+    return pd.DataFrame({'出发地': names, '小区ID': ids, '行车距离(公里)': None})
+
+
+def test_restore_by_key_survives_reordering_and_duplicate_names(tmp_path):
+    path = str(tmp_path / 'commute.jsonl')
+    first = sheet(['c1', 'c2', 'c3'], ['东昌新村', '东昌新村', '金杨新村'])  # 不同区域的同名小区
+    journal = CommuteJournal(None, path=path, key_column='小区ID')
+    for index, km in zip(first.index, (1.5, 2.5, 3.5)):
+        journal.record(first, index, {'行车距离(公里)': km})
+    journal.close()
+
+    second = sheet(['c4', 'c3', 'c2'], ['东昌新村', '金杨新村', '东昌新村'])  # 下次运行：c1 已查完，新增 c4，顺序不同
+    journal = CommuteJournal(None, path=path, key_column='小区ID')
+    assert journal.restore(second) == 2
+    journal.close(remove=True)
+    assert second['行车距离(公里)'].tolist() == [None, 3.5, 2.5]
+
+
+def test_restore_by_row_still_checks_the_name(tmp_path):
+    path = str(tmp_path / 'commute.jsonl')
+    first = sheet(['c1', 'c2'], ['东昌新村', '金杨新村'])
+    journal = CommuteJournal(None, path=path)
+    journal.record(first, 0, {'行车距离(公里)': 1.5})
+    journal.record(first, 1, {'行车距离(公里)': 2.5})
+    journal.close()
+
+    changed = sheet(['c2', 'c1'], ['金杨新村', '东昌新村'])
+    journal = CommuteJournal(None, path=path)
+    assert journal.restore(changed) == 0
+    journal.close()
@@ -0,0 +1,49 @@
+# tests/test_commute_matrix.py
+import numpy as np
+import pytest
+
+import commute_matrix
+import query_distance_from_map as qd
+from map_cache import MapCache
+from replay import StubSite
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = StubSite()
+    site.start()
+    monkeypatch.setattr(qd, 'BAIDU_API_BASE', site.url)
+    yield site
+    site.stop()
+
+
+def test_batched_matrix_matches_per_pair_lookups(site, tmp_path, monkeypatch):
+    rng = np.random.default_rng(5)
+    points = [(round(31.1 + lat * 0.3, 6), round(121.3 + lng * 0.4, 6)) for lat, lng in rng.random((14, 2))]
+    origins = [(f'小区{i}', point) for i, point in enumerate(points)] + [('小区0（重复）', points[0])]
+    destinations = [('人民广场', (31.2317, 121.4752)), ('张江', (31.204, 121.59)),
+                    ('虹桥', (31.194, 121.32)), ('五角场', (31.2989, 121.5148))]
+
+    matrix = commute_matrix.compute_matrix(origins, destinations, modes=('driving', 'transit'), qps=1000)
+    assert site.counters['api_calls'] == 2 + 14 * 4  # 驾车 14×4 按 12×4 分 2 块，公交逐对查询
+
+    monkeypatch.setattr(qd, 'CACHE', MapCache(str(tmp_path / 'per_pair.db')))
+    for i, (_, origin) in enumerate(origins):
+        for j, (_, destination) in enumerate(destinations):
+            km, minutes = qd.get_driving_info(origin, destination)
+            assert matrix.km[i, j, 0] == pytest.approx(km, rel=1e-6)
+            assert matrix.minutes[i, j, 0] == pytest.approx(minutes, rel=1e-6)
+            assert matrix.minutes[i, j, 1] == pytest.approx(qd.get_transit_info(origin, destination), rel=1e-6)
+            assert np.isnan(matrix.km[i, j, 1])
+    qd.CACHE.close()
+
+
+def test_cached_pairs_are_not_requested_again(site):
+    origins = [('甲', (31.21, 121.45)), ('乙', (31.25, 121.52))]
+    destinations = [('人民广场', (31.2317, 121.4752))]
+    first = commute_matrix.compute_matrix(origins, destinations, modes=('driving', 'walking'), qps=1000)
+    calls = site.counters['api_calls']
+    second = commute_matrix.compute_matrix(origins, destinations, modes=('driving', 'walking'), qps=1000)
+    assert site.counters['api_calls'] == calls == 2
+    np.testing.assert_array_equal(first.minutes, second.minutes)
+    assert first.minutes[0, 0, 1] > first.minutes[0, 0, 0]  # 步行比驾车慢
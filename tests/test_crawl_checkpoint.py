@@ -0,0 +1,70 @@
+# tests/test_crawl_checkpoint.py
+import pytest
+
+import lianjia_selenium_crawler as crawler
+from crawl_checkpoint import CrawlJournal
+from replay import StubSite
+
+
+@pytest.fixture
+def site():
+    site = StubSite(listings=400)
+    site.start()
+    yield site
+    site.stop()
+
+
+class CrashingFetcher:
+    """第 crash_page 页抓取时抛出异常，模拟爬取中途崩溃"""
+
+    def __init__(self, fetcher, crash_page):
+        self.fetcher = fetcher
+        self.crash_page = crash_page
+
+    def fetch(self, url):
+        if url.endswith(f'pg{self.crash_page}/'):
+            raise RuntimeError('模拟崩溃')
+        return self.fetcher.fetch(url)
+
+
+def test_iter_rows_reads_in_config_order(tmp_path):
+    journal = CrawlJournal('out.xlsx', path=str(tmp_path / 'journal.jsonl'))
+    journal.record_page('b', 1, [{'链接': 'b1'}])
+    journal.record_page('a', 1, [{'链接': 'a1'}])
+    journal.record_page('b', 2, [{'链接': 'b2'}])
+    journal.finish_district('b')
+    journal.close()
+    with open(tmp_path / 'journal.jsonl', 'a', encoding='utf-8') as f:
+        f.write('{"type": "page", "district": "a", "pa')  # 崩溃时写了一半的行
+
+    resumed = CrawlJournal('other.xlsx', path=str(tmp_path / 'journal.jsonl'), resume=True)
+    assert resumed.output_file == 'out.xlsx'
+    assert resumed.finished == {'b'}
+    assert resumed.start_page('a') == 2 and resumed.start_page('c') == 1
+    assert [row['链接'] for row in resumed.iter_rows(['a', 'b'])] == ['a1', 'b1', 'b2']
+    assert [row['链接'] for row in resumed.iter_rows()] == ['b1', 'a1', 'b2']
+    resumed.close()
+
+
+def test_resume_continues_after_last_recorded_page(site, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler, 'DELAY_JITTER', (0.0, 0.0))
+    path = str(tmp_path / 'journal.jsonl')
+    base_url = site.url + '/zufang/bench1/'
+
+    journal = CrawlJournal('out.xlsx', path=path)
+    fetcher = crawler.make_fetcher('replay')
+    with pytest.raises(RuntimeError):
+        crawler.crawl_district(CrashingFetcher(fetcher, 3), base_url, max_pages=4, base_delay=0, journal=journal)
+    journal.close()
+    assert site.counters['pages_served'] == 2
+
+    journal = CrawlJournal('out.xlsx', path=path, resume=True)
+    assert journal.start_page(base_url) == 3
+    crawler.crawl_district(fetcher, base_url, max_pages=4, base_delay=0, journal=journal)
+    journal.close()
+    fetcher.close()
+
+    assert site.counters['pages_served'] == 4  # 第 1、2 页没有重新抓取
+    links = [row['链接'] for row in journal.iter_rows([base_url])]
+    assert len(links) == 120 and len(set(links)) == 120
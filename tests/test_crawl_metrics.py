@@ -0,0 +1,74 @@
+# tests/test_crawl_metrics.py
+import json
+import re
+
+from crawl_metrics import CrawlMetrics
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_prometheus(text):
+    """按 Prometheus 文本格式解析，返回 ({指标名: 类型}, {(指标名, 标签): 值})；格式不对直接断言失败"""
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert kind in ('counter', 'gauge') and name not in types
+            types[name] = kind
+            continue
+        if line.startswith('#'):
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        assert name in types, f'{name} 缺少 TYPE'
+        parsed = LABEL_RE.findall(labels or '')
+        assert ','.join(f'{k}="{v}"' for k, v in parsed) == (labels or ''), line
+        labels = tuple((k, v.replace('\\"', '"').replace('\\\\', '\\')) for k, v in parsed)
+        assert (name, labels) not in samples
+        samples[(name, labels)] = float(value)
+    return types, samples
+
+
+def test_prometheus_output_parses_and_has_the_counters(tmp_path):
+    metrics = CrawlMetrics()
+    with metrics.district('陆家嘴'):
+        metrics.add_time('fetch', 1.5)
+        metrics.add_time('fetch', 0.5)
+        metrics.add_time('parse', 0.25)
+        metrics.incr('rows', 30)
+        metrics.incr('pages')
+    with metrics.district('浦东"新区\\'):
+        metrics.incr('captchas')
+        metrics.incr('rows', 5)
+    metrics.set_gauge('browser_memory_mb', 512.25)
+    metrics.finish()
+
+    path = tmp_path / 'prom' / 'crawl_metrics.prom'
+    assert metrics.write_prometheus(str(path)) == str(path)
+    types, samples = parse_prometheus(path.read_text(encoding='utf-8'))
+
+    assert types['lianjia_crawl_phase_seconds_total'] == 'counter'
+    assert types['lianjia_crawl_browser_memory_mb'] == 'gauge'
+    assert samples[('lianjia_crawl_phase_seconds_total', (('phase', 'fetch'),))] == 2.0
+    assert samples[('lianjia_crawl_phase_calls_total', (('phase', 'fetch'),))] == 2
+    assert samples[('lianjia_crawl_phase_calls_total', (('phase', 'parse'),))] == 1
+    assert samples[('lianjia_crawl_events_total', (('event', 'rows'),))] == 35
+    assert samples[('lianjia_crawl_events_total', (('event', 'captchas'),))] == 1
+    assert samples[('lianjia_crawl_district_rows', (('district', '陆家嘴'),))] == 30
+    assert samples[('lianjia_crawl_district_rows', (('district', '浦东"新区\\'),))] == 5
+    assert samples[('lianjia_crawl_browser_memory_mb', ())] == 512.25
+    assert samples[('lianjia_crawl_duration_seconds', ())] >= 0
+    assert not (tmp_path / 'prom' / 'crawl_metrics.prom.tmp').exists()
+
+
+def test_json_report_keeps_district_pages(tmp_path):
+    metrics = CrawlMetrics()
+    metrics.record_page('陆家嘴', 1, fetch=0.8, rows=30)
+    with metrics.district('陆家嘴'):
+        metrics.incr('rows', 30)
+    metrics.write_json(str(tmp_path / 'crawl_report.json'))
+    report = json.loads((tmp_path / 'crawl_report.json').read_text(encoding='utf-8'))
+    assert report['districts']['陆家嘴']['pages'] == [{'page': 1, 'fetch': 0.8, 'rows': 30}]
+    assert report['counters'] == {'rows': 30}
@@ -0,0 +1,125 @@
+# tests/test_crawl_queue.py
+import pytest
+
+import crawl_queue
+import lianjia_selenium_crawler as crawler
+from crawl_queue import LeaseLost, UnitJournal, WorkQueue, run_worker
+
+DISTRICT = 'https://sh.lianjia.com/zufang/pudong/'
+
+
+class Crash(Exception):
+    pass
+
+
+def fake_crawl(district_pages, crash_after=None):
+    """区域共 district_pages 页，按 journal 的起始页逐页写入一条房源；累计写入 crash_after 页时模拟出错一次"""
+    crawled = []
+
+    def crawl_district(fetcher, base_url, max_pages, tag='', journal=None, **kwargs):
+        for page in range(journal.start_page(base_url), min(max_pages, district_pages) + 1):
+            journal.record_page(base_url, page, [{'链接': f'{base_url}{page}'}])
+            crawled.append(page)
+            if len(crawled) == crash_after:
+                raise Crash()
+        journal.finish_district(base_url, district_pages <= max_pages)
+        return []
+    return crawl_district, crawled
+
+
+def seeded_queue(tmp_path, max_pages=20):
+    work_queue = WorkQueue(str(tmp_path / 'crawl_queue.db'), lease_seconds=0)
+    work_queue.seed([('上海', DISTRICT, max_pages)], shard=10)
+    return work_queue
+
+
+def crash_in_unit(work_queue, pages):
+    """领取第一段并写入 pages 页后退出（不标记完成，租约随即过期）"""
+    unit = work_queue.lease('crashed')
+    journal = UnitJournal(work_queue, unit, 'crashed')
+    for page in range(1, pages + 1):
+        journal.record_page(DISTRICT, page, [{'链接': f'{DISTRICT}{page}'}])
+
+
+def test_release_resumes_after_last_recorded_page(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path)
+    crash_in_unit(work_queue, 4)
+    crawl_district, crawled = fake_crawl(district_pages=15)
+    monkeypatch.setattr(crawler, 'crawl_district', crawl_district)
+
+    assert run_worker(work_queue, 'second', None, {}, shard=10) == 2
+    assert crawled == list(range(5, 16))  # 第 1-4 页不重复抓取；到第 15 页区域结束，不再放入第三段
+    assert [row['链接'] for row in work_queue.iter_rows()] == [f'{DISTRICT}{page}' for page in range(1, 16)]
+    assert work_queue.status()['units'] == {'done': 2}
+
+
+def test_crash_after_last_page_does_not_queue_next_shard(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path)
+    crash_in_unit(work_queue, 10)
+    crawl_district, crawled = fake_crawl(district_pages=20)
+    monkeypatch.setattr(crawler, 'crawl_district', crawl_district)
+
+    assert run_worker(work_queue, 'second', None, {}, shard=10) == 1
+    assert crawled == []
+    assert work_queue.status()['units'] == {'done': 1}
+
+
+def test_crash_mid_unit_is_retried(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path, max_pages=10)
+    crawl_district, crawled = fake_crawl(district_pages=10, crash_after=3)
+    monkeypatch.setattr(crawler, 'crawl_district', crawl_district)
+    monkeypatch.setattr(crawl_queue, 'POLL_SECONDS', 0)
+
+    assert run_worker(work_queue, 'worker', None, {}, shard=10) == 1  # 出错放回队列，再次领取从第 4 页继续
+    assert crawled == list(range(1, 11))
+    assert work_queue.status()['pages'] == 10
+
+
+def test_lost_heartbeat_stops_recording(tmp_path):
+    work_queue = seeded_queue(tmp_path)
+    unit = work_queue.lease('worker')
+
+    class LostHeartbeat:
+        lost = True
+
+    journal = UnitJournal(work_queue, unit, 'worker', LostHeartbeat())
+    with pytest.raises(LeaseLost):
+        journal.record_page(DISTRICT, 1, [])
+    assert work_queue.status()['pages'] == 0
+
+
+def test_reseed_with_a_new_page_limit(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path)
+    assert work_queue.seed([('上海', DISTRICT, 20)], shard=10) == 0  # 配置没变，什么都不改
+    assert work_queue.seed([('上海', DISTRICT, 5)], shard=10) == 1  # 第一段还没开始，按新上限截到第 5 页
+    crawl_district, crawled = fake_crawl(district_pages=40)
+    monkeypatch.setattr(crawler, 'crawl_district', crawl_district)
+
+    assert run_worker(work_queue, 'worker', None, {}, shard=10) == 1
+    assert crawled == list(range(1, 6))
+
+    assert work_queue.seed([('上海', DISTRICT, 25)], shard=10) == 1  # 到旧上限停下的区域放入下一段
+    crawled.clear()
+    assert run_worker(work_queue, 'worker', None, {}, shard=10) == 2  # 第 6-15、16-25 页
+    assert crawled == list(range(6, 26))
+    assert work_queue.status()['pages'] == 25
+
+
+def test_reseed_does_not_extend_an_exhausted_district(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path)
+    crawl_district, crawled = fake_crawl(district_pages=8)
+    monkeypatch.setattr(crawler, 'crawl_district', crawl_district)
+    assert run_worker(work_queue, 'worker', None, {}, shard=10) == 1
+
+    assert work_queue.seed([('上海', DISTRICT, 30)], shard=10) == 0
+    assert work_queue.status()['units'] == {'done': 1}
+
+
+def test_lowering_the_limit_drops_shards_beyond_it(tmp_path, monkeypatch):
+    work_queue = seeded_queue(tmp_path, max_pages=30)
+    unit = work_queue.lease('worker')
+    work_queue.complete(unit, 'worker', False, shard=10)  # 第 11-20 页一段放入队列
+    assert work_queue.status()['units'] == {'done': 1, 'pending': 1}
+
+    assert work_queue.seed([('上海', DISTRICT, 8)], shard=10) == 1
+    assert work_queue.status()['units'] == {'done': 1}
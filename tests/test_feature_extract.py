@@ -0,0 +1,33 @@
+# tests/test_feature_extract.py
+import pytest
+
+from benchmark_parser import make_synthetic_page
+from feature_extract import classify_features, extract_features_batch
+from lianjia_selenium_crawler import parse_page
+
+FEATURE_LISTS = [
+    ['39㎡', '南', '1室1厅1卫', '高楼层 （6层）', '2005年建'],
+    ['㎡', '南 北', '2室1厅1卫'],          # 面积片段没有数字
+    ['70.5㎡', '东南', '地下室', '年建'],  # 年份片段没有数字
+    ['20㎡', '㎡'],                         # 异常片段不覆盖前面的有效值
+]
+
+
+def test_batch_matches_per_listing_with_malformed_fragments():
+    expected = [classify_features(features) for features in FEATURE_LISTS]
+    assert extract_features_batch(FEATURE_LISTS) == expected
+    assert expected[1] == {'朝向': '南 北', '户型': '2室1厅1卫'}
+    assert expected[3] == {'面积(㎡)': 20.0}
+
+
+@pytest.mark.parametrize('parser', ['bs4', 'lxml'])
+def test_malformed_fragment_does_not_lose_page(parser):
+    html = make_synthetic_page(1).replace('㎡', ' ㎡', 1)
+    first = html.index(' ㎡')
+    start = html.rindex('>', 0, first) + 1
+    html = html[:start] + '\n      ㎡' + html[first + 2:]  # 第一条房源的面积只剩「㎡」
+    batch = parse_page(html, parser, crawl_time='2025-12-10 05:00:00', batch_features=True)
+    single = parse_page(html, parser, crawl_time='2025-12-10 05:00:00')
+    assert len(batch) == 30
+    assert batch == single
+    assert '面积(㎡)' not in batch[0] and '面积(㎡)' in batch[1]
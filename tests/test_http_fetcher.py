@@ -0,0 +1,181 @@
+# tests/test_http_fetcher.py
+import fnmatch
+import json
+import sys
+import types
+
+import pytest
+
+import lianjia_selenium_crawler as crawler
+from crawl_metrics import METRICS
+from http_fetcher import HybridFetcher, LightweightFetcher
+from lianjia_selenium_crawler import shared_limiter
+from replay import ReplayBrowser, StubSite
+
+
+@pytest.fixture
+def captcha_site():
+    site = StubSite(listings=60, captcha_every=2)
+    site.start()
+    yield site
+    site.stop()
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.waits = []
+
+    def wait(self, url):
+        self.waits.append(url)
+
+
+def test_shared_limiter_defaults_to_delay_with_several_workers():
+    assert shared_limiter({'delay': 2}, workers=1) is None
+    assert shared_limiter({'delay': 2}, workers=3).rate == 0.5
+    assert shared_limiter({'delay': 2, 'max_requests_per_minute': 20}, workers=1).rate == pytest.approx(1 / 3)
+
+
+def test_browser_fallback_goes_through_the_limiter(captcha_site, tmp_path):
+    limiter = RecordingLimiter()
+    fetcher = HybridFetcher(ReplayBrowser, None, cookie_file=str(tmp_path / 'cookies.json'), limiter=limiter)
+    try:
+        pages = [f'{captcha_site.url}/zufang/pudong/pg{page}/' for page in (1, 2)]
+        for url in pages:
+            assert 'content__list--item' in fetcher.fetch(url)
+    finally:
+        fetcher.close()
+    assert limiter.waits == [pages[1]]  # 第 2 次列表请求被重定向到验证页，回退到浏览器前先限速
+
+
+def test_escalates_on_verify_redirect_syncs_cookies_and_returns_to_http(tmp_path):
+    site = StubSite(listings=150, captcha_every=3)
+    site.start()
+    cookie_file = tmp_path / 'cookies.json'
+    fetcher = HybridFetcher(ReplayBrowser, None, cookie_file=str(cookie_file))
+    try:
+        challenged = []
+        for page in (1, 2, 3, 4):
+            html = fetcher.fetch(f'{site.url}/zufang/pudong/pg{page}/')
+            assert 'content__list--item' in html
+            challenged.append(fetcher.challenged)
+            if page == 3:
+                assert fetcher.driver is not None  # 第 3 次列表请求被重定向到验证页，改用浏览器完成验证
+                browser_agent = fetcher.driver.execute_script("return navigator.userAgent")
+    finally:
+        fetcher.close()
+        site.stop()
+    assert challenged == [False, False, True, False]
+    assert (fetcher.http_pages, fetcher.browser_pages) == (3, 1)  # 验证后第 4 页回到 HTTP 直取
+    assert 'lianjia_verified' in fetcher.session.cookies  # 浏览器拿到的验证 cookie 同步回 HTTP 会话
+    assert fetcher.session.headers['User-Agent'] == browser_agent
+    saved = json.loads(cookie_file.read_text(encoding='utf-8'))
+    assert [c['name'] for c in saved['cookies']] == ['lianjia_verified'] and saved['user_agent'] == browser_agent
+
+
+def test_replay_mode_does_not_touch_the_real_cookie_file():
+    import http_fetcher
+    from lianjia_selenium_crawler import make_fetcher
+
+    fetcher = make_fetcher('replay')
+    try:
+        assert fetcher.cookie_file != http_fetcher.COOKIE_FILE
+    finally:
+        fetcher.close()
+
+
+class ProfileBrowser(ReplayBrowser):
+    """轻量模式的浏览器替身：无头时停在验证页（无法人工处理），有界面时自动完成验证"""
+
+    def __init__(self, headless, launched):
+        super().__init__()
+        self.headless = headless
+        self.closed = False
+        launched.append(self)
+
+    def get(self, url):
+        if not self.headless:
+            return super().get(url)
+        response = self.session.get(url, timeout=30)
+        response.encoding = 'utf-8'
+        self.current_url = response.url
+        self.page_source = response.text
+
+    def quit(self):
+        self.closed = True
+        super().quit()
+
+
+def test_lightweight_fetcher_recycles_the_headless_browser():
+    METRICS.reset()
+    site = StubSite(listings=210)
+    site.start()
+    launched = []
+    fetcher = LightweightFetcher(lambda headless: ProfileBrowser(headless, launched), None, recycle_after=3)
+    try:
+        for page in range(1, 8):
+            assert 'content__list--item' in fetcher.fetch(f'{site.url}/zufang/pudong/pg{page}/')
+        assert [browser.closed for browser in launched] == [True, True, False]
+    finally:
+        fetcher.close()
+        site.stop()
+    assert [browser.headless for browser in launched] == [True, True, True]
+    assert all(browser.closed for browser in launched)
+    assert METRICS.counters['driver_restarts'] == 2
+
+
+def test_lightweight_fetcher_solves_captchas_in_a_headed_window(captcha_site):
+    launched, prompts = [], []
+    limiter = RecordingLimiter()
+    fetcher = LightweightFetcher(lambda headless: ProfileBrowser(headless, launched), lambda: prompts.append(1),
+                                 limiter=limiter)
+    pages = [f'{captcha_site.url}/zufang/pudong/pg{page}/' for page in (1, 2)]
+    try:
+        challenged = []
+        for url in pages:
+            assert 'content__list--item' in fetcher.fetch(url)
+            challenged.append(fetcher.challenged)
+    finally:
+        fetcher.close()
+    assert challenged == [False, True]
+    assert [browser.headless for browser in launched] == [True, False]  # 无头浏览器先关闭，再开有界面窗口
+    assert all(browser.closed for browser in launched)
+    assert prompts == [1]
+    assert limiter.waits == [pages[1]]
+
+
+def test_lightweight_driver_blocks_images_fonts_and_trackers(monkeypatch):
+    class FakeChrome:
+        def __init__(self, service, options):
+            self.options = options
+            self.cdp = []
+
+        def execute_cdp_cmd(self, command, params):
+            self.cdp.append((command, params))
+
+    manager = types.ModuleType('webdriver_manager.chrome')
+    manager.ChromeDriverManager = lambda: types.SimpleNamespace(install=lambda: 'chromedriver')
+    monkeypatch.setitem(sys.modules, 'webdriver_manager', types.ModuleType('webdriver_manager'))
+    monkeypatch.setitem(sys.modules, 'webdriver_manager.chrome', manager)
+    monkeypatch.setattr(crawler, 'Service', lambda path: path)
+    monkeypatch.setattr(crawler.webdriver, 'Chrome', FakeChrome)
+
+    driver = crawler.init_driver('profile', lightweight=True)
+    assert '--headless=new' in driver.options.arguments
+    assert '--blink-settings=imagesEnabled=false' in driver.options.arguments
+    assert driver.options.page_load_strategy == 'eager'
+    assert driver.options.experimental_options['prefs']['profile.managed_default_content_settings.images'] == 2
+    blocked = dict(driver.cdp)['Network.setBlockedURLs']['urls']
+    assert blocked == crawler.BLOCKED_URL_PATTERNS
+
+    def is_blocked(url):
+        return any(fnmatch.fnmatchcase(url, pattern) for pattern in blocked)
+
+    assert is_blocked('https://image1.ljcdn.com/110000-inspection/pc1_abc.jpg.780x439.jpg')
+    assert is_blocked('https://s1.ljcdn.com/fonts/iconfont.woff2')
+    assert is_blocked('https://hm.baidu.com/hm.js?abc')
+    assert not is_blocked('https://sh.lianjia.com/zufang/pudong/pg2/')
+    assert not is_blocked('https://s1.ljcdn.com/zufang/main.js')
+
+    headed = crawler.init_driver('profile')
+    assert '--headless=new' not in headed.options.arguments
+    assert 'Network.setBlockedURLs' not in dict(headed.cdp)
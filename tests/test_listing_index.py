@@ -0,0 +1,44 @@
+# tests/test_listing_index.py
+from listing_index import ListingIndex, maintain_date
+
+LINK = 'https://sh.lianjia.com/zufang/SH2108908120410423296.html'
+LISTING_ID = 'SH2108908120410423296'
+DAY1 = '2025-12-10 05:01:51'
+DAY2 = '2025-12-11 05:03:12'
+
+
+def make_index(tmp_path, maintain_time='今天维护'):
+    index = ListingIndex(str(tmp_path / 'index.db'))
+    index.update([{'链接': LINK, '价格(元)': 4600, '维护时间': maintain_time, '爬取时间': DAY1}])
+    return index
+
+
+def test_maintain_date():
+    assert maintain_date('今天维护', DAY1) == ('2025-12-10', 0)
+    assert maintain_date('昨天维护', DAY1) == ('2025-12-09', 0)
+    assert maintain_date('3天前维护', DAY1) == ('2025-12-07', 0)
+    assert maintain_date('2周前维护', DAY1) == ('2025-11-26', 7)
+    assert maintain_date('1个月前维护', DAY1) == ('2025-11-10', 30)
+    assert maintain_date('', DAY1) == ('', 0)
+
+
+def test_unchanged_listing_is_known_next_day(tmp_path):
+    index = make_index(tmp_path)
+    assert index.is_known(LISTING_ID, 4600, '今天维护', DAY1)
+    assert index.is_known(LISTING_ID, 4600, '昨天维护', DAY2)
+    index.close()
+
+
+def test_remaintained_or_repriced_listing_is_changed(tmp_path):
+    index = make_index(tmp_path)
+    assert not index.is_known(LISTING_ID, 4600, '今天维护', DAY2)
+    assert not index.is_known(LISTING_ID, 4800, '昨天维护', DAY2)
+    assert not index.is_known('SH1', 4600, '昨天维护', DAY2)
+    index.close()
+
+
+def test_coarse_phrase_drift_within_unit(tmp_path):
+    index = make_index(tmp_path, '1个月前维护')
+    assert index.is_known(LISTING_ID, 4600, '1个月前维护', DAY2)
+    assert not index.is_known(LISTING_ID, 4600, '今天维护', DAY2)
+    index.close()
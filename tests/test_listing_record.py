@@ -0,0 +1,69 @@
+# tests/test_listing_record.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from benchmark_parser import make_synthetic_page
+from lianjia_selenium_crawler import parse_page
+from listing_record import RecordBatchBuilder, Vocabulary
+
+
+def crawled_rows(pages=3):
+    rows = []
+    for page in range(1, pages + 1):
+        rows.extend(parse_page(make_synthetic_page(page)))
+    return rows
+
+
+def test_iter_dicts_round_trips_parsed_rows():
+    rows = crawled_rows()
+    batch = RecordBatchBuilder().extend(iter(rows))
+    assert len(batch) == len(rows)
+    assert list(batch.iter_dicts()) == rows
+
+
+def test_plain_dataframe_matches_dict_dataframe():
+    rows = crawled_rows()
+    expected = pd.DataFrame(rows)
+    df = RecordBatchBuilder().extend(rows).to_dataframe(categorical=False)
+    assert set(df.columns) == set(expected.columns)
+    for col in expected.columns:
+        assert df[col].astype(object).where(df[col].notna(), None).tolist() == \
+            expected[col].astype(object).where(expected[col].notna(), None).tolist(), col
+
+
+def test_empty_price_and_year_are_missing():
+    rows = crawled_rows(1)[:4]
+    rows[0]['价格(元)'] = None
+    rows[1]['价格(元)'] = float('nan')
+    rows[1]['建成年份'] = None
+    rows[2]['价格(元)'] = ''
+    rows[2]['面积(㎡)'] = None
+    rows[3]['价格(元)'] = 6500.0  # 从表格读回的整数列常是浮点
+    batch = RecordBatchBuilder().extend(rows)
+
+    restored = list(batch.iter_dicts())
+    assert ['价格(元)' in row for row in restored] == [False, False, False, True]
+    assert restored[3]['价格(元)'] == 6500
+    assert '建成年份' not in restored[1] and '面积(㎡)' not in restored[2]
+    df = batch.to_dataframe()
+    assert df['价格(元)'].isna().tolist() == [True, True, True, False]
+    assert df['建成年份'].isna().tolist() == [False, True, False, False]
+
+
+def test_vocabulary_codes_are_unique_under_parallel_workers():
+    vocab = Vocabulary()
+    values = [f'小区{i}' for i in range(2000)]
+    barrier = threading.Barrier(8)
+
+    def encode_all(offset):
+        barrier.wait()
+        return [vocab.encode(value) for value in values[offset:] + values[:offset]]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(encode_all, range(0, 2000, 250)))
+    assert len(vocab.values) == len(vocab.codes) == 2000
+    assert sorted(vocab.codes.values()) == list(range(2000))
+    for offset, codes in zip(range(0, 2000, 250), results):
+        assert [vocab.decode(code) for code in codes] == values[offset:] + values[:offset]
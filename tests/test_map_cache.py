@@ -0,0 +1,69 @@
+# tests/test_map_cache.py
+import itertools
+import os
+import subprocess
+import sys
+
+import pytest
+
+import map_cache
+import query_distance_from_map as qd
+from map_cache import MapCache
+from replay import StubSite
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """每次取时间前进 1 秒，访问先后顺序确定"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(map_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def test_expired_entries_are_misses(tmp_path, clock):
+    cache = MapCache(str(tmp_path / 'cache.db'))
+    cache.set('fresh', [1, 2], ttl=100)
+    cache.set('stale', 'x', ttl=1)
+    assert cache.get('fresh') == [1, 2]
+    assert cache.get('stale') is None
+    assert cache.conn.execute("SELECT COUNT(*) FROM cache WHERE key = 'stale'").fetchone()[0] == 0
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = MapCache(str(tmp_path / 'cache.db'), max_entries=10)
+    for i in range(10):
+        cache.set(f'k{i}', i, ttl=3600)
+    assert cache.get('k0') == 0  # 最近访问过，不淘汰
+    cache.set('k10', 10, ttl=3600)
+    keys = {row[0] for row in cache.conn.execute('SELECT key FROM cache')}
+    assert keys == {'k0'} | {f'k{i}' for i in range(3, 11)}  # 超出 1 条，连同 10% 余量淘汰最久未访问的 k1、k2
+    cache.close()
+
+
+def test_repeated_queries_hit_the_cache(map_cache, monkeypatch):
+    site = StubSite()
+    site.start()
+    monkeypatch.setattr(qd, 'BAIDU_API_BASE', site.url)
+    try:
+        first = qd.get_coordinates('东昌新村', '上海市')
+        assert qd.get_coordinates('东昌新村', '上海市') == first
+        origin = qd.parse_coordinates(first)
+        route = qd.get_driving_info(origin, (31.2397, 121.4998))
+        assert qd.get_driving_info(origin, (31.2397, 121.4998)) == route
+    finally:
+        site.stop()
+    assert site.counters['api_calls'] == 2
+    assert (map_cache.hits, map_cache.misses) == (2, 2)
+
+
+def test_importing_does_not_open_the_cache(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = ("import importlib, sys\n"
+              "try:\n    importlib.import_module('api_key')\n"
+              "except ImportError:\n    sys.modules['api_key'] = importlib.import_module('api_key_sample')\n"
+              "import query_distance_from_map as qd\n"
+              "assert qd.CACHE is None\n")
+    subprocess.run([sys.executable, '-c', script], cwd=tmp_path, check=True,
+                   env=dict(os.environ, PYTHONPATH=root))
+    assert not (tmp_path / 'data').exists()
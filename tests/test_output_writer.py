@@ -0,0 +1,23 @@
+# tests/test_output_writer.py
+import pandas as pd
+
+import output_writer
+from output_writer import export_rows, usable_formats
+
+
+def test_usable_formats_falls_back_to_xlsx(monkeypatch):
+    monkeypatch.setattr(output_writer, 'pa', None)
+    assert usable_formats(['parquet', 'feather']) == ['xlsx']
+    assert usable_formats([]) == ['xlsx']
+    assert usable_formats(['parquet', 'xlsx']) == ['xlsx']
+
+
+def test_export_rows_writes_xlsx(tmp_path):
+    rows = [{'小区名称': f'小区{i}', '价格(元)': 4000 + i, '链接': f'https://sh.lianjia.com/zufang/SH{i}.html'}
+            for i in range(5)]
+    output_file = str(tmp_path / 'out.xlsx')
+    row_count, paths = export_rows(iter(rows), output_file, ['xlsx'])
+    assert row_count == 5 and paths == [output_file]
+    df = pd.read_excel(output_file, engine='openpyxl')
+    assert df['价格(元)'].tolist() == [4000, 4001, 4002, 4003, 4004]
+    assert export_rows([], output_file) == (0, [])
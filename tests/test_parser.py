@@ -0,0 +1,70 @@
+# tests/test_parser.py
+import os
+
+import pytest
+
+from benchmark_parser import make_synthetic_page
+from lianjia_selenium_crawler import parse_page, parse_page_incremental
+from listing_index import ListingIndex
+from replay import EMPTY_PAGE
+
+CRAWL_TIME = '2025-12-10 05:00:00'
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def saved_page():
+    """保存下来的真实列表页（已脱敏），含个人房源、面议、独栋公寓、推广位等字段缺失的情况"""
+    with open(os.path.join(FIXTURE_DIR, 'zufang_pudong_pg2.html'), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('site_url', ['https://sh.lianjia.com', 'https://bj.lianjia.com'])
+def test_lxml_matches_bs4(site_url):
+    html = make_synthetic_page(3, per_page=30)
+    expected = parse_page(html, 'bs4', crawl_time=CRAWL_TIME, site_url=site_url)
+    assert len(expected) == 30
+    assert parse_page(html, 'lxml', crawl_time=CRAWL_TIME, site_url=site_url) == expected
+    assert all(row['链接'].startswith(site_url) for row in expected)
+
+
+def test_lxml_matches_bs4_on_empty_page():
+    assert parse_page(EMPTY_PAGE, 'lxml') == parse_page(EMPTY_PAGE, 'bs4') == []
+
+
+def test_incremental_parsers_agree(tmp_path):
+    html = make_synthetic_page(1, per_page=30)
+    index = ListingIndex(str(tmp_path / 'listing_index.db'))
+    try:
+        index.update(parse_page(html, 'bs4', crawl_time=CRAWL_TIME)[:10])
+        results = [parse_page_incremental(html, index, parser, crawl_time=CRAWL_TIME) for parser in ('bs4', 'lxml')]
+    finally:
+        index.close()
+    assert results[0] == results[1]
+    rows, known_ids = results[0]
+    assert (len(rows), len(known_ids)) == (20, 10)
+
+
+@pytest.mark.parametrize('batch_features', [False, True])
+def test_lxml_matches_bs4_on_saved_page(batch_features):
+    html = saved_page()
+    expected = parse_page(html, 'bs4', crawl_time=CRAWL_TIME)
+    rows = parse_page(html, 'lxml', crawl_time=CRAWL_TIME, batch_features=batch_features)
+    assert len(rows) == len(expected) == 8
+    for row, reference in zip(rows, expected):
+        assert row.keys() == reference.keys()  # 缺失的字段两边同样缺失
+        for field, value in reference.items():
+            assert row[field] == value, (reference['链接'], field)
+
+
+def test_saved_page_missing_fields_are_left_out_the_same_way():
+    rows = {row['链接'].rsplit('/', 1)[-1]: row for row in parse_page(saved_page(), 'lxml', crawl_time=CRAWL_TIME)}
+    landlord = rows['SH2000000000000000105.html']  # 个人房东：没有品牌行和标签
+    assert '中介公司' not in landlord and '维护时间' not in landlord and '标签' not in landlord
+    negotiable = rows['SH2000000000000000106.html']  # 面议：没有价格，品牌行没有维护时间
+    assert '价格(元)' not in negotiable and negotiable['维护时间'] == ''
+    assert rows['SH2000000000000000107.html']['小区名称'] == ''  # 只有区域链接
+    apartment = rows['SH2000000000000000103.html']  # 独栋公寓：描述里没有区域链接
+    assert (apartment['一级区域'], apartment['小区链接']) == ('', '')
+    assert rows['SH2000000000000000101.html']['必看好房'] and rows['SH2000000000000000104.html']['标题'].endswith('& 江景')
+    ad = rows['']  # 推广位：只留下空记录
+    assert (ad['标题'], ad['标签']) == ('', '')
@@ -0,0 +1,23 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import Pipeline
+
+
+def test_done_from_two_threads_keeps_every_stage(tmp_path):
+    state_file = str(tmp_path / 'pipeline_state.json')
+    pipeline = Pipeline({}, state_file=state_file)
+
+    def mark(prefix):
+        for i in range(200):
+            pipeline.done(f'{prefix}{i}', f'key{i}')
+
+    with ThreadPoolExecutor(2) as executor:
+        for future in [executor.submit(mark, 'commute'), executor.submit(mark, 'analytics')]:
+            future.result()
+
+    with open(state_file, encoding='utf-8') as f:
+        state = json.load(f)
+    assert len(state) == 400
+    assert state['commute199'] == 'key199' and state['analytics199'] == 'key199'
+    assert Pipeline({}, state_file=state_file).unchanged('analytics0', 'key0')
@@ -0,0 +1,71 @@
+# tests/test_price_history.py
+import random
+from datetime import date, timedelta
+from statistics import median
+
+import pytest
+
+from price_history import PriceHistory
+
+SITE = 'https://sh.lianjia.com'
+
+
+def row(listing, day, price, community='东昌新村', district='陆家嘴', community_id='5011000000001'):
+    return {'链接': f'{SITE}/zufang/SH{listing}.html', '价格(元)': price, '面积(㎡)': 50.0,
+            '爬取时间': f'{day} 08:00:00', '小区名称': community, '二级区域': district, '一级区域': '浦东',
+            '小区链接': f'{SITE}/zufang/c{community_id}/'}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PriceHistory(str(tmp_path / 'price_history.db'))
+    yield store
+    store.close()
+
+
+def naive_medians(rows, window_days):
+    """逐个计算日：每个房源取窗口内最后一次价格求中位数"""
+    observations = sorted((r['爬取时间'][:10], r['链接'], r['价格(元)']) for r in rows)
+    days = sorted({day for day, _, _ in observations})
+    result = []
+    for day in days:
+        first = (date.fromisoformat(day) - timedelta(days=window_days - 1)).isoformat()
+        latest = {}
+        for obs_day, link, price in observations:
+            if first <= obs_day <= day:
+                latest[link] = price
+        result.append((day, round(median(latest.values()), 2), len(latest)))
+    return result
+
+
+def test_rolling_median_matches_naive_loop(store):
+    rng = random.Random(7)
+    start = date(2025, 12, 1)
+    rows = []
+    for listing in range(12):
+        day = rng.randrange(0, 10)
+        while day < 40:
+            rows.append(row(listing, (start + timedelta(days=day)).isoformat(), rng.randrange(4000, 9000, 100)))
+            day += rng.choice([1, 1, 2, 5, 7, 8, 12])  # 连续、隔天、正好窗口长度、超过窗口的间隔
+    store.ingest_rows(rows)
+    for window_days in (1, 7, 30):
+        result = store.rolling_median('东昌新村', window_days=window_days)
+        assert list(zip(result['日期'], result['中位数'], result['房源数'])) == naive_medians(rows, window_days)
+
+
+def test_same_name_communities_are_not_merged(store, capsys):
+    store.ingest_rows([row(1, '2025-12-01', 5000), row(2, '2025-12-01', 6000),
+                       row(3, '2025-12-01', 9000, district='金桥', community_id='5011000000002')])
+    assert store.rolling_median('东昌新村').empty
+    assert '对应 2 个小区' in capsys.readouterr().out
+    assert store.rolling_median('东昌新村', parent='陆家嘴')['中位数'].tolist() == [5500]
+    assert store.rolling_median('5011000000002')['中位数'].tolist() == [9000]
+    assert store.rolling_median('c5011000000001')['房源数'].tolist() == [2]
+
+
+def test_rows_from_before_the_id_columns_join_their_community(store):
+    store.conn.execute("""INSERT INTO observations (listing_id, crawl_date, crawl_time, price, area, community, district, region)
+                          VALUES ('SH9', '2025-11-30', '2025-11-30 08:00:00', 7000, 50.0, '东昌新村', '陆家嘴', '浦东')""")
+    store.ingest_rows([row(1, '2025-12-01', 5000)])
+    result = store.rolling_median('东昌新村', window_days=7)
+    assert result['房源数'].tolist() == [1, 2]
@@ -0,0 +1,61 @@
+# tests/test_rate_limit.py
+from rate_limit import AdaptiveDelay
+
+
+def run(scheduler, outcome, pages):
+    for _ in range(pages):
+        scheduler.record(outcome)
+    return scheduler.current()
+
+
+def test_configured_delay_is_the_default_lower_bound():
+    scheduler = AdaptiveDelay(3)
+    assert scheduler.min_delay == 3
+    assert run(scheduler, AdaptiveDelay.OK, 100) == 3
+
+
+def test_smaller_min_delay_lets_clean_pages_go_below_start():
+    scheduler = AdaptiveDelay(3, min_delay=1.5)
+    assert run(scheduler, AdaptiveDelay.OK, 100) == 1.5
+
+
+def test_captcha_floor_decays_after_clean_pages():
+    scheduler = AdaptiveDelay(2, min_delay=1)
+    scheduler.record(AdaptiveDelay.CAPTCHA)
+    assert scheduler.floor == 2.5 and scheduler.current() == 6
+    run(scheduler, AdaptiveDelay.OK, 49)
+    assert scheduler.floor == 2.5
+    scheduler.record(AdaptiveDelay.OK)
+    assert scheduler.floor < 2.5
+    run(scheduler, AdaptiveDelay.OK, 1000)
+    assert scheduler.floor == scheduler.min_delay == 1.0
+    assert scheduler.current() == 1.0
+
+
+def test_captcha_wait_does_not_use_up_the_back_off(monkeypatch):
+    import time
+
+    import lianjia_selenium_crawler as crawler
+    from benchmark_parser import make_synthetic_page
+
+    class CaptchaFetcher:
+        """第一页要人工验证（耗时 0.3 秒），之后正常；记录每次请求开始和返回的时刻"""
+        challenged = False
+
+        def __init__(self):
+            self.times = []
+
+        def fetch(self, url):
+            start = time.perf_counter()
+            self.challenged = not self.times
+            if self.challenged:
+                time.sleep(0.3)
+            self.times.append((start, time.perf_counter()))
+            return make_synthetic_page(len(self.times))
+
+    monkeypatch.setattr(crawler, 'DELAY_JITTER', (0, 0))
+    fetcher = CaptchaFetcher()
+    scheduler = AdaptiveDelay(0.05)
+    crawler.crawl_district(fetcher, 'https://sh.lianjia.com/zufang/pudong/', 2, 0.05, scheduler=scheduler)
+    (_, solved), (next_request, _) = fetcher.times
+    assert next_request - solved >= 0.15  # 验证后间隔放大 3 倍，从验证完成时算起
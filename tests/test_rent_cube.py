@@ -0,0 +1,59 @@
+import math
+
+from rent_cube import QuantileSketch, RentCube
+
+
+def _row(listing_id, price, crawl_time, district='浦东'):
+    return {'链接': f'https://sh.lianjia.com/zufang/{listing_id}.html', '价格(元)': price, '面积(㎡)': 50.0,
+            '一级区域': district, '二级区域': '陆家嘴', '小区名称': '东昌新村', '户型': '2室1厅',
+            '近地铁': True, '精装': False, '爬取时间': crawl_time}
+
+
+def test_expire_retracts_listings_not_seen_recently():
+    cube = RentCube()
+    cube.add_rows([_row('SH1', 5000, '2026-10-01 08:00:00'), _row('SH2', 7000, '2026-10-01 08:00:00')])
+    cube.add_rows([_row('SH1', 5000, '2026-10-20 08:00:00')])
+    assert cube.expire(max_age_days=14) == 1
+    assert list(cube.listings) == ['SH1']
+    assert cube.summary(['一级区域'])['房源数'].tolist() == [1]
+
+
+def test_touch_keeps_listings_alive():
+    cube = RentCube()
+    cube.add_rows([_row('SH1', 5000, '2026-10-01 08:00:00'), _row('SH2', 7000, '2026-10-20 08:00:00')])
+    assert cube.touch(['SH1', 'SH9'], '2026-10-20') == 1
+    assert cube.expire(max_age_days=14) == 0
+
+
+def test_summary_with_only_zero_price_rows():
+    cube = RentCube()
+    cube.add_rows([_row('SH1', 0, '2026-10-01 08:00:00')])
+    record = cube.summary(['一级区域']).iloc[0]
+    assert record['房源数'] == 1
+    assert record['平均租金'] == record['总租金/总面积'] == 0
+    for field in ('租金中位数', '平均每平米租金', '每平米租金P25', '每平米租金中位数', '每平米租金P75'):
+        assert math.isnan(record[field]), field
+
+
+def test_empty_sketch_quantile_is_nan():
+    sketch = QuantileSketch()
+    assert all(math.isnan(sketch.quantile(q)) for q in (0.25, 0.5, 0.75))
+    sketch.add(5000)
+    sketch.add(5000, -1)
+    assert math.isnan(sketch.quantile(0.5))
+
+
+def test_delisted_listing_is_expired_after_touch_and_expiry():
+    cube = RentCube()
+    cube.add_rows([_row('SH1', 5000, '2026-10-01 08:00:00'), _row('SH2', 7000, '2026-10-01 08:00:00'),
+                   _row('SH3', 9000, '2026-10-01 08:00:00', district='徐汇')])
+    # 增量爬取：SH1 未变化（touch 刷新），SH3 价格变化重新出现，SH2 已下架不再出现
+    assert cube.touch(['SH1'], '2026-10-20') == 1
+    assert cube.add_rows([_row('SH3', 8800, '2026-10-20 08:00:00', district='徐汇')]) == (0, 1)
+    assert cube.expire(max_age_days=14) == 1
+    assert sorted(cube.listings) == ['SH1', 'SH3']
+    summary = cube.summary(['一级区域']).set_index('一级区域')
+    assert summary.loc['浦东', '房源数'] == 1 and summary.loc['浦东', '平均租金'] == 5000
+    assert summary.loc['徐汇', '平均租金'] == 8800
+    assert cube.summary(['小区名称'])['房源数'].sum() == 2
+    assert cube.expire(max_age_days=14) == 0  # 再次过期检查不会重复撤回
@@ -0,0 +1,49 @@
+# tests/test_replay.py
+import requests
+
+from benchmark_parser import make_synthetic_page
+from http_fetcher import is_challenge_url, load_in_browser
+from replay import EMPTY_PAGE, FixtureStore, ReplayBrowser, StubSite
+
+
+def test_replay_browser_completes_a_captcha_round_trip():
+    site = StubSite(listings=60, captcha_every=2)
+    site.start()
+    browser = ReplayBrowser()
+    try:
+        first, second = f'{site.url}/zufang/pudong/pg1/', f'{site.url}/zufang/pudong/pg2/'
+        plain = requests.Session()
+        assert not is_challenge_url(plain.get(first, timeout=10).url)
+        assert is_challenge_url(plain.get(second, timeout=10).url)
+        assert is_challenge_url(plain.get(second, timeout=10).url)  # 完成验证前一直拦截
+        assert 'lianjia_verified' not in plain.cookies
+
+        page_source, challenged = load_in_browser(browser, second, None)
+        assert not challenged
+        assert browser.current_url == second
+        assert page_source.count('content__list--item"') == 30
+        assert [cookie['name'] for cookie in browser.get_cookies()] == ['lianjia_verified']
+        assert not is_challenge_url(plain.get(second, timeout=10).url)  # 验证后的下一次请求不再拦截
+    finally:
+        browser.quit()
+        site.stop()
+    assert site.counters['captchas'] == 3
+    assert site.counters['pages_served'] == 3
+
+
+def test_recorded_pages_and_api_responses_are_replayed(tmp_path):
+    store = FixtureStore(str(tmp_path / 'replay'))
+    page = make_synthetic_page(1, 5)
+    store.save_page('https://sh.lianjia.com/zufang/pudong/pg1/', page)
+    response = {'status': 0, 'result': {'location': {'lat': 31.1, 'lng': 121.1}}}
+    store.save_api('http://api.map.baidu.com/geocoding/v3/?address=东昌新村&city=上海市&output=json&ak=secret', response)
+
+    site = StubSite(FixtureStore(str(tmp_path / 'replay')))
+    site.start()
+    try:
+        assert requests.get(f'{site.url}/zufang/pudong/pg1/', timeout=10).content.decode('utf-8') == page
+        assert requests.get(f'{site.url}/zufang/pudong/pg2/', timeout=10).text == EMPTY_PAGE  # 录制到最后一页之后
+        api = requests.get(f'{site.url}/geocoding/v3/?city=上海市&address=东昌新村&ak=other&output=json', timeout=10)
+        assert api.json() == response
+    finally:
+        site.stop()
@@ -0,0 +1,105 @@
+# tests/test_sendmail.py
+import email
+import json
+import random
+import socketserver
+import threading
+from email.header import decode_header, make_header
+
+import pandas as pd
+import pytest
+
+from sendmail import send_digest
+
+SITE = 'https://sh.lianjia.com'
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """最小的 SMTP 服务器：只收信不转发，收到的原始邮件放进 server.messages"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 sink')
+            elif command == b'DATA':
+                self.reply('354 end with .')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data == b'.\r\n':
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.messages.append(email.message_from_bytes(b''.join(lines)))
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:  # MAIL / RCPT / RSET / NOOP
+                self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp_sink():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SinkHandler)
+    server.daemon_threads = True
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def listings(prices):
+    rng = random.Random(3)
+    return pd.DataFrame([{
+        '一级区域': '浦东', '二级区域': '陆家嘴', '小区名称': f'小区{i % 40}', '户型': '2室1厅1卫',
+        '面积(㎡)': 50 + i % 30, '价格(元)': price,
+        '标题': ''.join(rng.choice('整租精装南北通透近地铁拎包入住随时看房') for _ in range(40)),
+        '链接': f'{SITE}/zufang/SH{i:010d}.html',
+    } for i, price in enumerate(prices)])
+
+
+def test_send_digest_splits_attachments_and_saves_pruned_state(smtp_sink, tmp_path):
+    state_file = tmp_path / 'mail_state.json'
+    old_prices = [5000 + i for i in range(600)]
+    state = {f'SH{i:010d}': price for i, price in enumerate(old_prices)}
+    state['SH9999999999'] = 8000  # 已下架
+    state_file.write_text(json.dumps(state), encoding='utf-8')
+    prices = list(old_prices)
+    prices[7], prices[42] = 4800, 5600
+    max_mb = 0.02
+
+    sent = send_digest(str(tmp_path / '链家租房.xlsx'), debug_server=f'127.0.0.1:{smtp_sink.server_address[1]}',
+                       max_mb=max_mb, state_file=str(state_file), df=listings(prices))
+
+    assert sent
+    messages = smtp_sink.messages
+    assert len(messages) > 1
+    for msg in messages:
+        attachments = [part for part in msg.walk() if part.get_filename()]
+        assert attachments
+        assert sum(len(part.get_payload(decode=True)) for part in attachments) <= max_mb * 1024 * 1024
+    assert str(make_header(decode_header(messages[0]['Subject']))).startswith('链家租房变化 - 新上/调价 2 套')
+    body = messages[0].get_payload()[0].get_payload(decode=True).decode('utf-8')
+    assert '新上 0 套，调价 2 套' in body
+    assert '5007→4800元' in body and '5042→5600元' in body
+    saved = json.loads(state_file.read_text(encoding='utf-8'))
+    assert saved['SH0000000007'] == 4800
+    assert 'SH9999999999' not in saved
+    assert len(saved) == 600
+
+
+def test_failed_send_keeps_the_old_state(tmp_path):
+    state_file = tmp_path / 'mail_state.json'
+    state_file.write_text(json.dumps({'SH0000000000': 5000}), encoding='utf-8')
+    assert not send_digest(str(tmp_path / '链家租房.xlsx'), debug_server='127.0.0.1:1', max_mb=1,
+                           state_file=str(state_file), df=listings([4000]))
+    assert json.loads(state_file.read_text(encoding='utf-8')) == {'SH0000000000': 5000}
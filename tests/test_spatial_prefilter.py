@@ -0,0 +1,42 @@
+# tests/test_spatial_prefilter.py
+import numpy as np
+
+import commute_matrix
+from spatial_index import SpatialIndex, haversine_km
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 31.0 + rng.random(n) * 0.5, 121.2 + rng.random(n) * 0.6
+
+
+def test_within_matches_brute_force():
+    lats, lngs = random_points(500)
+    index = SpatialIndex(range(500), lats, lngs)
+    for lat, lng, radius in [(31.23, 121.47, 3), (31.1, 121.3, 10), (31.4, 121.7, 0.5), (31.23, 121.47, 200)]:
+        dist = haversine_km(lat, lng, lats, lngs)
+        expected = sorted((int(i) for i in np.nonzero(dist <= radius)[0]), key=lambda i: (dist[i], i))
+        assert [name for name, _ in index.within(lat, lng, radius)] == expected
+
+
+def test_matrix_queries_only_pairs_within_radius(monkeypatch, dict_cache):
+    requested = []
+
+    def fake_block(mode, origins, destinations):
+        requested.extend((o, d) for o in origins for d in destinations)
+        return [(float(haversine_km(o[0], o[1], d[0], d[1])), 1.0) for o in origins for d in destinations]
+
+    monkeypatch.setattr(commute_matrix, '_query_block', fake_block)
+    lats, lngs = random_points(60, seed=1)
+    origins = [(f'小区{i}', (float(lat), float(lng))) for i, (lat, lng) in enumerate(zip(lats, lngs))]
+    destinations = [('人民广场', (31.2317, 121.4752)), ('张江', (31.2040, 121.5900)), ('虹桥', (31.1940, 121.3200))]
+
+    matrix = commute_matrix.compute_matrix(origins, destinations, modes=('driving',), qps=1000, max_radius_km=8)
+
+    assert requested
+    assert all(haversine_km(o[0], o[1], d[0], d[1]) <= 8 for o, d in requested)
+    assert len(requested) == len(set(requested))
+    for i, (_, o) in enumerate(origins):
+        for j, (_, d) in enumerate(destinations):
+            inside = haversine_km(o[0], o[1], d[0], d[1]) <= 8
+            assert np.isnan(matrix.km[i, j, 0]) != inside